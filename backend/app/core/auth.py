@@ -9,54 +9,79 @@ from app.schemas import TokenData
 from .config import settings
 from app.database.session import get_db
 from .supabase_client import supabase
+from app.database.cache import QueryCache, cached_query, query_cache, table_tag, user_tag
+from app.utils.circuit_breaker import CircuitOpenError, circuit_breakers
 
+import asyncio
+import hashlib
 import logging
+import time
 
 
 logger = logging.getLogger(__name__)
 
-async def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
-    from app.database.cache import query_cache, cache_user_query
-    from app.database.monitor import monitor_query, db_monitor
 
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def _is_supabase_outage(exc: BaseException) -> bool:
+    # A 4xx means Supabase answered and rejected the token
+    status_code = getattr(exc, "status", None) or getattr(exc, "status_code", None)
+    return not (isinstance(status_code, int) and 400 <= status_code < 500)
 
-    # Get token from Authorization header
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        logger.warning("Auth: No Bearer token found in Authorization header.")
-        raise credentials_exception
 
-    token = auth_header.split(" ")[1]
+supabase_breaker = circuit_breakers.get(
+    "supabase_auth",
+    slow_call_seconds=settings.SUPABASE_SLOW_CALL_SECONDS,
+    is_failure=_is_supabase_outage,
+)
 
+# Verified tokens; entries older than the fresh TTL are only used while the breaker is open
+_token_cache = QueryCache(max_size=10000, default_ttl=settings.AUTH_TOKEN_STALE_SECONDS)
+
+
+async def verify_supabase_token(token: str):
+    """Return the Supabase user for a token, or None if it is invalid.
+
+    Raises CircuitOpenError when Supabase is unavailable and there is no
+    earlier verification of this token to fall back on.
+    """
+    key = f"auth:token:{hashlib.sha256(token.encode()).hexdigest()}"
+    cached = _token_cache.get(key)
+    if cached is not None and time.monotonic() - cached[0] < settings.AUTH_TOKEN_CACHE_TTL_SECONDS:
+        return cached[1]
 
     try:
-        # Verify Supabase JWT token
-        response = supabase.auth.get_user(token)
-        if not response or not response.user:
-            raise Exception("Invalid token")
-
-        supabase_user = response.user
-        uid = supabase_user.id
-        email = supabase_user.email
-        logger.debug(f"Auth: Decoded Supabase token for UID: {uid}")
+        with supabase_breaker.protect():
+            # The SDK call is blocking; keep it off the event loop
+            response = await asyncio.to_thread(supabase.auth.get_user, token)
+    except CircuitOpenError:
+        if cached is not None:
+            logger.warning("Auth: Supabase circuit open, using an earlier token verification")
+            return cached[1]
+        raise
     except Exception as e:
+        if _is_supabase_outage(e) and cached is not None:
+            logger.warning(f"Auth: Supabase unavailable ({e}), using an earlier token verification")
+            return cached[1]
         logger.error(f"Auth: Supabase token verification failed: {e}")
-        raise credentials_exception
+        return None
 
-    # Check user cache first (cache user ID only, not the object)
-    user_cache_key = f"user:uid:{uid}"
-    cached_user_id = query_cache.get(user_cache_key)
-    if cached_user_id:
-        logger.debug(f"Auth: Using cached user ID for UID: {uid}")
-        # Re-fetch user from current session to ensure it's bound
-        user = db.exec(select(User).where(User.id == cached_user_id)).first()
-        if user:
-            return user
+    if not response or not response.user:
+        return None
+    _token_cache.set(key, (time.monotonic(), response.user))
+    return response.user
+
+@cached_query(
+    ttl=300,
+    cache_key_func=lambda uid, supabase_user, db: f"user:uid:{uid}",
+    tags=(table_tag("user"),),
+    result_tags=lambda user_id: (user_tag(user_id),),
+)
+async def resolve_user_id(uid: str, supabase_user, db: Session) -> int:
+    """App user ID for a Supabase UID, creating the user on first sign-in.
+
+    Concurrent requests for an uncached UID share one lookup, so a new user
+    is created once rather than once per request.
+    """
+    from app.database.monitor import monitor_query, db_monitor
 
     # Rate limit check
     allowed, reason = db_monitor.check_rate_limit(uid)
@@ -72,6 +97,7 @@ async def get_current_user(request: Request, db: Session = Depends(get_db)) -> U
     def fetch_user_by_uid(supabase_uid: str) -> Optional[User]:
         return db.exec(select(User).where(User.supabase_uid == supabase_uid)).first()
 
+    email = supabase_user.email
     user = fetch_user_by_uid(uid)
     if user is None:
         # If user doesn't exist in your DB, create them
@@ -119,9 +145,49 @@ async def get_current_user(request: Request, db: Session = Depends(get_db)) -> U
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error: User ID could not be determined.",
         )
+    return user.id
+
+async def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+    # Get token from Authorization header
+    auth_header = request.headers.get("Authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        logger.warning("Auth: No Bearer token found in Authorization header.")
+        raise credentials_exception
+
+    token = auth_header.split(" ")[1]
+
+
+    try:
+        # Verify Supabase JWT token
+        supabase_user = await verify_supabase_token(token)
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication is temporarily unavailable",
+            headers={"Retry-After": str(max(1, int(e.retry_after)))},
+        )
+    if supabase_user is None:
+        raise credentials_exception
+
+    uid = supabase_user.id
+    logger.debug(f"Auth: Decoded Supabase token for UID: {uid}")
 
-    # Cache the user ID for future requests (5 minutes TTL)
-    query_cache.set(user_cache_key, user.id, ttl=300)
+    # The UID -> user ID mapping is cached; the user row is always read fresh
+    user_id = await resolve_user_id(uid, supabase_user, db)
+    user = db.exec(select(User).where(User.id == user_id)).first()
+    if user is None:
+        # Deleted since the mapping was cached
+        query_cache.delete(f"user:uid:{uid}")
+        user_id = await resolve_user_id(uid, supabase_user, db)
+        user = db.exec(select(User).where(User.id == user_id)).first()
+    if user is None:
+        raise credentials_exception
 
     logger.info(f"Auth: Successfully authenticated user: {user.email}, ID: {user.id}")
     return user
@@ -129,7 +195,10 @@ async def get_current_user(request: Request, db: Session = Depends(get_db)) -> U
 async def get_optional_current_user(request: Request, db: Session = Depends(get_db)) -> Optional[User]:
     try:
         return await get_current_user(request, db)
-    except HTTPException:
+    except HTTPException as e:
+        if e.status_code == status.HTTP_503_SERVICE_UNAVAILABLE:
+            # Don't silently treat a signed-in user as anonymous
+            raise
         return None
 
 async def get_current_user_from_websocket(token: str, db: Session) -> Optional[User]:
@@ -137,13 +206,13 @@ async def get_current_user_from_websocket(token: str, db: Session) -> Optional[U
     if not token:
         return None
     try:
-        response = supabase.auth.get_user(token)
-        if not response or not response.user:
-            return None
-
-        uid = response.user.id
-    except Exception:
+        supabase_user = await verify_supabase_token(token)
+    except CircuitOpenError:
+        return None
+    if supabase_user is None:
         return None
 
+    uid = supabase_user.id
+
     user = db.exec(select(User).where(User.supabase_uid == uid)).first()
     return user
@@ -1,6 +1,6 @@
 import os
 from pathlib import Path
-from typing import Optional, List
+from typing import Dict, Optional, List
 from pydantic import computed_field, Field
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
@@ -52,6 +52,121 @@ class Settings(BaseSettings):
     DEFAULT_VISUALIZATION_MODEL: str = "google/gemma-3n-e2b-it:free"
     DEFAULT_LEARNING_RESOURCES_MODEL: str = "google/gemma-3n-e2b-it:free"
 
+    # LLM client tuning
+    LLM_MAX_CONCURRENCY: int = 8  # Concurrent in-flight LLM calls per worker
+    LLM_TIMEOUT_SECONDS: float = 90.0  # Per-call timeout, including queueing for a slot
+    LLM_THREAD_POOL_SIZE: int = 8  # Threads for SDK calls without an async path
+    LLM_USE_NATIVE_ASYNC: bool = True  # Prefer the SDK's async API when it exists
+
+    # Hedged requests: race a secondary provider once Gemini exceeds its observed p95
+    LLM_HEDGING_ENABLED: bool = True
+    LLM_HEDGE_PROVIDERS: str = "deepseek,openai"  # Tried in order; skipped without an API key
+    LLM_HEDGE_PERCENTILE: float = 95.0
+    LLM_HEDGE_MIN_SAMPLES: int = 20  # Use the default delay until this many latencies are known
+    LLM_HEDGE_DEFAULT_DELAY_SECONDS: float = 30.0
+    DEEPSEEK_MODEL: str = "deepseek-chat"
+    DEEPSEEK_MAX_OUTPUT_TOKENS: int = 8192
+    OPENAI_HEDGE_MODEL: str = "gpt-4o-mini"
+    OPENAI_HEDGE_MAX_OUTPUT_TOKENS: int = 16384
+
+    # Model routing per use case (defaults above are always candidates)
+    LLM_ROUTE_CANDIDATES: Dict[str, List[str]] = {}  # e.g. {"roadmap": ["gemini-2.0-flash"]}
+    LLM_MODEL_COSTS: Dict[str, float] = {  # USD per 1M output tokens
+        "gemini-2.5-flash-lite": 0.4,
+        "gemini-2.5-flash": 2.5,
+        "gemini-2.5-pro": 10.0,
+    }
+    LLM_COST_CEILINGS: Dict[str, float] = {"roadmap": 2.5}
+    LLM_LITE_MODEL: str = "gemini-2.5-flash-lite"  # Used when too many calls are in flight
+    LLM_DEGRADE_IN_FLIGHT: int = 16
+    LLM_ROUTE_MAX_ERROR_RATE: float = 0.2
+    LLM_ROUTE_MIN_SAMPLES: int = 10
+    LLM_ROUTE_EXPLORE_RATE: float = 0.05
+
+    # LLM admission control: token buckets by estimated tokens, fair queueing across callers
+    LLM_RATE_LIMIT_ENABLED: bool = True
+    LLM_GLOBAL_TOKENS_PER_MINUTE: int = 1000000  # Keep under the provider quota
+    LLM_USER_TOKENS_PER_MINUTE: int = 120000
+    LLM_ANONYMOUS_WEIGHT: float = 0.5  # Fair-queue share of anonymous callers relative to users
+    LLM_QUEUE_DEADLINE_SECONDS: float = 10.0  # Reject with 429 rather than queue longer than this
+    FORWARDED_TRUSTED_HOPS: int = 1  # Proxies appending to X-Forwarded-For (Cloud Run: 1); 0 uses the socket peer
+
+    # Circuit breakers for upstreams (Gemini, Supabase auth)
+    CIRCUIT_FAILURE_RATE_THRESHOLD: float = 0.5  # Trip when this share of recent calls fail
+    CIRCUIT_WINDOW_SIZE: int = 20
+    CIRCUIT_MIN_CALLS: int = 10  # Calls in the window before the breaker can trip
+    CIRCUIT_OPEN_SECONDS: float = 30.0  # Fail fast this long before probing again
+    GEMINI_SLOW_CALL_SECONDS: float = 60.0  # Calls slower than this count towards tripping
+    SUPABASE_SLOW_CALL_SECONDS: float = 3.0
+    AUTH_TOKEN_CACHE_TTL_SECONDS: int = 60  # Reuse a token verification for this long
+    AUTH_TOKEN_STALE_SECONDS: int = 900  # Serve older verifications only while Supabase is down
+
+    # Offline LLM for tests and load benchmarks: replays recorded outputs instead of calling Gemini
+    LLM_FAKE_PROVIDER: bool = False
+    LLM_FAKE_CORPUS_DIR: Optional[str] = None  # Defaults to benchmarks/corpus/roadmap_outputs
+    LLM_FAKE_CORPUS_PATTERN: str = "*.txt"
+    LLM_FAKE_LATENCY_MEDIAN_SECONDS: float = 1.0
+    LLM_FAKE_LATENCY_SIGMA: float = 0.0  # Log-normal spread; 0 for a fixed latency
+    LLM_FAKE_FAILURE_RATE: float = 0.0
+    LLM_FAKE_SEED: Optional[int] = None
+
+    # Raw LLM output logging (always logged when parsing fails)
+    LLM_RAW_OUTPUT_SAMPLE_RATE: float = 0.01
+    LLM_RAW_OUTPUT_MAX_CHARS: int = 2000
+
+    # Query cache: in-process L1 backed by a shared Redis L2 (needs REDIS_URL)
+    QUERY_CACHE_MAX_ENTRIES: int = 500
+    QUERY_CACHE_TTL_SECONDS: int = 300
+    QUERY_CACHE_SHARDS: int = 8  # Lock stripes; LRU order is exact only within a shard
+    QUERY_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # Estimated L1 size budget, split across shards
+    QUERY_CACHE_REDIS_ENABLED: bool = True
+    QUERY_CACHE_REDIS_PREFIX: str = "qc:"
+    QUERY_CACHE_REDIS_TIMEOUT_SECONDS: float = 0.05  # L2 reads slower than this count towards tripping
+    QUERY_CACHE_INVALIDATION_CHANNEL: str = "qc:invalidate"
+    QUERY_CACHE_COMPRESS_MIN_BYTES: int = 4096
+    QUERY_CACHE_WRITE_QUEUE_SIZE: int = 10000
+
+    # Generated roadmap result cache (in-process tier backed by Redis)
+    ROADMAP_CACHE_ENABLED: bool = True
+    ROADMAP_CACHE_TTL_SECONDS: int = 86400  # 24 hours
+    ROADMAP_CACHE_MAX_ENTRIES: int = 256
+
+    # Encoded roadmap read responses (bytes + gzip/brotli + ETag)
+    ROADMAP_RESPONSE_CACHE_MAX_ENTRIES: int = 1000
+    ROADMAP_RESPONSE_CACHE_TTL_SECONDS: int = 3600
+    RESPONSE_COMPRESS_MIN_BYTES: int = 1024
+
+    # Near-duplicate request reuse (Jaccard similarity of subject/goal tokens)
+    ROADMAP_SIMILARITY_ENABLED: bool = True
+    ROADMAP_SIMILARITY_THRESHOLD: float = 0.8
+    ROADMAP_SIMILARITY_MAX_ENTRIES: int = 200000
+
+    # Coalescing of identical in-flight generations
+    ROADMAP_SINGLE_FLIGHT_REDIS: bool = False  # Also coalesce across instances via a Redis lock
+    ROADMAP_SINGLE_FLIGHT_LOCK_TTL_SECONDS: int = 120
+    ROADMAP_SINGLE_FLIGHT_WAIT_SECONDS: float = 90.0
+
+    # Roadmap output token budget, scaled by target duration
+    ROADMAP_OUTPUT_TOKENS_MIN: int = 4096
+    ROADMAP_OUTPUT_TOKENS_PER_WEEK: int = 800  # Dense multi-month plans run ~730 tokens a week
+    ROADMAP_OUTPUT_TOKENS_MAX: int = 57344
+    ROADMAP_THINKING_TOKENS: int = 8192  # gemini-2.5 thinking counts against max_output_tokens
+
+    # Continuation calls for roadmaps cut off mid-output
+    ROADMAP_MAX_CONTINUATIONS: int = 2
+
+    # Batch generation
+    ROADMAP_BATCH_MAX_ITEMS: int = 100
+    ROADMAP_BATCH_CONCURRENCY: int = 4
+
+    # Background generation jobs
+    ROADMAP_JOB_WORKERS: int = 2
+    ROADMAP_JOB_TTL_SECONDS: int = 3600
+    ROADMAP_JOB_MAX_QUEUED: int = 500
+    ROADMAP_JOB_MAX_QUEUED_PER_CALLER: int = 5  # Per user or anonymous client address
+    ROADMAP_JOB_REDIS_QUEUE: bool = False
+    ROADMAP_JOB_POP_TIMEOUT_SECONDS: int = 5  # Blocking BRPOP wait per worker
+
     FIREBASE_CREDENTIALS: Optional[str] = None  # Legacy - can be removed after migration
     
     CORS_ALLOWED_ORIGINS: str = Field(
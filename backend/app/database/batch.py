@@ -10,84 +10,169 @@ from datetime import datetime, timedelta
 from collections import defaultdict, namedtuple
 from sqlmodel import Session, select
 from contextlib import contextmanager
+from threading import RLock
 import json
 
 logger = logging.getLogger(__name__)
 
-BatchOperation = namedtuple('BatchOperation', ['table', 'operation', 'data', 'callback'])
+BatchOperation = namedtuple(
+    'BatchOperation', ['table', 'operation', 'data', 'callback', 'attempts', 'on_dropped'], defaults=(0, None)
+)
+
+
+class BatchRowsFailed(RuntimeError):
+    """Some operations of a flush failed on their own; the rest were committed"""
+
+    def __init__(self, failed: List[BatchOperation], error: Exception):
+        super().__init__(f"{len(failed)} batched operations failed: {error}")
+        self.failed = failed
 
 class BatchProcessor:
     """Batches database operations to reduce connection usage"""
     
-    def __init__(self, batch_size: int = 50, flush_interval: float = 2.0):
+    def __init__(self, batch_size: int = 50, flush_interval: float = 2.0, max_attempts: int = 5):
         self.batch_size = batch_size
         self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
         self._pending_operations: List[BatchOperation] = []
         self._last_flush = datetime.utcnow()
         self._callbacks: Dict[str, List[Callable]] = defaultdict(list)
+        self._lock = RLock()
     
     def add_operation(self, table: str, operation: str, data: Dict[str, Any], 
-                     callback: Optional[Callable] = None) -> None:
-        """Add operation to batch queue"""
-        op = BatchOperation(table, operation, data, callback)
-        self._pending_operations.append(op)
+                     callback: Optional[Callable] = None, auto_flush: bool = True,
+                     on_dropped: Optional[Callable] = None) -> None:
+        """Add operation to batch queue
+        
+        Pass auto_flush=False from async code so the caller never runs the
+        flush inline; the periodic flusher picks the operation up instead.
+        on_dropped runs if the operation is given up after max_attempts.
+        """
+        op = BatchOperation(table, operation, data, callback, 0, on_dropped)
+        with self._lock:
+            self._pending_operations.append(op)
+            queue_size = len(self._pending_operations)
         
-        logger.debug(f"Added {operation} operation for {table}, queue size: {len(self._pending_operations)}")
+        logger.debug(f"Added {operation} operation for {table}, queue size: {queue_size}")
         
         # Auto-flush if batch is full or interval exceeded
-        if (len(self._pending_operations) >= self.batch_size or 
+        if auto_flush and (queue_size >= self.batch_size or 
             datetime.utcnow() - self._last_flush > timedelta(seconds=self.flush_interval)):
             self.flush()
     
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending_operations)
+    
     def flush(self, session: Optional[Session] = None) -> None:
         """Execute all pending operations in a single transaction"""
-        if not self._pending_operations:
-            return
+        with self._lock:
+            if not self._pending_operations:
+                return
+            operations = self._pending_operations
+            self._pending_operations = []
+            self._last_flush = datetime.utcnow()
         
-        operations_count = len(self._pending_operations)
+        operations_count = len(operations)
         logger.info(f"Flushing {operations_count} batched operations")
         
         try:
             if session:
-                self._execute_batch(session)
+                self._execute_batch(session, operations)
             else:
                 from app.database.session import get_db
                 with next(get_db()) as db_session:
-                    self._execute_batch(db_session)
+                    self._execute_batch(db_session, operations)
             
             logger.info(f"Successfully executed {operations_count} batched operations")
             
+        except BatchRowsFailed as e:
+            logger.error(f"Batch execution partly failed: {e}")
+            self._requeue(e.failed)
+            raise
         except Exception as e:
             logger.error(f"Batch execution failed: {e}")
+            self._requeue(operations)
             raise
-        finally:
-            self._pending_operations.clear()
-            self._last_flush = datetime.utcnow()
     
-    def _execute_batch(self, session: Session) -> None:
-        """Execute batched operations in a single transaction"""
+    def _requeue(self, operations: List[BatchOperation]) -> None:
+        """Put operations from a failed flush back in front of newer ones, up to max_attempts"""
+        retry = []
+        for op in operations:
+            if op.attempts + 1 >= self.max_attempts:
+                logger.error(
+                    f"Dropping {op.operation} operation for {op.table} id={op.data.get('id')} "
+                    f"after {op.attempts + 1} failed flushes"
+                )
+                if op.on_dropped:
+                    try:
+                        op.on_dropped()
+                    except Exception as e:
+                        logger.error(f"Drop callback failed: {e}")
+            else:
+                retry.append(op._replace(attempts=op.attempts + 1))
+        with self._lock:
+            self._pending_operations = retry + self._pending_operations
+    
+    async def run_periodic_flush(self) -> None:
+        """Flush pending operations every flush_interval, off the event loop"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if not self._pending_operations:
+                continue
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.error(f"Periodic batch flush failed: {e}")
+    
+    def _execute_batch(self, session: Session, operations: List[BatchOperation]) -> None:
+        """Execute batched operations in a single transaction.
+
+        If the transaction fails, each operation is retried in its own
+        transaction so one bad row doesn't hold back the rest; the ones that
+        still fail are raised in BatchRowsFailed.
+        """
+        try:
+            self._execute_transaction(session, operations)
+            return
+        except Exception as e:
+            if len(operations) == 1:
+                raise
+            logger.warning(f"Batch of {len(operations)} operations failed ({e}), retrying them one at a time")
+
+        failed = []
+        error = None
+        for op in operations:
+            try:
+                self._execute_transaction(session, [op])
+            except Exception as e:
+                failed.append(op)
+                error = e
+        if failed:
+            raise BatchRowsFailed(failed, error)
+
+    def _execute_transaction(self, session: Session, operations: List[BatchOperation]) -> None:
         # Group operations by type for efficient execution
         grouped_ops = defaultdict(list)
-        for op in self._pending_operations:
+        for op in operations:
             grouped_ops[f"{op.table}_{op.operation}"].append(op)
         
         try:
-            for operation_type, operations in grouped_ops.items():
-                self._execute_operation_group(session, operations)
+            for operation_type, group in grouped_ops.items():
+                self._execute_operation_group(session, group)
             
             session.commit()
-            
-            # Execute callbacks
-            for op in self._pending_operations:
-                if op.callback:
-                    try:
-                        op.callback()
-                    except Exception as e:
-                        logger.error(f"Callback execution failed: {e}")
-            
-        except Exception as e:
+        except Exception:
             session.rollback()
             raise
+            
+        # Execute callbacks
+        for op in operations:
+            if op.callback:
+                try:
+                    op.callback()
+                except Exception as e:
+                    logger.error(f"Callback execution failed: {e}")
     
     def _execute_operation_group(self, session: Session, operations: List[BatchOperation]) -> None:
         """Execute a group of similar operations efficiently"""
@@ -118,18 +203,12 @@ class BatchProcessor:
     
     def _get_model_class(self, table_name: str):
         """Get SQLModel class for table name"""
-        from app.sql_models import (
-            User, UserBehavior, LearningSession, 
-            UserProgress, Roadmap
-        )
+        from app.sql_models import Goal, Roadmap, User
         
         model_map = {
             'user': User,
-            'userbehavior': UserBehavior,
-            'learningsession': LearningSession,
-            'userprogress': UserProgress,
+            'goal': Goal,
             'roadmap': Roadmap,
-
         }
         
         return model_map.get(table_name.lower())
@@ -3,144 +3,972 @@ Database Query Caching Layer
 Implements intelligent caching to reduce database load
 """
 
+import asyncio
+import heapq
+import inspect
+import itertools
 import logging
 import hashlib
 import json
-import pickle
-from typing import Any, Optional, Dict, Callable, Union
+import math
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional, Dict, Callable, Iterable, List, NamedTuple, Set, Tuple, Union
 from functools import wraps
-from datetime import datetime, timedelta
-import asyncio
-from threading import Lock
+from threading import Event, Lock, Thread
+
+import orjson
+import redis
+
+from app.core.config import settings
+from app.database.compression import DataCompressor
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpenError, circuit_breakers
+from app.utils.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# Items per container inspected, and nodes visited per value, when estimating sizes
+_SIZE_SAMPLE = 8
+_SIZE_BUDGET = 128
+
+def estimate_size(value: Any, _budget: Optional[List[int]] = None) -> int:
+    """Approximate in-memory size of a cached value in bytes.
+
+    Cheap by design: containers are sampled and extrapolated rather than
+    walked in full, and at most _SIZE_BUDGET objects are visited per value.
+    """
+    budget = [_SIZE_BUDGET] if _budget is None else _budget
+    budget[0] -= 1
+    size = sys.getsizeof(value)
+    if budget[0] <= 0 or value is None or isinstance(value, (str, bytes, bytearray, int, float, bool)):
+        return size
+
+    if isinstance(value, dict):
+        items = list(itertools.islice(value.items(), _SIZE_SAMPLE))
+        if items:
+            sampled = sum(estimate_size(k, budget) + estimate_size(v, budget) for k, v in items)
+            size += sampled * len(value) // len(items)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        items = list(itertools.islice(value, _SIZE_SAMPLE))
+        if items:
+            size += sum(estimate_size(v, budget) for v in items) * len(value) // len(items)
+    elif hasattr(value, "__dict__"):
+        size += estimate_size(vars(value), budget)
+    return size
+
+
+def cache_namespace(key: str) -> str:
+    """Stats namespace of a key: the text before its first colon"""
+    namespace, sep, _ = key.partition(":")
+    return namespace if sep else "default"
+
+
+def user_tag(user_id: Union[str, int]) -> str:
+    return f"user:{user_id}"
+
+
+def roadmap_tag(roadmap_id: Union[str, int]) -> str:
+    return f"roadmap:{roadmap_id}"
+
+
+def table_tag(table: str) -> str:
+    return f"table:{table}"
+
+
+class _Entry:
+    __slots__ = ("data", "expires_at", "size", "namespace", "tags")
+
+    def __init__(self, data: Any, expires_at: float, size: int, namespace: str, tags: Tuple[str, ...] = ()):
+        self.data = data
+        self.expires_at = expires_at
+        self.size = size
+        self.namespace = namespace
+        self.tags = tags
+
+
+class _Shard:
+    """One lock-protected LRU segment with a lazy expiry heap, tag index and running totals"""
+
+    __slots__ = ("entries", "expiry", "bytes", "namespaces", "tags", "counters", "lock")
+
+    def __init__(self):
+        self.entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # (expires_at, key); stale pairs are skipped when popped
+        self.expiry: List[Tuple[float, str]] = []
+        self.bytes = 0
+        # namespace -> [entries, bytes]
+        self.namespaces: Dict[str, List[int]] = {}
+        # tag -> keys in this shard carrying it
+        self.tags: Dict[str, Set[str]] = {}
+        self.counters = dict.fromkeys(("hits", "misses", "sets", "evictions", "expirations", "deletes"), 0)
+        self.lock = Lock()
+
+    def add(self, key: str, entry: _Entry) -> None:
+        self.entries[key] = entry
+        self.bytes += entry.size
+        totals = self.namespaces.get(entry.namespace)
+        if totals is None:
+            totals = self.namespaces[entry.namespace] = [0, 0]
+        totals[0] += 1
+        totals[1] += entry.size
+        for tag in entry.tags:
+            self.tags.setdefault(tag, set()).add(key)
+
+    def _forget(self, key: str, entry: _Entry) -> None:
+        self.bytes -= entry.size
+        totals = self.namespaces[entry.namespace]
+        totals[0] -= 1
+        totals[1] -= entry.size
+        if not totals[0]:
+            del self.namespaces[entry.namespace]
+        for tag in entry.tags:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+    def remove(self, key: str) -> Optional[_Entry]:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self._forget(key, entry)
+        return entry
+
+    def evict_lru(self) -> str:
+        key, entry = self.entries.popitem(last=False)
+        self._forget(key, entry)
+        self.counters["evictions"] += 1
+        return key
+
+    def purge_expired(self, now: float, limit: int = 8) -> int:
+        """Drop up to limit expired entries from the heap top; amortized O(log n)"""
+        purged = 0
+        while self.expiry and self.expiry[0][0] <= now and purged < limit:
+            expires_at, key = heapq.heappop(self.expiry)
+            entry = self.entries.get(key)
+            if entry is not None and entry.expires_at == expires_at:
+                self.remove(key)
+                purged += 1
+        self.counters["expirations"] += purged
+        return purged
+
+    def compact_expiry(self) -> None:
+        # Re-sets and deletes leave stale heap pairs behind; rebuild once they dominate
+        if len(self.expiry) > 2 * len(self.entries) + 64:
+            self.expiry = [(e.expires_at, k) for k, e in self.entries.items()]
+            heapq.heapify(self.expiry)
+
+
 class QueryCache:
-    """In-memory cache for database queries with TTL and LRU eviction"""
-    
-    def __init__(self, max_size: int = 1000, default_ttl: int = 300):
+    """In-memory cache with TTL and LRU eviction.
+
+    Keys are spread over lock-striped shards. Each shard is an OrderedDict
+    kept in recency order (O(1) hit, insert and LRU eviction) plus a heap of
+    expiry times that is drained lazily on writes. Capacity is bounded by
+    entry count and, optionally, by estimated bytes. Sizes are estimated once
+    at set time and kept as running totals per key namespace, so stats are
+    O(shards + namespaces) regardless of how many entries are cached.
+    """
+
+    def __init__(self, max_size: int = 1000, default_ttl: int = 300,
+                 max_bytes: Optional[int] = None, shards: Optional[int] = None,
+                 clock: Callable[[], float] = time.monotonic):
         self.max_size = max_size
         self.default_ttl = default_ttl
-        self._cache: Dict[str, Dict] = {}
-        self._access_order: Dict[str, datetime] = {}
-        self._lock = Lock()
-    
+        self.max_bytes = max_bytes
+        self.clock = clock
+        # Small caches keep one shard so LRU order stays exact
+        shard_count = shards or max(1, min(16, max_size // 256))
+        self._shards = [_Shard() for _ in range(shard_count)]
+        self._shard_max_size = max(1, math.ceil(max_size / shard_count))
+        self._shard_max_bytes = math.ceil(max_bytes / shard_count) if max_bytes else None
+
     def _generate_key(self, query: str, params: Dict = None) -> str:
         """Generate cache key from query and parameters"""
         key_data = {"query": query, "params": params or {}}
         key_string = json.dumps(key_data, sort_keys=True, default=str)
         return hashlib.md5(key_string.encode()).hexdigest()
-    
+
+    def _shard(self, key: str) -> _Shard:
+        return self._shards[hash(key) % len(self._shards)]
+
     def get(self, key: str) -> Optional[Any]:
         """Get cached result if not expired"""
-        with self._lock:
-            if key not in self._cache:
+        shard = self._shard(key)
+        with shard.lock:
+            entry = shard.entries.get(key)
+            if entry is None:
+                shard.counters["misses"] += 1
                 return None
-            
-            entry = self._cache[key]
-            now = datetime.utcnow()
-            
-            # Check if expired
-            if now > entry['expires_at']:
-                del self._cache[key]
-                self._access_order.pop(key, None)
+
+            if self.clock() >= entry.expires_at:
+                shard.remove(key)
+                shard.counters["expirations"] += 1
+                shard.counters["misses"] += 1
                 return None
-            
-            # Update access order
-            self._access_order[key] = now
-            logger.debug(f"Cache HIT for key: {key[:8]}...")
-            return entry['data']
-    
-    def set(self, key: str, data: Any, ttl: Optional[int] = None) -> None:
-        """Set cached result with TTL"""
-        with self._lock:
-            # Evict oldest if at capacity
-            if len(self._cache) >= self.max_size:
-                self._evict_oldest()
-            
-            ttl = ttl or self.default_ttl
-            expires_at = datetime.utcnow() + timedelta(seconds=ttl)
-            
-            self._cache[key] = {
-                'data': data,
-                'expires_at': expires_at,
-                'created_at': datetime.utcnow()
-            }
-            self._access_order[key] = datetime.utcnow()
-            
-            logger.debug(f"Cache SET for key: {key[:8]}... (TTL: {ttl}s)")
-    
-    def _evict_oldest(self):
-        """Evict the oldest accessed entry"""
-        if not self._access_order:
+
+            shard.entries.move_to_end(key)
+            shard.counters["hits"] += 1
+            return entry.data
+
+    def set(self, key: str, data: Any, ttl: Optional[int] = None, tags: Iterable[str] = ()) -> None:
+        """Set cached result with TTL; tags let delete_tag find the entry later"""
+        ttl = ttl or self.default_ttl
+        size = estimate_size(key) + estimate_size(data)
+        if self._shard_max_bytes is not None and size > self._shard_max_bytes:
+            logger.debug(f"Cache SKIP for key: {key[:8]}... ({size} bytes exceeds the shard budget)")
+            self.delete(key)
             return
-        
-        oldest_key = min(self._access_order.keys(), 
-                        key=lambda k: self._access_order[k])
-        
-        self._cache.pop(oldest_key, None)
-        self._access_order.pop(oldest_key, None)
-        logger.debug(f"Cache EVICTED key: {oldest_key[:8]}...")
-    
+
+        shard = self._shard(key)
+        now = self.clock()
+        entry = _Entry(data, now + ttl, size, cache_namespace(key), tuple(tags))
+        with shard.lock:
+            shard.remove(key)
+            shard.add(key, entry)
+            shard.counters["sets"] += 1
+            heapq.heappush(shard.expiry, (entry.expires_at, key))
+
+            shard.purge_expired(now)
+            while len(shard.entries) > self._shard_max_size or (
+                self._shard_max_bytes is not None and shard.bytes > self._shard_max_bytes
+            ):
+                evicted_key = shard.evict_lru()
+                logger.debug(f"Cache EVICTED key: {evicted_key[:8]}...")
+            shard.compact_expiry()
+
+    def delete(self, key: str) -> None:
+        """Remove a single cached entry"""
+        shard = self._shard(key)
+        with shard.lock:
+            if shard.remove(key) is not None:
+                shard.counters["deletes"] += 1
+
+    def delete_tag(self, tag: str) -> int:
+        """Remove every entry carrying tag; O(shards + entries with the tag)"""
+        removed = 0
+        for shard in self._shards:
+            with shard.lock:
+                keys = shard.tags.pop(tag, None)
+                if not keys:
+                    continue
+                for key in keys:
+                    shard.remove(key)
+                shard.counters["deletes"] += len(keys)
+                removed += len(keys)
+        return removed
+
+    def delete_prefix(self, prefix: str) -> int:
+        """Remove every entry whose key starts with prefix; O(entries), prefer delete_tag"""
+        removed = 0
+        for shard in self._shards:
+            with shard.lock:
+                keys = [key for key in shard.entries if key.startswith(prefix)]
+                for key in keys:
+                    shard.remove(key)
+                shard.counters["deletes"] += len(keys)
+                removed += len(keys)
+        return removed
+
     def clear(self):
         """Clear all cached entries"""
-        with self._lock:
-            self._cache.clear()
-            self._access_order.clear()
-            logger.info("Cache cleared")
-    
+        for shard in self._shards:
+            with shard.lock:
+                shard.entries.clear()
+                shard.expiry.clear()
+                shard.namespaces.clear()
+                shard.tags.clear()
+                shard.bytes = 0
+        logger.info("Cache cleared")
+
+    def __len__(self) -> int:
+        return sum(len(shard.entries) for shard in self._shards)
+
     def get_stats(self) -> Dict[str, Any]:
-        """Get cache statistics"""
-        with self._lock:
-            now = datetime.utcnow()
-            expired_count = sum(1 for entry in self._cache.values() 
-                               if now > entry['expires_at'])
-            
-            return {
-                "total_entries": len(self._cache),
-                "max_size": self.max_size,
-                "expired_entries": expired_count,
-                "memory_usage_mb": len(pickle.dumps(self._cache)) / (1024 * 1024)
-            }
+        """Get cache statistics from running totals; never walks the entries"""
+        counters = dict.fromkeys(self._shards[0].counters, 0)
+        namespaces: Dict[str, Dict[str, int]] = {}
+        total_entries = total_bytes = total_tags = 0
+        for shard in self._shards:
+            with shard.lock:
+                total_entries += len(shard.entries)
+                total_tags += len(shard.tags)
+                total_bytes += shard.bytes
+                for name, value in shard.counters.items():
+                    counters[name] += value
+                for namespace, (entries, size) in shard.namespaces.items():
+                    totals = namespaces.setdefault(namespace, {"entries": 0, "bytes": 0})
+                    totals["entries"] += entries
+                    totals["bytes"] += size
+
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "total_entries": total_entries,
+            "max_size": self.max_size,
+            "max_bytes": self.max_bytes,
+            "shards": len(self._shards),
+            "bytes": total_bytes,
+            "memory_usage_mb": total_bytes / (1024 * 1024),
+            "tags": total_tags,
+            **counters,
+            "hit_rate": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+            "namespaces": namespaces,
+        }
+
+# L2 payload header byte: how the JSON envelope that follows is stored
+_RAW = b"\x00"
+_GZIP = b"\x01"
+
+# Bump when the envelope layout changes; other versions read as misses
+_ENVELOPE_VERSION = 1
+_DATETIME = "$datetime"
+_DATE = "$date"
+
+
+def _encode_default(obj: Any) -> Any:
+    # orjson would write datetimes as bare strings; tag them so they come back typed
+    if isinstance(obj, datetime):
+        return {_DATETIME: obj.isoformat()}
+    if isinstance(obj, date):
+        return {_DATE: obj.isoformat()}
+    raise TypeError(f"Type is not cacheable in Redis: {type(obj).__name__}")
+
+
+def _revive(node: Any) -> Any:
+    if isinstance(node, dict):
+        if len(node) == 1:
+            if _DATETIME in node:
+                return datetime.fromisoformat(node[_DATETIME])
+            if _DATE in node:
+                return date.fromisoformat(node[_DATE])
+        return {key: _revive(value) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_revive(value) for value in node]
+    return node
+
+_GLOB_CHARS = re.compile(r"([*?\[\]\\])")
+
+
+class RedisCacheTier:
+    """Shared L2 tier: values in Redis, invalidations over pub/sub.
+
+    Values are stored as an orjson envelope, never pickled, so a write to
+    the shared Redis cannot execute code on the instances that read it.
+    Datetimes are tagged to come back typed, tuples come back as lists, and
+    a CachedResult keeps its fields by name. Large payloads are gzipped.
+    Each tag is a Redis set of the keys carrying it, kept alive as long as
+    its longest-lived member.
+    """
+
+    def __init__(self, url: str, prefix: str = "qc:", channel: str = "qc:invalidate",
+                 timeout: float = 0.05, compress_min_bytes: int = 4096,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.url = url
+        self.prefix = prefix
+        self.channel = channel
+        self.timeout = timeout
+        self.compress_min_bytes = compress_min_bytes
+        self.breaker = breaker or circuit_breakers.get("redis_cache", slow_call_seconds=timeout)
+        self._client: Optional[redis.Redis] = None
+
+    @property
+    def client(self) -> redis.Redis:
+        # One pooled client with tight timeouts; get_redis_client() pings on every use
+        if self._client is None:
+            self._client = redis.Redis.from_url(
+                self.url,
+                socket_connect_timeout=self.timeout,
+                socket_timeout=self.timeout,
+                health_check_interval=30,
+            )
+        return self._client
+
+    def encode(self, value: Any, tags: Tuple[str, ...] = ()) -> bytes:
+        envelope = {"v": _ENVELOPE_VERSION, "tags": list(tags)}
+        if isinstance(value, CachedResult):
+            envelope["result"] = value._asdict()
+        else:
+            envelope["value"] = value
+        payload = orjson.dumps(envelope, default=_encode_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        if len(payload) >= self.compress_min_bytes:
+            return _GZIP + DataCompressor.compress_bytes(payload)
+        return _RAW + payload
+
+    @staticmethod
+    def decode(payload: bytes) -> Optional[Tuple[Any, Tuple[str, ...]]]:
+        """Return (value, tags), or None for a payload this version can't read"""
+        body = payload[1:]
+        if payload[:1] == _GZIP:
+            body = DataCompressor.decompress_bytes(body)
+        envelope = orjson.loads(body)
+        if not isinstance(envelope, dict) or envelope.get("v") != _ENVELOPE_VERSION:
+            return None
+        if "result" in envelope:
+            value = CachedResult(**_revive(envelope["result"]))
+        else:
+            value = _revive(envelope["value"])
+        return value, tuple(envelope["tags"])
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.prefix}tag:{tag}"
+
+    def get(self, key: str) -> Optional[Tuple[Any, Optional[float], Tuple[str, ...]]]:
+        """Return (value, seconds to live, tags) or None; raises CircuitOpenError while open"""
+        with self.breaker.protect():
+            pipe = self.client.pipeline(transaction=False)
+            pipe.get(self.prefix + key)
+            pipe.pttl(self.prefix + key)
+            payload, ttl_ms = pipe.execute()
+        if payload is None:
+            return None
+        try:
+            decoded = self.decode(payload)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable query cache entry {key[:32]}: {e}")
+            decoded = None
+        if decoded is None:
+            return None
+        value, tags = decoded
+        return value, ttl_ms / 1000 if ttl_ms > 0 else None, tags
+
+    def set(self, key: str, value: Any, ttl: float, tags: Tuple[str, ...] = ()) -> None:
+        payload = self.encode(value, tags)
+        ttl_ms = max(1, int(ttl * 1000))
+        with self.breaker.protect():
+            pipe = self.client.pipeline(transaction=False)
+            pipe.set(self.prefix + key, payload, px=ttl_ms)
+            for tag in tags:
+                tag_key = self._tag_key(tag)
+                pipe.sadd(tag_key, self.prefix + key)
+                # NX gives a new set a TTL, GT only ever extends it
+                pipe.pexpire(tag_key, ttl_ms, nx=True)
+                pipe.pexpire(tag_key, ttl_ms, gt=True)
+            pipe.execute()
+
+    def delete_tag(self, tag: str) -> None:
+        tag_key = self._tag_key(tag)
+        with self.breaker.protect():
+            keys = self.client.smembers(tag_key)
+            self.client.unlink(tag_key, *keys)
+
+    def delete(self, key: str) -> None:
+        with self.breaker.protect():
+            self.client.unlink(self.prefix + key)
+
+    def delete_prefix(self, prefix: str) -> None:
+        pattern = self.prefix + _GLOB_CHARS.sub(r"\\\1", prefix) + "*"
+        with self.breaker.protect():
+            batch = []
+            for key in self.client.scan_iter(match=pattern, count=500):
+                batch.append(key)
+                if len(batch) >= 500:
+                    self.client.unlink(*batch)
+                    batch = []
+            if batch:
+                self.client.unlink(*batch)
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        with self.breaker.protect():
+            self.client.publish(self.channel, orjson.dumps(message))
+
+    def listen(self, handler: Callable[[Dict[str, Any]], None],
+               on_subscribed: Callable[[], None], stop: Event) -> None:
+        """Deliver invalidation messages until stop is set, resubscribing after errors"""
+        backoff = 1.0
+        while not stop.is_set():
+            pubsub = None
+            try:
+                # Blocking reads need their own connection without the short read timeout
+                client = redis.Redis.from_url(self.url, socket_connect_timeout=1.0, health_check_interval=30)
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                on_subscribed()
+                backoff = 1.0
+                while not stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    try:
+                        handler(orjson.loads(message["data"]))
+                    except Exception as e:
+                        logger.warning(f"Ignoring malformed cache invalidation: {e}")
+            except Exception as e:
+                logger.debug(f"Cache invalidation subscriber disconnected: {e}")
+                stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+
+def _apply_invalidation(cache: QueryCache, op: str, target: str) -> None:
+    if op == "delete":
+        cache.delete(target)
+    elif op == "tag":
+        cache.delete_tag(target)
+    elif op == "prefix":
+        cache.delete_prefix(target)
+
+
+class TieredCache:
+    """QueryCache (L1) in front of a shared Redis tier (L2).
+
+    An L1 miss falls through to L2 and refills L1 with the remaining TTL.
+    Writes and invalidations reach Redis from a background thread, so callers
+    never wait on them, and invalidations are published so every instance
+    drops its L1 copy. While Redis fails, the tier's circuit breaker is open
+    and the cache behaves as L1 alone.
+    """
+
+    def __init__(self, l1: QueryCache, l2: Optional[RedisCacheTier] = None, write_queue_size: int = 10000):
+        self.l1 = l1
+        self.l2 = l2
+        # Other in-process caches whose invalidations ride the same channel
+        self._attached: Dict[str, QueryCache] = {}
+        self.instance_id = uuid.uuid4().hex
+        self._writes: "queue.Queue[Optional[Tuple[Any, ...]]]" = queue.Queue(maxsize=write_queue_size)
+        self._stop = Event()
+        self._threads: List[Thread] = []
+        self._start_lock = Lock()
+        self._stats_lock = Lock()
+        self._stats = dict.fromkeys((
+            "l2_hits", "l2_misses", "l2_errors", "l2_writes", "l2_dropped",
+            "invalidations_sent", "invalidations_received", "resyncs",
+        ), 0)
+
+    def _count(self, counter: str) -> None:
+        with self._stats_lock:
+            self._stats[counter] += 1
+
+    @property
+    def default_ttl(self) -> int:
+        return self.l1.default_ttl
+
+    def _generate_key(self, query: str, params: Dict = None) -> str:
+        return self.l1._generate_key(query, params)
+
+    def start(self) -> None:
+        """Start the Redis writer and invalidation subscriber; no-op without L2"""
+        if self.l2 is None or self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            self._threads = [
+                Thread(target=self._write_loop, name="query-cache-l2-writer", daemon=True),
+                Thread(
+                    target=self.l2.listen,
+                    args=(self._on_invalidation, self._on_subscribed, self._stop),
+                    name="query-cache-invalidations",
+                    daemon=True,
+                ),
+            ]
+            for thread in self._threads:
+                thread.start()
+        logger.info("Query cache L2 tier started")
+
+    def stop(self, timeout: float = 2.0) -> None:
+        with self._start_lock:
+            threads, self._threads = self._threads, []
+        if not threads:
+            return
+        self._stop.set()
+        try:
+            self._writes.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        for thread in threads:
+            thread.join(timeout)
+
+    def flush(self) -> None:
+        """Wait until queued L2 writes and invalidations have been applied"""
+        if self._threads:
+            self._writes.join()
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.l1.get(key)
+        if value is not None or self.l2 is None:
+            return value
+        return self._get_remote(key)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """get() for async callers; an L1 miss reads Redis off the event loop"""
+        value = self.l1.get(key)
+        if value is not None or self.l2 is None:
+            return value
+        if self.l2.breaker.retry_after() > 0:
+            return None
+        return await asyncio.to_thread(self._get_remote, key)
+
+    def _get_remote(self, key: str) -> Optional[Any]:
+        try:
+            found = self.l2.get(key)
+        except CircuitOpenError:
+            return None
+        except Exception as e:
+            self._count("l2_errors")
+            logger.debug(f"Query cache L2 read failed: {e}")
+            return None
+
+        if found is None:
+            self._count("l2_misses")
+            return None
+        value, ttl, tags = found
+        self._count("l2_hits")
+        self.l1.set(key, value, ttl, tags)
+        return value
+
+    def set(self, key: str, data: Any, ttl: Optional[int] = None, tags: Iterable[str] = ()) -> None:
+        tags = tuple(tags)
+        self.l1.set(key, data, ttl, tags)
+        if self.l2 is not None:
+            self._enqueue(("set", key, data, ttl or self.l1.default_ttl, tags))
+
+    def delete(self, key: str) -> None:
+        self.l1.delete(key)
+        if self.l2 is not None:
+            self._enqueue(("delete", key))
+
+    def delete_tag(self, tag: str) -> int:
+        removed = self.l1.delete_tag(tag)
+        if self.l2 is not None:
+            self._enqueue(("tag", tag))
+        return removed
+
+    def delete_prefix(self, prefix: str) -> int:
+        removed = self.l1.delete_prefix(prefix)
+        if self.l2 is not None:
+            self._enqueue(("prefix", prefix))
+        return removed
+
+    def clear(self):
+        """Clear this instance's L1; the shared tier is left alone"""
+        self.l1.clear()
+
+    def attach(self, name: str, cache: QueryCache) -> None:
+        """Share invalidations for a process-local cache that has no Redis copy"""
+        self._attached[name] = cache
+
+    def invalidate_attached(self, name: str, op: str, target: str) -> None:
+        """Apply an invalidation to an attached cache here and on every other instance"""
+        _apply_invalidation(self._attached[name], op, target)
+        if self.l2 is not None:
+            self._enqueue(("attached", name, op, target))
+
+    def __len__(self) -> int:
+        return len(self.l1)
+
+    def _enqueue(self, operation: Tuple[Any, ...]) -> None:
+        # Don't queue work for a tier that is known to be down
+        if self.l2.breaker.retry_after() > 0:
+            self._count("l2_dropped")
+            return
+        self.start()
+        try:
+            self._writes.put_nowait(operation)
+        except queue.Full:
+            self._count("l2_dropped")
+
+    def _write_loop(self) -> None:
+        while True:
+            operation = self._writes.get()
+            try:
+                if operation is None:
+                    return
+                self._apply_remote(operation)
+            except CircuitOpenError:
+                self._count("l2_dropped")
+            except Exception as e:
+                self._count("l2_errors")
+                logger.debug(f"Query cache L2 {operation[0]} failed: {e}")
+            finally:
+                self._writes.task_done()
+
+    def _apply_remote(self, operation: Tuple[Any, ...]) -> None:
+        kind, target = operation[0], operation[1]
+        if kind == "attached":
+            # Attached caches live only in process memory; there is nothing to delete in Redis
+            self.l2.publish({"origin": self.instance_id, "cache": target, "op": operation[2], "target": operation[3]})
+            self._count("invalidations_sent")
+            return
+        if kind == "set":
+            self.l2.set(target, operation[2], operation[3], operation[4])
+            self._count("l2_writes")
+            return
+
+        if kind == "delete":
+            self.l2.delete(target)
+        elif kind == "tag":
+            self.l2.delete_tag(target)
+        else:
+            self.l2.delete_prefix(target)
+        self.l2.publish({"origin": self.instance_id, "op": kind, "target": target})
+        self._count("invalidations_sent")
+
+    def _on_invalidation(self, message: Dict[str, Any]) -> None:
+        if message.get("origin") == self.instance_id:
+            return
+        name = message.get("cache")
+        cache = self.l1 if name is None else self._attached.get(name)
+        if cache is None:
+            return
+        _apply_invalidation(cache, message["op"], message["target"])
+        self._count("invalidations_received")
+
+    def _on_subscribed(self) -> None:
+        # Invalidations published while unsubscribed were missed; drop what they may cover
+        self.l1.clear()
+        for cache in self._attached.values():
+            cache.clear()
+        self._count("resyncs")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            l2_stats = dict(self._stats)
+        l2_stats.update({
+            "enabled": self.l2 is not None,
+            "queued": self._writes.qsize(),
+            "circuit": self.l2.breaker.state if self.l2 is not None else None,
+        })
+        return {**self.l1.get_stats(), "l2": l2_stats}
+
 
 # Global cache instance
-query_cache = QueryCache(max_size=500, default_ttl=300)  # 5 minutes default
+query_cache = TieredCache(
+    QueryCache(
+        max_size=settings.QUERY_CACHE_MAX_ENTRIES,
+        default_ttl=settings.QUERY_CACHE_TTL_SECONDS,
+        max_bytes=settings.QUERY_CACHE_MAX_BYTES,
+        shards=settings.QUERY_CACHE_SHARDS,
+    ),
+    RedisCacheTier(
+        settings.REDIS_URL,
+        prefix=settings.QUERY_CACHE_REDIS_PREFIX,
+        channel=settings.QUERY_CACHE_INVALIDATION_CHANNEL,
+        timeout=settings.QUERY_CACHE_REDIS_TIMEOUT_SECONDS,
+        compress_min_bytes=settings.QUERY_CACHE_COMPRESS_MIN_BYTES,
+    ) if settings.REDIS_URL and settings.QUERY_CACHE_REDIS_ENABLED else None,
+    write_queue_size=settings.QUERY_CACHE_WRITE_QUEUE_SIZE,
+)
+
+class CachedResult(NamedTuple):
+    """What cached_query stores: the result plus when it stops being fresh.
 
-def cached_query(ttl: int = 300, cache_key_func: Optional[Callable] = None):
+    Times are wall-clock so records shared through Redis mean the same on
+    every instance. A None value is a cached negative result.
     """
-    Decorator for caching database query results
+    value: Any
+    fresh_until: float
+    compute_seconds: float
+
+
+class ThreadSingleFlight:
+    """Coalesce identical concurrent sync calls across threads"""
+
+    class _Flight:
+        __slots__ = ("done", "result", "error")
+
+        def __init__(self):
+            self.done = Event()
+            self.result = None
+            self.error: Optional[BaseException] = None
+
+    def __init__(self):
+        self._flights: Dict[str, "ThreadSingleFlight._Flight"] = {}
+        self._lock = Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = self._Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+
+_async_flight = SingleFlight("cached_query")
+_thread_flight = ThreadSingleFlight()
+
+# Keys with a background refresh in progress, so each is refreshed once
+_refreshing: Set[str] = set()
+_refreshing_lock = Lock()
+_refresh_tasks: Set[asyncio.Future] = set()
+_refresh_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _claim_refresh(key: str) -> bool:
+    with _refreshing_lock:
+        if key in _refreshing:
+            return False
+        _refreshing.add(key)
+        return True
+
+
+def _release_refresh(key: str) -> None:
+    with _refreshing_lock:
+        _refreshing.discard(key)
+
+
+def _get_refresh_executor() -> ThreadPoolExecutor:
+    global _refresh_executor
+    with _refreshing_lock:
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+        return _refresh_executor
+
+
+def _needs_refresh(record: CachedResult, beta: float) -> bool:
+    """Expired, or picked for early refresh (XFetch).
+
+    The chance rises as expiry nears and with how long the result took to
+    compute, so one caller usually refreshes before the others see a miss.
+    """
+    now = time.time()
+    if now >= record.fresh_until:
+        return True
+    if beta <= 0 or record.compute_seconds <= 0:
+        return False
+    return now - record.compute_seconds * beta * math.log(1.0 - random.random()) >= record.fresh_until
+
+
+def cached_query(ttl: int = 300, cache_key_func: Optional[Callable] = None,
+                 tags: Union[Iterable[str], Callable[..., Iterable[str]]] = (),
+                 result_tags: Optional[Callable[[Any], Iterable[str]]] = None,
+                 negative_ttl: Optional[int] = None, stale_ttl: int = 0,
+                 early_refresh_beta: float = 1.0, single_flight: bool = True):
+    """
+    Decorator for caching database query results; wraps sync and async functions
     
     Args:
         ttl: Time to live in seconds
         cache_key_func: Custom function to generate cache key
+        tags: Invalidation tags (see user_tag, roadmap_tag, table_tag), or a
+            function of the call arguments returning them
+        result_tags: Function of a non-None result returning more tags
+        negative_ttl: Also cache None results for this long; None disables it
+        stale_ttl: Keep serving an expired result this much longer while it
+            is refreshed in the background. Only enable it when the function
+            can run after the request that called it, e.g. it opens its own
+            session
+        early_refresh_beta: Weight of probabilistic early refresh; 0 disables it
+        single_flight: Concurrent misses for a key share one call
     """
     def decorator(func):
+        is_async = inspect.iscoroutinefunction(func)
+
+        def make_key(args, kwargs) -> str:
+            if cache_key_func:
+                return cache_key_func(*args, **kwargs)
+            # Default key generation
+            key_data = {
+                'func': func.__name__,
+                'args': str(args),
+                'kwargs': str(sorted(kwargs.items()))
+            }
+            return query_cache._generate_key(json.dumps(key_data, default=str))
+
+        def check(record: Any) -> Tuple[Optional[CachedResult], bool]:
+            if not isinstance(record, CachedResult):
+                return None, True
+            return record, _needs_refresh(record, early_refresh_beta)
+
+        def lookup(cache_key: str) -> Tuple[Optional[CachedResult], bool]:
+            return check(query_cache.get(cache_key))
+
+        def store(cache_key: str, args, kwargs, result: Any, elapsed: float) -> None:
+            if result is None and negative_ttl is None:
+                # Don't leave an older result to be served stale
+                query_cache.delete(cache_key)
+                return
+            fresh_ttl = ttl if result is not None else negative_ttl
+            entry_tags = list(tags(*args, **kwargs) if callable(tags) else tags)
+            if result is not None and result_tags is not None:
+                entry_tags.extend(result_tags(result))
+            record = CachedResult(result, time.time() + fresh_ttl, elapsed)
+            query_cache.set(cache_key, record, fresh_ttl + stale_ttl, tags=entry_tags)
+
+        if is_async:
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                cache_key = make_key(args, kwargs)
+                record, refresh = check(await query_cache.aget(cache_key))
+                if not refresh:
+                    return record.value
+
+                async def compute():
+                    start = time.perf_counter()
+                    result = await func(*args, **kwargs)
+                    store(cache_key, args, kwargs, result, time.perf_counter() - start)
+                    return result
+
+                async def run():
+                    return await (_async_flight.do(cache_key, compute) if single_flight else compute())
+
+                if record is not None and stale_ttl:
+                    if _claim_refresh(cache_key):
+                        task = asyncio.ensure_future(_refresh_async(cache_key, run))
+                        _refresh_tasks.add(task)
+                        task.add_done_callback(_refresh_tasks.discard)
+                    return record.value
+
+                try:
+                    return await run()
+                except Exception as e:
+                    logger.error(f"Query execution failed: {e}")
+                    raise
+
+            return async_wrapper
+
         @wraps(func)
         def wrapper(*args, **kwargs):
-            # Generate cache key
-            if cache_key_func:
-                cache_key = cache_key_func(*args, **kwargs)
-            else:
-                # Default key generation
-                key_data = {
-                    'func': func.__name__,
-                    'args': str(args),
-                    'kwargs': str(sorted(kwargs.items()))
-                }
-                cache_key = query_cache._generate_key(
-                    json.dumps(key_data, default=str)
-                )
-            
-            # Try to get from cache
-            cached_result = query_cache.get(cache_key)
-            if cached_result is not None:
-                return cached_result
-            
-            # Execute function and cache result
-            try:
+            cache_key = make_key(args, kwargs)
+            record, refresh = lookup(cache_key)
+            if not refresh:
+                return record.value
+
+            def compute():
+                start = time.perf_counter()
                 result = func(*args, **kwargs)
-                query_cache.set(cache_key, result, ttl)
+                store(cache_key, args, kwargs, result, time.perf_counter() - start)
                 return result
+
+            def run():
+                return _thread_flight.do(cache_key, compute) if single_flight else compute()
+
+            if record is not None and stale_ttl:
+                if _claim_refresh(cache_key):
+                    _get_refresh_executor().submit(_refresh_sync, cache_key, run)
+                return record.value
+
+            try:
+                return run()
             except Exception as e:
                 logger.error(f"Query execution failed: {e}")
                 raise
@@ -148,32 +976,55 @@ def cached_query(ttl: int = 300, cache_key_func: Optional[Callable] = None):
         return wrapper
     return decorator
 
+async def _refresh_async(cache_key: str, run: Callable[[], Any]) -> None:
+    try:
+        await run()
+    except Exception as e:
+        logger.warning(f"Background cache refresh failed, keeping the stale result: {e}")
+    finally:
+        _release_refresh(cache_key)
+
+def _refresh_sync(cache_key: str, run: Callable[[], Any]) -> None:
+    try:
+        run()
+    except Exception as e:
+        logger.warning(f"Background cache refresh failed, keeping the stale result: {e}")
+    finally:
+        _release_refresh(cache_key)
+
+def _kwargs_digest(kwargs: Dict[str, Any]) -> str:
+    # hash() of a str differs per process, so it can't name keys shared through Redis
+    key_string = json.dumps(kwargs, sort_keys=True, default=str)
+    return hashlib.md5(key_string.encode()).hexdigest()[:16]
+
 # Specialized cache functions for common query patterns
 
-def cache_user_query(user_id: Union[str, int], query_type: str, ttl: int = 300):
-    """Cache user-specific queries"""
+def cache_user_query(user_id: Union[str, int], query_type: str, ttl: int = 300,
+                     tags: Iterable[str] = (), **options: Any):
+    """Cache user-specific queries; options are passed to cached_query"""
     def cache_key_func(*args, **kwargs):
-        return f"user:{user_id}:{query_type}:{hash(str(kwargs))}"
+        return f"user:{user_id}:{query_type}:{_kwargs_digest(kwargs)}"
     
-    return cached_query(ttl=ttl, cache_key_func=cache_key_func)
+    return cached_query(ttl=ttl, cache_key_func=cache_key_func, tags=(user_tag(user_id), *tags), **options)
 
-def cache_roadmap_query(roadmap_id: Union[str, int], ttl: int = 600):
+def cache_roadmap_query(roadmap_id: Union[str, int], ttl: int = 600, tags: Iterable[str] = (), **options: Any):
     """Cache roadmap queries (longer TTL as they change less frequently)"""
     def cache_key_func(*args, **kwargs):
-        return f"roadmap:{roadmap_id}:{hash(str(kwargs))}"
+        return f"roadmap:{roadmap_id}:{_kwargs_digest(kwargs)}"
     
-    return cached_query(ttl=ttl, cache_key_func=cache_key_func)
+    return cached_query(ttl=ttl, cache_key_func=cache_key_func, tags=(roadmap_tag(roadmap_id), *tags), **options)
 
 def invalidate_user_cache(user_id: Union[str, int]):
-    """Invalidate all cached queries for a user"""
-    with query_cache._lock:
-        keys_to_remove = [
-            key for key in query_cache._cache.keys() 
-            if key.startswith(f"user:{user_id}:")
-        ]
-        
-        for key in keys_to_remove:
-            query_cache._cache.pop(key, None)
-            query_cache._access_order.pop(key, None)
-        
-        logger.info(f"Invalidated {len(keys_to_remove)} cache entries for user {user_id}")
\ No newline at end of file
+    """Invalidate all cached queries tagged with a user"""
+    removed = query_cache.delete_tag(user_tag(user_id))
+    logger.info(f"Invalidated {removed} cache entries for user {user_id}")
+
+def invalidate_roadmap_cache(roadmap_id: Union[str, int]):
+    """Invalidate cached queries tagged with a roadmap"""
+    removed = query_cache.delete_tag(roadmap_tag(roadmap_id))
+    logger.debug(f"Invalidated {removed} cache entries for roadmap {roadmap_id}")
+
+def invalidate_table_cache(table: str):
+    """Invalidate cached queries tagged with a table, e.g. after a bulk write"""
+    removed = query_cache.delete_tag(table_tag(table))
+    logger.info(f"Invalidated {removed} cache entries for table {table}")
@@ -55,6 +55,16 @@ class DataCompressor:
             logger.error(f"Text decompression failed: {e}")
             raise
     
+    @staticmethod
+    def compress_bytes(data: bytes, level: int = 6) -> bytes:
+        """Compress an already-serialized payload using gzip"""
+        return gzip.compress(data, compresslevel=level)
+
+    @staticmethod
+    def decompress_bytes(compressed_data: bytes) -> bytes:
+        """Decompress a gzipped payload"""
+        return gzip.decompress(compressed_data)
+
     @staticmethod
     def should_compress(data: str, min_size: int = 1000) -> bool:
         """Determine if data should be compressed based on size"""
@@ -0,0 +1,169 @@
+"""
+Roadmap persistence
+Write-behind storage for generated roadmaps with stable IDs and cached reads
+"""
+
+import logging
+from datetime import datetime
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event, text
+from sqlmodel import Session, select
+
+from app.database.batch import batch_processor
+from app.database.cache import (
+    cache_roadmap_query,
+    cache_user_query,
+    invalidate_roadmap_cache,
+    invalidate_user_cache,
+    table_tag,
+)
+from app.sql_models import Roadmap
+from app.utils.response_cache import roadmap_response_cache
+from app.utils.roadmap_index import roadmap_index_cache
+
+logger = logging.getLogger(__name__)
+
+
+class SequenceIdAllocator:
+    """Hands out primary keys from a Postgres sequence in blocks.
+
+    One round trip reserves block_size IDs, so most roadmaps get their
+    final ID without touching the database on the response path.
+    """
+
+    def __init__(self, table: str, column: str = "id", block_size: int = 50):
+        self.table = table
+        self.column = column
+        self.block_size = block_size
+        self._ids: List[int] = []
+        self._lock = Lock()
+
+    def _reserve_block(self) -> List[int]:
+        from app.database.session import engine
+
+        with Session(engine) as session:
+            rows = session.execute(
+                text(
+                    "SELECT nextval(pg_get_serial_sequence(:table, :column)) "
+                    "FROM generate_series(1, :count)"
+                ),
+                {"table": self.table, "column": self.column, "count": self.block_size},
+            ).all()
+        return [row[0] for row in rows]
+
+    def next_id(self) -> int:
+        """Return the next reserved ID; may block on the database, call from a worker thread"""
+        with self._lock:
+            if not self._ids:
+                self._ids = self._reserve_block()
+                logger.debug(f"Reserved {len(self._ids)} IDs for {self.table}")
+            return self._ids.pop(0)
+
+
+class RoadmapStore:
+    """Persists generated roadmaps through the batch processor"""
+
+    def __init__(self, pending_ttl: int = 3600):
+        self.pending_ttl = pending_ttl
+        self._allocator = SequenceIdAllocator("roadmap")
+        # Rows queued but not yet flushed, so reads right after generation work
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._pending_lock = Lock()
+
+    def save(self, roadmap_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Assign a stable ID and queue the insert; returns the row as a dict"""
+        now = datetime.utcnow()
+        row = {
+            **roadmap_data,
+            "id": self._allocator.next_id(),
+            "created_at": now,
+            "updated_at": now,
+        }
+        with self._pending_lock:
+            self._prune_pending(now)
+            self._pending[row["id"]] = row
+
+        def on_flushed():
+            with self._pending_lock:
+                self._pending.pop(row["id"], None)
+            # Another instance may have cached "not found" before the row existed
+            invalidate_roadmap_cache(row["id"])
+            if row.get("user_id") is not None:
+                invalidate_user_cache(row["user_id"])
+
+        def on_dropped():
+            # The client already has this ID; stop serving a row that will never exist
+            logger.error(f"Roadmap {row['id']} could not be persisted and was discarded")
+            with self._pending_lock:
+                self._pending.pop(row["id"], None)
+            invalidate_roadmap(row["id"], row.get("user_id"))
+
+        batch_processor.add_operation(
+            "roadmap", "insert", dict(row), callback=on_flushed, auto_flush=False, on_dropped=on_dropped
+        )
+        logger.info(f"Queued roadmap {row['id']} for write-behind persistence")
+        return row
+
+    def _prune_pending(self, now: datetime) -> None:
+        # Rows whose flush failed would otherwise stay forever
+        expired = [
+            roadmap_id for roadmap_id, row in self._pending.items()
+            if (now - row["created_at"]).total_seconds() > self.pending_ttl
+        ]
+        for roadmap_id in expired:
+            logger.warning(f"Dropping roadmap {roadmap_id} that was never flushed")
+            self._pending.pop(roadmap_id, None)
+
+    def get(self, session: Session, roadmap_id: int) -> Optional[Dict[str, Any]]:
+        pending = self._pending.get(roadmap_id)
+        if pending is not None:
+            return pending
+
+        # Unknown IDs are cached briefly so probing them doesn't reach the database
+        @cache_roadmap_query(roadmap_id, tags=(table_tag("roadmap"),), negative_ttl=30)
+        def fetch_roadmap() -> Optional[Dict[str, Any]]:
+            roadmap = session.get(Roadmap, roadmap_id)
+            return roadmap.model_dump() if roadmap else None
+
+        return fetch_roadmap()
+
+    def list_for_user(self, session: Session, user_id: int) -> List[Dict[str, Any]]:
+        @cache_user_query(user_id, "roadmaps", tags=(table_tag("roadmap"),))
+        def fetch_user_roadmaps() -> List[Dict[str, Any]]:
+            rows = session.exec(
+                select(Roadmap)
+                .where(Roadmap.user_id == user_id)
+                .order_by(Roadmap.created_at.desc())
+            ).all()
+            return [roadmap.model_dump() for roadmap in rows]
+
+        stored = fetch_user_roadmaps()
+        stored_ids = {row["id"] for row in stored}
+        with self._pending_lock:
+            pending = [
+                row for row in self._pending.values()
+                if row.get("user_id") == user_id and row["id"] not in stored_ids
+            ]
+        pending.sort(key=lambda row: row["created_at"], reverse=True)
+        return pending + stored
+
+
+def invalidate_roadmap(roadmap_id: int, user_id: Optional[int] = None) -> None:
+    """Drop every cached view of a roadmap after it changes"""
+    roadmap_response_cache.invalidate(f"roadmap:{roadmap_id}")
+    roadmap_index_cache.invalidate(roadmap_id)
+    invalidate_roadmap_cache(roadmap_id)
+    if user_id is not None:
+        invalidate_user_cache(user_id)
+
+
+@event.listens_for(Roadmap, "after_update")
+@event.listens_for(Roadmap, "after_delete")
+def _on_roadmap_changed(mapper, connection, target: Roadmap) -> None:
+    invalidate_roadmap(target.id, target.user_id)
+
+
+# Global roadmap store
+roadmap_store = RoadmapStore()
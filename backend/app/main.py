@@ -1,10 +1,12 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-from fastapi import FastAPI, Depends, WebSocket, status
+from fastapi import FastAPI, Depends, WebSocket, WebSocketDisconnect, status
 from app.core.config import settings
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
@@ -20,11 +22,40 @@ class COOPMiddleware(BaseHTTPMiddleware):
 from app.core.websocket_manager import manager
 from sqlmodel import Session
 
-from app.database.session import create_db_and_tables, get_db
+from app.database.session import create_db_and_tables, get_db, engine
 from app.sql_models import User
 from app.routers import health, roadmaps
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background services, then stop them in dependency order"""
+    from app.database.batch import batch_processor
+    from app.database.cache import query_cache
+    from app.utils.gemini_client import gemini_client
+
+    query_cache.start()
+    batch_flusher = asyncio.create_task(batch_processor.run_periodic_flush())
+    roadmaps.generation_jobs.start()
+    try:
+        yield
+    finally:
+        # Workers first so no new writes are queued behind the final flush
+        await roadmaps.generation_jobs.stop()
+        batch_flusher.cancel()
+        await asyncio.gather(batch_flusher, return_exceptions=True)
+        try:
+            await asyncio.to_thread(batch_processor.flush)
+        except Exception as e:
+            logger.error(f"Final batch flush failed: {e}")
+        # The flush's invalidations still go through the cache tier, so it stops after
+        await asyncio.to_thread(query_cache.stop)
+        gemini_client.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -40,6 +71,28 @@ app.add_middleware(COOPMiddleware)
 app.include_router(health.router)
 app.include_router(roadmaps.router)
 
+
+@app.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket, token: str = ""):
+    """Per-user push channel (generation job progress)"""
+    from app.core.auth import get_current_user_from_websocket
+
+    with Session(engine) as db:
+        user = await get_current_user_from_websocket(token, db)
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await manager.connect(websocket, user.id)
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        manager.disconnect(websocket, user.id)
+
+
 @app.get("/")
 async def root():
     """Root endpoint for basic connectivity check"""
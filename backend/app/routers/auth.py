@@ -9,6 +9,7 @@ from app.schemas import UserUpdate
 from app.sql_models import User
 
 from app.core.auth import get_current_user
+from app.database.cache import invalidate_user_cache
 from app.database.session import get_db
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -53,6 +54,7 @@ def update_user(user_id: int, user_update: UserUpdate, db: Session = Depends(get
     db.add(user)
     db.commit()
     db.refresh(user)
+    invalidate_user_cache(user.id)
     return user
 
 @router.delete("/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -63,6 +65,7 @@ def delete_user(user_id: int, db: Session = Depends(get_db), current_user: User
     
     db.delete(user)
     db.commit()
+    invalidate_user_cache(user_id)
     return
 
 @router.get("/me", response_model=User)
@@ -100,5 +103,6 @@ async def complete_onboarding(
     db.add(current_user)
     db.commit()
     db.refresh(current_user)
+    invalidate_user_cache(current_user.id)
     
     return current_user
@@ -77,4 +77,37 @@ async def warm_backend(db: Session = Depends(get_db)):
         
     except Exception as e:
         logger.error(f"Backend warmup failed: {e}")
-        raise HTTPException(status_code=500, detail=f"Warmup failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Warmup failed: {str(e)}")
+
+@router.get("/circuits")
+async def circuit_breaker_states():
+    """State of the upstream circuit breakers (Gemini, Supabase auth)"""
+    from app.utils.circuit_breaker import circuit_breakers
+
+    return {
+        "circuits": circuit_breakers.get_stats(),
+        "timestamp": time.time()
+    }
+
+@router.get("/generation")
+async def generation_stats():
+    """Roadmap generation coalescing, job queue, reuse and LLM latency counters"""
+    from app.routers.roadmaps import generation_jobs, roadmap_single_flight
+    from app.utils.gemini_client import gemini_client
+    from app.utils.llm_providers import hedged_llm
+    from app.utils.llm_scheduler import llm_scheduler
+    from app.utils.model_router import model_router
+    from app.utils.roadmap_similarity import roadmap_similarity_index
+    from app.utils.stage_timing import generation_stages
+
+    return {
+        "single_flight": roadmap_single_flight.get_stats(),
+        "jobs": generation_jobs.get_stats(),
+        "similarity": roadmap_similarity_index.get_stats(),
+        "llm": hedged_llm.get_stats(),
+        "routing": model_router.get_stats(),
+        "scheduler": llm_scheduler.get_stats(),
+        "gemini_circuit": gemini_client.breaker.get_stats(),
+        "stages": generation_stages.get_stats(),
+        "timestamp": time.time()
+    }
@@ -1,14 +1,76 @@
-from fastapi import APIRouter, Depends, HTTPException
-from app.schemas import RoadmapCreate, RoadmapRead
-from app.utils.gemini_client import generate_text
-import json
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from sqlmodel import Session
+from app.schemas import RoadmapBatchCreate, RoadmapCreate, RoadmapRead
+from app.sql_models import User
+from app.core.auth import get_current_user, get_optional_current_user
+from app.database.session import get_db
+from app.database.roadmap_store import roadmap_store
+from app.utils.gemini_client import gemini_client, stream_text
+from app.utils.llm_providers import generate_llm_text
+from app.utils.model_router import model_router
+from app.utils.circuit_breaker import CircuitOpenError
+from app.utils.llm_scheduler import (
+    ANONYMOUS_CALLER,
+    LLMCaller,
+    RateLimitExceeded,
+    current_llm_caller,
+    llm_scheduler,
+)
+from app.templates.prompts import RenderedPrompt, estimate_tokens
+from app.templates.roadmap import render_continuation_prompt, render_roadmap_prompt
+from app.utils.roadmap_stream import ModuleStreamParser, TruncatedRoadmap, detect_truncation
+from app.utils.llm_json import (
+    LLMOutputError,
+    extract_json_object,
+    normalize_roadmap_module,
+    parse_roadmap_output,
+    validate_roadmap_data,
+)
+from app.utils.roadmap_cache import roadmap_cache_key, roadmap_result_cache
+from app.utils.roadmap_index import build_roadmap_index, roadmap_index_cache
+from app.utils.roadmap_serialization import (
+    dumps,
+    roadmap_list_response,
+    roadmap_payload,
+    roadmap_response,
+    validate_roadmap_module,
+    validate_roadmap_plan,
+)
+from app.utils.response_cache import encoded_response, roadmap_response_cache
+from app.utils.roadmap_similarity import roadmap_similarity_index
+from app.utils.single_flight import SingleFlight
+from app.utils.stage_timing import log_raw_output, record_stage, stage, start_stage_timer
+from app.utils.generation_jobs import CallerQueueFullError, GenerationJob, GenerationJobQueue, JobQueueFullError
+from app.core.config import settings
+import asyncio
+import logging
+import math
+import time
 import uuid
-import random
-from typing import Optional
+from typing import Optional, Dict, Any, Tuple, List, AsyncIterator, Set
 from datetime import datetime
-import re
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
+logger = logging.getLogger(__name__)
+
+roadmap_single_flight = SingleFlight(
+    "roadmap",
+    distributed=settings.ROADMAP_SINGLE_FLIGHT_REDIS,
+    lock_ttl=settings.ROADMAP_SINGLE_FLIGHT_LOCK_TTL_SECONDS,
+    remote_wait=settings.ROADMAP_SINGLE_FLIGHT_WAIT_SECONDS,
+)
+
+generation_jobs = GenerationJobQueue(
+    worker_count=settings.ROADMAP_JOB_WORKERS,
+    job_ttl=settings.ROADMAP_JOB_TTL_SECONDS,
+    max_queued=settings.ROADMAP_JOB_MAX_QUEUED,
+    max_queued_per_caller=settings.ROADMAP_JOB_MAX_QUEUED_PER_CALLER,
+    use_redis=settings.ROADMAP_JOB_REDIS_QUEUE,
+    redis_url=settings.REDIS_URL,
+    pop_timeout=settings.ROADMAP_JOB_POP_TIMEOUT_SECONDS,
+)
 
 
 def generate_subtopic_id(roadmap_title, module_title, topic_title, subtopic_title):
@@ -20,140 +82,750 @@ def generate_subtopic_id(roadmap_title, module_title, topic_title, subtopic_titl
     )
 
 
-@router.post("/roadmaps/generate", response_model=RoadmapRead)
-async def generate_roadmap(
+def build_roadmap_prompt(roadmap_create: RoadmapCreate) -> RenderedPrompt:
+    return render_roadmap_prompt(roadmap_create)
+
+
+def build_continuation_prompt(
     roadmap_create: RoadmapCreate,
-):
-    prior_experience_text = (
-        f"- **Prior Experience:** \"{roadmap_create.prior_experience}\"\n"
-        if roadmap_create.prior_experience
-        else ""
+    roadmap_title: str,
+    modules: List[Dict[str, Any]],
+    partial_module_title: Optional[str] = None,
+) -> RenderedPrompt:
+    return render_continuation_prompt(roadmap_create, roadmap_title, modules, partial_module_title)
+
+
+def parse_roadmap_response(generated_text: str) -> Dict[str, Any]:
+    try:
+        roadmap_data, method = parse_roadmap_output(generated_text)
+    except LLMOutputError as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to parse roadmap from Gemini response: {e}",
+        )
+
+    if method == "repaired":
+        logger.warning("Roadmap JSON from Gemini was malformed and had to be repaired")
+    return roadmap_data
+
+
+def assign_module_ids(module: Dict[str, Any], m_idx: int, roadmap_title: str) -> Dict[str, Any]:
+    """Inject deterministic IDs into a single module and its children"""
+    module["id"] = f"module_{m_idx + 1}"
+
+    for t_idx, topic in enumerate(module.get("topics", [])):
+        topic["id"] = f"topic_{m_idx + 1}_{t_idx + 1}"
+
+        for s_idx, subtopic in enumerate(topic.get("subtopics", [])):
+            subtopic["id"] = generate_subtopic_id(
+                roadmap_title,
+                module.get("title", ""),
+                topic.get("title", ""),
+                subtopic.get("title", ""),
+            )
+
+    return module
+
+
+def prepare_streamed_module(module: Dict[str, Any], m_idx: int, roadmap_title: str) -> Dict[str, Any]:
+    """Normalize a streamed module like validate_roadmap_data does, then assign IDs and validate"""
+    normalize_roadmap_module(module, m_idx)
+    return validate_roadmap_module(assign_module_ids(module, m_idx, roadmap_title))
+
+
+def inject_roadmap_ids(roadmap_data: Dict[str, Any], subject: str) -> Dict[str, Any]:
+    roadmap_title = roadmap_data.get("title", subject)
+    for m_idx, module in enumerate(roadmap_data["roadmap_plan"]["modules"]):
+        assign_module_ids(module, m_idx, roadmap_title)
+    # Validated once here; responses serialize the stored plan without revalidating
+    roadmap_data["roadmap_plan"] = validate_roadmap_plan(roadmap_data["roadmap_plan"])
+    roadmap_data["roadmap_index"] = build_roadmap_index(roadmap_data["roadmap_plan"])
+    return roadmap_data
+
+
+def build_roadmap_row(
+    roadmap_data: Dict[str, Any],
+    roadmap_create: RoadmapCreate,
+    user_id: Optional[int] = None,
+) -> Dict[str, Any]:
+    return {
+        "user_id": user_id,
+        "title": roadmap_data.get("title", f"Roadmap for {roadmap_create.subject}"),
+        "description": roadmap_data.get(
+            "description", f"A plan to achieve {roadmap_create.goal}"
+        ),
+        "roadmap_plan": roadmap_data["roadmap_plan"],
+        "roadmap_index": roadmap_data.get("roadmap_index") or build_roadmap_index(roadmap_data["roadmap_plan"]),
+        "subject": roadmap_create.subject,
+        "goal": roadmap_create.goal,
+        "time_value": roadmap_create.time_value,
+        "time_unit": roadmap_create.time_unit,
+        "model": roadmap_create.model,
+    }
+
+
+async def save_roadmap(
+    roadmap_data: Dict[str, Any],
+    roadmap_create: RoadmapCreate,
+    user_id: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Persist a generated roadmap write-behind and return the row with its stable ID"""
+    row = build_roadmap_row(roadmap_data, roadmap_create, user_id)
+    try:
+        saved = await asyncio.to_thread(roadmap_store.save, row)
+    except Exception as e:
+        # Never fail a finished generation because the database is down; without
+        # an ID clients can't fetch it later, but can't fetch someone else's either
+        logger.error(f"Could not persist generated roadmap, returning it unsaved: {e}")
+        now = datetime.utcnow()
+        saved = {**row, "id": None, "created_at": now, "updated_at": now}
+    return saved
+
+
+def _model_kwargs(prompt: RenderedPrompt, model: Optional[str]) -> Dict[str, Any]:
+    kwargs = {
+        "system_instruction": prompt.system_instruction,
+        "generation_config": prompt.generation_config,
+    }
+    if model:
+        kwargs["model"] = model
+    return kwargs
+
+
+def client_address(request: Request) -> Optional[str]:
+    """Client IP as seen by the outermost trusted proxy.
+
+    Behind Cloud Run the socket peer is the Google front end, so the address
+    comes from X-Forwarded-For. Entries left of the trusted hops are supplied
+    by the client and can be spoofed, so only the one our proxies appended is used.
+    """
+    hops = settings.FORWARDED_TRUSTED_HOPS
+    forwarded = request.headers.get("x-forwarded-for") if hops > 0 else None
+    if forwarded:
+        entries = [entry.strip() for entry in forwarded.split(",") if entry.strip()]
+        if entries:
+            return entries[max(0, len(entries) - hops)]
+    return request.client.host if request.client else None
+
+
+def llm_caller_for(request: Optional[Request], current_user: Optional[User]) -> LLMCaller:
+    """Rate-limit identity: the user, or the client address for anonymous requests"""
+    if current_user is not None:
+        return LLMCaller(f"user:{current_user.id}")
+    host = client_address(request) if request is not None else None
+    if host is None:
+        return ANONYMOUS_CALLER
+    return LLMCaller(f"ip:{host}", settings.LLM_ANONYMOUS_WEIGHT)
+
+
+def rate_limited(e: RateLimitExceeded) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Too many roadmap generations right now, please retry shortly",
+        headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
     )
 
-    prompt = f"""
-You are an expert curriculum designer. Your task is to generate a structured learning roadmap in a specific JSON format.
-
-**Strict Instructions:**
-1.  **Output JSON ONLY:** The entire response must be a single, valid JSON object. Do not include any text, explanations, or markdown formatting before or after the JSON.
-2.  **Adhere to the Schema:** The JSON structure must follow this exact schema:
-
-    ```json
-    {{
-      "title": "string",
-      "description": "string",
-      "roadmap_plan": {{
-        "modules": [
-          {{
-            "title": "string",
-            "timeline": "string",
-            "topics": [
-              {{
-                "title": "string",
-                "subtopics": [
-                  {{ "title": "string" }}
-                ]
-              }}
-            ]
-          }}
-        ]
-      }}
-    }}
-    ```
-
-**Roadmap Details:**
-- **Subject:** "{roadmap_create.subject}"
-- **Primary Goal:** "{roadmap_create.goal}"
-{prior_experience_text}- **Target Duration:** {roadmap_create.time_value} {roadmap_create.time_unit}
-
-Begin the JSON output immediately.
-"""
 
+async def acquire_llm_slot(prompt: RenderedPrompt):
+    """Reserve the prompt's input tokens plus its output budget"""
     try:
-        if roadmap_create.model:
-            generated_text = await generate_text(prompt, model=roadmap_create.model)
-        else:
-            generated_text = await generate_text(prompt)
-
-        # DEBUG LOG — REQUIRED
-        print("\n===== RAW GEMINI OUTPUT =====\n")
-        print(generated_text)
-        print("\n============================\n")
-
-        # More robust JSON extraction
-        roadmap_data = None
-        try:
-            # First, try to parse the whole string
-            roadmap_data = json.loads(generated_text)
-        except json.JSONDecodeError:
-            # If that fails, find the first '{' and last '}'
-            match = re.search(r"\{.*\}", generated_text, re.DOTALL)
-            if match:
-                try:
-                    roadmap_data = json.loads(match.group(0))
-                except json.JSONDecodeError as e:
-                    raise HTTPException(
-                        status_code=500,
-                        detail=f"Failed to parse extracted JSON: {e}",
-                    )
-            else:
-                raise HTTPException(
-                    status_code=500,
-                    detail="Gemini response did not contain a valid JSON object.",
-                )
+        return await llm_scheduler.acquire(prompt.estimated_tokens + (prompt.max_output_tokens or 0))
+    except RateLimitExceeded as e:
+        logger.info(f"Rejected roadmap generation: {e}")
+        raise rate_limited(e)
+
+
+def check_requested_model(roadmap_create: RoadmapCreate) -> None:
+    """Refuse a model the router would never run instead of silently swapping it"""
+    if roadmap_create.model and not model_router.offers("roadmap", roadmap_create.model):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Model {roadmap_create.model!r} is not available for roadmap generation",
+        )
 
-        if not roadmap_data:
-             raise HTTPException(
-                    status_code=500,
-                    detail="Could not extract roadmap data from Gemini response.",
-                )
+
+def upstream_unavailable(e: CircuitOpenError) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Roadmap generation is temporarily unavailable, please retry shortly",
+        headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+    )
 
 
-        if "roadmap_plan" not in roadmap_data or "modules" not in roadmap_data.get("roadmap_plan", {}):
-            raise HTTPException(
-                status_code=500,
-                detail="Invalid roadmap structure from AI. 'roadmap_plan' or 'modules' is missing.",
+async def _call_model(prompt: RenderedPrompt, model: Optional[str], models_used: Optional[Set[str]] = None) -> str:
+    ticket = await acquire_llm_slot(prompt)
+    record_stage("queue", ticket.waited)
+    used_tokens = ticket.cost
+    try:
+        decision = model_router.route("roadmap", model)
+        if models_used is not None:
+            models_used.add(decision.model)
+        with model_router.track(decision) as call, stage("llm"):
+            text = await generate_llm_text(
+                prompt.prompt, thinking_tokens=prompt.thinking_tokens, **_model_kwargs(prompt, decision.model)
             )
+            call.output_chars = len(text)
+        used_tokens = prompt.estimated_tokens + estimate_tokens(text)
+        return text
+    except CircuitOpenError as e:
+        used_tokens = 0
+        raise upstream_unavailable(e)
+    finally:
+        llm_scheduler.release(ticket, used_tokens)
 
-        # Inject deterministic IDs
-        for m_idx, module in enumerate(roadmap_data["roadmap_plan"]["modules"]):
-            module["id"] = f"module_{m_idx + 1}"
 
-            for t_idx, topic in enumerate(module.get("topics", [])):
-                topic["id"] = f"topic_{m_idx + 1}_{t_idx + 1}"
+async def continue_roadmap(
+    roadmap_create: RoadmapCreate,
+    truncated: TruncatedRoadmap,
+    models_used: Optional[Set[str]] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Yield the modules missing from a truncated roadmap, without IDs.
+
+    Asks the model only for the modules after the last complete one, so a
+    cut-off response costs a short follow-up call instead of a full retry.
+    """
+    roadmap_title = truncated.title or roadmap_create.subject
+    modules = list(truncated.modules)
+    partial_module_title = truncated.partial_module_title
+    seen_titles = {str(m.get("title", "")).casefold() for m in modules}
+
+    for attempt in range(settings.ROADMAP_MAX_CONTINUATIONS):
+        logger.info(
+            f"Roadmap output truncated after module {len(modules)} "
+            f"(last complete module: {truncated.last_complete_module!r}, "
+            f"last complete topic: {truncated.last_complete_topic!r}); "
+            f"continuation {attempt + 1}/{settings.ROADMAP_MAX_CONTINUATIONS}"
+        )
+        prompt = build_continuation_prompt(roadmap_create, roadmap_title, modules, partial_module_title)
+        continuation_text = await _call_model(prompt, roadmap_create.model, models_used)
+
+        parser = ModuleStreamParser()
+        added = 0
+        for module in parser.feed(continuation_text):
+            title_key = str(module.get("title", "")).casefold()
+            if title_key in seen_titles:
+                continue
+            seen_titles.add(title_key)
+            modules.append(module)
+            added += 1
+            yield module
+
+        snapshot = parser.snapshot([])
+        if parser.finished or snapshot.modules_closed or not added:
+            return
+        partial_module_title = snapshot.partial_module_title
+
+    logger.warning(f"Roadmap still incomplete after {settings.ROADMAP_MAX_CONTINUATIONS} continuations")
 
-                for s_idx, subtopic in enumerate(topic.get("subtopics", [])):
-                    subtopic["id"] = generate_subtopic_id(
-                        roadmap_data.get("title", roadmap_create.subject),
-                        module.get("title", ""),
-                        topic.get("title", ""),
-                        subtopic.get("title", ""),
-                    )
 
-    except HTTPException:
+async def complete_truncated_roadmap(
+    roadmap_create: RoadmapCreate,
+    truncated: TruncatedRoadmap,
+    models_used: Optional[Set[str]] = None,
+) -> Dict[str, Any]:
+    modules = list(truncated.modules)
+    if not truncated.modules_closed:
+        async for module in continue_roadmap(roadmap_create, truncated, models_used):
+            modules.append(module)
+
+    roadmap_data = {"roadmap_plan": {"modules": modules}}
+    if truncated.title is not None:
+        roadmap_data["title"] = truncated.title
+    if truncated.description is not None:
+        roadmap_data["description"] = truncated.description
+
+    try:
+        return validate_roadmap_data(roadmap_data)
+    except LLMOutputError as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to parse roadmap from Gemini response: {e}",
+        )
+
+
+async def _run_generation(roadmap_create: RoadmapCreate, models_used: Optional[Set[str]] = None) -> Dict[str, Any]:
+    with stage("prompt"):
+        prompt = build_roadmap_prompt(roadmap_create)
+
+    generated_text = None
+    try:
+        generated_text = await _call_model(prompt, roadmap_create.model, models_used)
+        log_raw_output(generated_text, source="roadmap", template=prompt.template)
+
+        roadmap_data = parse_error = truncated = None
+        with stage("parse"):
+            # The truncation scan is a per-character pass; only cut-off or unparseable output needs it
+            extracted = extract_json_object(generated_text)
+            if extracted is None or extracted.complete:
+                try:
+                    roadmap_data = parse_roadmap_response(generated_text)
+                except HTTPException as e:
+                    parse_error = e
+            if roadmap_data is None:
+                truncated = detect_truncation(generated_text)
+
+        if roadmap_data is None:
+            if truncated is not None and truncated.modules:
+                # Keep the complete modules and ask only for the rest
+                roadmap_data = await complete_truncated_roadmap(roadmap_create, truncated, models_used)
+            elif parse_error is not None:
+                raise parse_error
+            else:
+                with stage("parse"):
+                    roadmap_data = parse_roadmap_response(generated_text)
+
+        # Inject deterministic IDs
+        with stage("ids"):
+            inject_roadmap_ids(roadmap_data, roadmap_create.subject)
+
+    except HTTPException as e:
+        if generated_text is not None and e.status_code >= 500:
+            log_raw_output(generated_text, source="roadmap", force=True, error=e.detail)
         raise
     except Exception as e:
-        # Log the exception for debugging
-        print(f"An unexpected error occurred: {e}")
+        logger.error(f"Unexpected error during roadmap generation: {e}", exc_info=True)
+        if generated_text is not None:
+            log_raw_output(generated_text, source="roadmap", force=True, error=str(e))
         raise HTTPException(
             status_code=500,
             detail=f"An unexpected error occurred during roadmap generation.",
         )
 
-    # Return the roadmap data directly without saving to DB
-    return RoadmapRead(
-        id=random.randint(10000, 99999),  # Generate a temporary ID
-        user_id=None,
-        title=roadmap_data.get("title", f"Roadmap for {roadmap_create.subject}"),
-        description=roadmap_data.get(
-            "description", f"A plan to achieve {roadmap_create.goal}"
-        ),
-        roadmap_plan=roadmap_data["roadmap_plan"],
-        subject=roadmap_create.subject,
-        goal=roadmap_create.goal,
-        time_value=roadmap_create.time_value,
-        time_unit=roadmap_create.time_unit,
-        model=roadmap_create.model,
-        created_at=datetime.utcnow(),
-        updated_at=datetime.utcnow()
+    return roadmap_data
+
+
+async def lookup_roadmap_data(
+    roadmap_create: RoadmapCreate, cache_key: str
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Exact cache lookup, then a near-duplicate of a previous request"""
+    roadmap_data, cache_layer = await roadmap_result_cache.get(cache_key)
+    if roadmap_data is not None:
+        return roadmap_data, cache_layer
+
+    match = roadmap_similarity_index.find(roadmap_create)
+    if match is None:
+        return None, None
+
+    similar_key, similarity = match
+    roadmap_data, _ = await roadmap_result_cache.get(similar_key)
+    if roadmap_data is None:
+        # The cached result expired; stop matching against it
+        roadmap_similarity_index.remove(similar_key)
+        return None, None
+
+    logger.info(f"Reusing near-duplicate roadmap (similarity {similarity:.2f})")
+    return roadmap_data, "similar"
+
+
+async def remember_roadmap_data(
+    roadmap_create: RoadmapCreate, models_used: Set[str], roadmap_data: Dict[str, Any]
+) -> None:
+    """Cache under the model that actually ran, which the router may have swapped.
+
+    A roadmap stitched together from calls to different models matches no
+    single request, so it is not cached at all.
+    """
+    if len(models_used) != 1:
+        logger.info(f"Not caching roadmap generated by mixed models {sorted(models_used)}")
+        return
+    ran_as = roadmap_create.model_copy(update={"model": next(iter(models_used))})
+    cache_key = roadmap_cache_key(ran_as)
+    await roadmap_result_cache.set(cache_key, roadmap_data)
+    roadmap_similarity_index.add(ran_as, cache_key)
+
+
+async def generate_roadmap_data(roadmap_create: RoadmapCreate) -> Tuple[Dict[str, Any], Optional[str]]:
+    """Return (roadmap_data, cache_layer); cache_layer is None when freshly generated"""
+    cache_key = roadmap_cache_key(roadmap_create)
+    with stage("cache"):
+        roadmap_data, cache_layer = await lookup_roadmap_data(roadmap_create, cache_key)
+    if roadmap_data is not None:
+        return roadmap_data, cache_layer
+
+    # Followers on other instances read the leader's result here, whichever model it ran
+    flight_key = f"{cache_key}:flight"
+
+    async def generate_and_cache():
+        models_used: Set[str] = set()
+        data = await _run_generation(roadmap_create, models_used)
+        await remember_roadmap_data(roadmap_create, models_used, data)
+        if roadmap_single_flight.distributed:
+            await roadmap_result_cache.set(flight_key, data, ttl=settings.ROADMAP_SINGLE_FLIGHT_LOCK_TTL_SECONDS)
+        return data
+
+    async def shared_result():
+        data, _ = await roadmap_result_cache.get(flight_key)
+        return data
+
+    # Identical concurrent requests share one LLM call
+    roadmap_data = await roadmap_single_flight.do(
+        cache_key, generate_and_cache, remote_result=shared_result
+    )
+    return roadmap_data, None
+
+
+def set_cache_headers(response: Response, cache_layer: Optional[str]) -> None:
+    response.headers["X-Cache"] = "HIT" if cache_layer else "MISS"
+    if cache_layer:
+        response.headers["X-Cache-Layer"] = cache_layer
+
+
+@router.post("/roadmaps/generate", response_model=RoadmapRead)
+async def generate_roadmap(
+    roadmap_create: RoadmapCreate,
+    request: Request,
+    current_user: Optional[User] = Depends(get_optional_current_user),
+):
+    timer = start_stage_timer()
+    check_requested_model(roadmap_create)
+    current_llm_caller.set(llm_caller_for(request, current_user))
+    roadmap_data, cache_layer = await generate_roadmap_data(roadmap_create)
+    with stage("save"):
+        roadmap = await save_roadmap(roadmap_data, roadmap_create, current_user.id if current_user else None)
+    with stage("serialize"):
+        response = roadmap_response(roadmap)
+    set_cache_headers(response, cache_layer)
+    response.headers["Server-Timing"] = timer.server_timing()
+    record_stage("total", time.perf_counter() - timer.started)
+    logger.info(f"Roadmap generation stages (ms): {timer.as_millis()} cache={cache_layer or 'miss'}")
+    return response
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {dumps(data)}\n\n"
+
+
+@router.post("/roadmaps/generate/stream")
+async def generate_roadmap_stream(
+    roadmap_create: RoadmapCreate,
+    request: Request,
+    current_user: Optional[User] = Depends(get_optional_current_user),
+):
+    """Stream roadmap modules as server-sent events while the model is still writing.
+
+    Events: ``meta`` (title/description), one ``module`` per completed module,
+    then ``done`` with the full roadmap, or ``error``.
+    """
+    timer = start_stage_timer()
+    check_requested_model(roadmap_create)
+    current_llm_caller.set(llm_caller_for(request, current_user))
+    with stage("prompt"):
+        prompt = build_roadmap_prompt(roadmap_create)
+    cache_key = roadmap_cache_key(roadmap_create)
+    with stage("cache"):
+        cached_data, cache_layer = await lookup_roadmap_data(roadmap_create, cache_key)
+    user_id = current_user.id if current_user else None
+    ticket = None
+    if cached_data is None:
+        # Streaming has no fallback provider, so refuse up front while Gemini is tripped
+        retry_after = gemini_client.breaker.retry_after()
+        if retry_after:
+            raise upstream_unavailable(CircuitOpenError(gemini_client.breaker.name, retry_after))
+        # Reserve before the response starts so a rejection is a real 429
+        ticket = await acquire_llm_slot(prompt)
+        record_stage("queue", ticket.waited)
+    stream_started = False
+    ticket_settled = False
+
+    def settle_ticket(used_tokens: float) -> None:
+        nonlocal ticket_settled
+        if ticket is not None and not ticket_settled:
+            ticket_settled = True
+            llm_scheduler.release(ticket, used_tokens)
+
+    def release_unstarted_ticket() -> None:
+        # A client that drops before the body starts never runs the generator's finally;
+        # nothing reached the model then, so the whole reservation goes back
+        settle_ticket(ticket.cost if stream_started else 0)
+
+    async def cached_stream():
+        yield _sse("meta", {"title": cached_data.get("title"), "description": cached_data.get("description")})
+        for module in cached_data["roadmap_plan"]["modules"]:
+            yield _sse("module", module)
+        roadmap = await save_roadmap(cached_data, roadmap_create, user_id)
+        yield _sse("done", roadmap_payload(roadmap))
+
+    async def event_stream():
+        nonlocal stream_started
+        stream_started = True
+        parser = ModuleStreamParser()
+        modules = []
+        chunks = []
+        meta_sent = False
+        used_tokens = ticket.cost
+        models_used: Set[str] = set()
+
+        try:
+            decision = model_router.route("roadmap", roadmap_create.model)
+            models_used.add(decision.model)
+            with model_router.track(decision) as call, stage("llm"):
+                async for chunk in stream_text(prompt.prompt, **_model_kwargs(prompt, decision.model)):
+                    call.output_chars += len(chunk)
+                    chunks.append(chunk)
+                    completed = parser.feed(chunk)
+
+                    if not meta_sent and ((parser.title is not None and parser.description is not None) or completed):
+                        meta_sent = True
+                        yield _sse("meta", {"title": parser.title, "description": parser.description})
+
+                    for module in completed:
+                        module = prepare_streamed_module(module, len(modules), parser.title or roadmap_create.subject)
+                        modules.append(module)
+                        yield _sse("module", module)
+            raw_output = "".join(chunks)
+            log_raw_output(raw_output, source="roadmap_stream", template=prompt.template)
+            used_tokens = prompt.estimated_tokens + estimate_tokens(raw_output)
+            settle_ticket(used_tokens)
+
+            if modules and not parser.finished:
+                truncated = parser.snapshot(list(modules))
+                if not truncated.modules_closed:
+                    async for module in continue_roadmap(roadmap_create, truncated, models_used):
+                        module = prepare_streamed_module(module, len(modules), parser.title or roadmap_create.subject)
+                        modules.append(module)
+                        yield _sse("module", module)
+
+            if modules:
+                roadmap_data = {
+                    "title": parser.title or f"Roadmap for {roadmap_create.subject}",
+                    "description": parser.description or f"A plan to achieve {roadmap_create.goal}",
+                    "roadmap_plan": {"modules": modules},
+                }
+            else:
+                # The scanner found nothing usable, fall back to whole-text parsing
+                roadmap_data = parse_roadmap_response("".join(chunks))
+                inject_roadmap_ids(roadmap_data, roadmap_create.subject)
+                for module in roadmap_data["roadmap_plan"]["modules"]:
+                    yield _sse("module", module)
+
+            await remember_roadmap_data(roadmap_create, models_used, roadmap_data)
+            roadmap = await save_roadmap(roadmap_data, roadmap_create, user_id)
+            yield _sse("done", roadmap_payload(roadmap))
+
+        except HTTPException as e:
+            yield _sse("error", {"detail": e.detail})
+        except Exception as e:
+            logger.error(f"Unexpected error while streaming a roadmap: {e}", exc_info=True)
+            yield _sse("error", {"detail": "An unexpected error occurred during roadmap generation."})
+        finally:
+            settle_ticket(used_tokens)
+
+    response = StreamingResponse(
+        cached_stream() if cached_data is not None else event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(release_unstarted_ticket) if ticket is not None else None,
     )
+    set_cache_headers(response, cache_layer)
+    # Only what ran before the first byte; generation itself is in the histograms
+    response.headers["Server-Timing"] = timer.server_timing()
+    return response
 
+
+@router.post("/roadmaps/generate/batch")
+async def generate_roadmaps_batch(
+    batch: RoadmapBatchCreate,
+    request: Request,
+    current_user: Optional[User] = Depends(get_optional_current_user),
+):
+    """Generate many roadmaps at once, streaming NDJSON results as each completes.
+
+    Identical requests (after normalization) are generated once. Each
+    line carries the item's index and either the roadmap or its error;
+    the final line is a summary.
+    """
+    if not batch.items:
+        raise HTTPException(status_code=422, detail="Batch must contain at least one item")
+    if len(batch.items) > settings.ROADMAP_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Batch is limited to {settings.ROADMAP_BATCH_MAX_ITEMS} items",
+        )
+    for item in batch.items:
+        check_requested_model(item)
+
+    current_llm_caller.set(llm_caller_for(request, current_user))
+    user_id = current_user.id if current_user else None
+    concurrency = min(batch.concurrency or settings.ROADMAP_BATCH_CONCURRENCY, settings.ROADMAP_BATCH_CONCURRENCY)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    # Dedupe identical inputs; every index still gets its own result line
+    groups: Dict[str, List[int]] = {}
+    for index, item in enumerate(batch.items):
+        groups.setdefault(roadmap_cache_key(item), []).append(index)
+
+    async def run_group(indices: List[int]):
+        async with semaphore:
+            try:
+                roadmap_data, cache_layer = await generate_roadmap_data(batch.items[indices[0]])
+                return indices, roadmap_data, cache_layer, None
+            except HTTPException as e:
+                return indices, None, None, e
+            except Exception as e:
+                logger.error(f"Batch item failed: {e}")
+                return indices, None, None, HTTPException(
+                    status_code=500,
+                    detail="An unexpected error occurred during roadmap generation.",
+                )
+
+    async def ndjson_stream():
+        tasks = [asyncio.ensure_future(run_group(indices)) for indices in groups.values()]
+        succeeded = failed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                indices, roadmap_data, cache_layer, error = await next_done
+                for index in indices:
+                    if error is not None:
+                        failed += 1
+                        line = {"index": index, "status": "error", "status_code": error.status_code, "detail": error.detail}
+                    else:
+                        succeeded += 1
+                        roadmap = await save_roadmap(roadmap_data, batch.items[index], user_id)
+                        line = {
+                            "index": index,
+                            "status": "ok",
+                            "cache": "HIT" if cache_layer else "MISS",
+                            "roadmap": roadmap_payload(roadmap),
+                        }
+                    yield dumps(line) + "\n"
+
+            yield dumps({
+                "status": "complete",
+                "total": len(batch.items),
+                "unique": len(groups),
+                "succeeded": succeeded,
+                "failed": failed,
+            }) + "\n"
+        finally:
+            # Client went away: stop generating what nobody will read
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+
+
+async def run_generation_job(job: GenerationJob, report) -> Dict[str, Any]:
+    roadmap_create = RoadmapCreate(**job.request)
+    if job.caller is not None:
+        current_llm_caller.set(LLMCaller(job.caller, job.caller_weight))
+    elif job.user_id is not None:
+        current_llm_caller.set(LLMCaller(f"user:{job.user_id}"))
+    else:
+        current_llm_caller.set(LLMCaller("jobs:anonymous", settings.LLM_ANONYMOUS_WEIGHT))
+    await report("generating")
+    roadmap_data, _ = await generate_roadmap_data(roadmap_create)
+    await report("saving")
+    roadmap = await save_roadmap(roadmap_data, roadmap_create, job.user_id)
+    return roadmap_payload(roadmap)
+
+
+generation_jobs.handler = run_generation_job
+
+
+@router.post("/roadmaps/jobs", status_code=202)
+async def create_roadmap_job(
+    roadmap_create: RoadmapCreate,
+    request: Request,
+    current_user: Optional[User] = Depends(get_optional_current_user),
+):
+    """Queue a roadmap generation and return immediately.
+
+    Progress and the finished roadmap are pushed to the user's WebSocket
+    connections; GET /roadmaps/jobs/{job_id} can be polled instead.
+    """
+    check_requested_model(roadmap_create)
+    caller = llm_caller_for(request, current_user)
+    try:
+        job = await generation_jobs.submit(
+            roadmap_create.model_dump(mode="json"),
+            user_id=current_user.id if current_user else None,
+            caller=caller.key,
+            caller_weight=caller.weight,
+        )
+    except CallerQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"job_id": job.id, "status": job.status, "poll_url": f"/roadmaps/jobs/{job.id}"}
+
+
+@router.get("/roadmaps/jobs/{job_id}")
+async def get_roadmap_job(
+    job_id: str,
+    current_user: Optional[User] = Depends(get_optional_current_user),
+):
+    job = await generation_jobs.get(job_id)
+    owner_id = job.get("user_id") if job else None
+    if not job or (owner_id is not None and (not current_user or current_user.id != owner_id)):
+        raise HTTPException(status_code=404, detail="Job not found")
+    job.pop("request", None)
+    return job
+
+
+def _can_read(owner_id: Optional[int], current_user: Optional[User]) -> bool:
+    return owner_id is None or (current_user is not None and current_user.id == owner_id)
+
+
+def load_roadmap(db: Session, roadmap_id: int, current_user: Optional[User]) -> Dict[str, Any]:
+    roadmap = roadmap_store.get(db, roadmap_id)
+    if not roadmap or not _can_read(roadmap.get("user_id"), current_user):
+        raise HTTPException(status_code=404, detail="Roadmap not found")
+    return roadmap
+
+
+@router.get("/roadmaps/{roadmap_id}", response_model=RoadmapRead)
+def get_roadmap(
+    roadmap_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_current_user),
+):
+    """Serve a roadmap from cached encoded bytes; supports ETag revalidation"""
+    cache_key = f"roadmap:{roadmap_id}"
+    cached = roadmap_response_cache.get(cache_key)
+    if cached is not None:
+        owner_id, payload = cached
+        if not _can_read(owner_id, current_user):
+            raise HTTPException(status_code=404, detail="Roadmap not found")
+    else:
+        roadmap = load_roadmap(db, roadmap_id, current_user)
+        payload = roadmap_response_cache.set(cache_key, roadmap_payload(roadmap), meta=roadmap.get("user_id"))
+    return encoded_response(payload, request)
+
+
+@router.get("/roadmaps/{roadmap_id}/subtopics/{subtopic_id}")
+def get_roadmap_subtopic(
+    roadmap_id: int,
+    subtopic_id: str,
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_current_user),
+):
+    """Look up a subtopic by ID with its position and neighbours in the plan"""
+    roadmap = load_roadmap(db, roadmap_id, current_user)
+    index = roadmap_index_cache.get(roadmap)
+    location = index.locate(subtopic_id)
+    if location is None:
+        raise HTTPException(status_code=404, detail="Subtopic not found")
+
+    m_idx, t_idx, s_idx = location
+    module = roadmap["roadmap_plan"]["modules"][m_idx]
+    topic = module["topics"][t_idx]
+    ordinal = index.ordinal(subtopic_id)
+    return {
+        "subtopic": topic["subtopics"][s_idx],
+        "topic": {"id": topic.get("id"), "title": topic.get("title")},
+        "module": {"id": module.get("id"), "title": module.get("title")},
+        "position": {"module": m_idx, "topic": t_idx, "subtopic": s_idx},
+        "ordinal": ordinal,
+        "total": index.total,
+        "previous_subtopic_id": index.previous_subtopic_id(subtopic_id),
+        "next_subtopic_id": index.next_subtopic_id(subtopic_id),
+    }
+
+
+@router.get("/users/me/roadmaps", response_model=List[RoadmapRead])
+def get_my_roadmaps(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    return roadmap_list_response(roadmap_store.list_for_user(db, current_user.id))
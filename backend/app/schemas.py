@@ -1,7 +1,7 @@
 from typing import List, Optional, Dict, Any, Union, Literal, Annotated
 from datetime import datetime, date
 from sqlmodel import SQLModel, Field
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 import uuid
 
 # Removed settings import to avoid circular dependency during startup
@@ -41,12 +41,48 @@ class RoadmapCreate(SQLModel):
     prior_experience: Optional[str] = None
 
 
+class RoadmapBatchCreate(SQLModel):
+    items: List[RoadmapCreate]
+    concurrency: Optional[int] = None  # Capped by ROADMAP_BATCH_CONCURRENCY
+
+
+# Extra keys the model adds (descriptions, resources) are kept as-is
+class RoadmapSubtopic(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    id: Optional[str] = None
+    title: str = ""
+
+
+class RoadmapTopic(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    id: Optional[str] = None
+    title: str = ""
+    subtopics: List[RoadmapSubtopic] = []
+
+
+class RoadmapModule(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    id: Optional[str] = None
+    title: str = ""
+    timeline: str = ""
+    topics: List[RoadmapTopic] = []
+
+
+class RoadmapPlan(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    modules: List[RoadmapModule] = []
+
+
 class RoadmapRead(SQLModel):
-    id: int
+    id: Optional[int] = None  # None when the roadmap could not be saved
     user_id: Optional[int] = None
     title: str
     description: str
-    roadmap_plan: Dict[str, Any]
+    roadmap_plan: RoadmapPlan
     subject: Optional[str] = None
     goal: Optional[str] = None
     time_value: Optional[int] = None
@@ -47,6 +47,7 @@ class Roadmap(SQLModel, table=True):
     title: str
     description: str
     roadmap_plan: Dict[str, Any] = Field(default={}, sa_column=Column(JSONB))
+    roadmap_index: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSONB))
     subject: Optional[str] = None
     goal: Optional[str] = None
     time_value: Optional[int] = None
@@ -0,0 +1,97 @@
+"""
+Prompt template registry
+Templates split into a static prefix, sent as the system instruction so
+providers can cache it, and a per-request suffix built from user fields
+"""
+
+import logging
+import math
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Rough chars-per-token ratio for English prose and JSON
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+@dataclass(frozen=True)
+class RenderedPrompt:
+    template: str
+    system_instruction: str
+    prompt: str
+    estimated_tokens: int
+    max_output_tokens: Optional[int] = None  # Includes thinking_tokens
+    thinking_tokens: int = 0  # Reserved for models that think before answering
+
+    @property
+    def text(self) -> str:
+        """Prefix and suffix as one string, for providers without system instructions"""
+        return f"{self.system_instruction}\n\n{self.prompt}"
+
+    @property
+    def generation_config(self) -> Dict[str, Any]:
+        if self.max_output_tokens is None:
+            return {}
+        return {"max_output_tokens": self.max_output_tokens}
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    name: str
+    prefix: str
+    suffix: Callable[..., str]
+    output_budget: Optional[Callable[..., int]] = None
+    thinking_tokens: int = 0
+    prefix_tokens: int = field(init=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "prefix", self.prefix.strip())
+        object.__setattr__(self, "prefix_tokens", estimate_tokens(self.prefix))
+
+    def render(self, **fields: Any) -> RenderedPrompt:
+        suffix = self.suffix(**fields).strip()
+        output_tokens = self.output_budget(**fields) if self.output_budget else None
+        rendered = RenderedPrompt(
+            template=self.name,
+            system_instruction=self.prefix,
+            prompt=suffix,
+            estimated_tokens=self.prefix_tokens + estimate_tokens(suffix),
+            max_output_tokens=output_tokens + self.thinking_tokens if output_tokens is not None else None,
+            thinking_tokens=self.thinking_tokens if output_tokens is not None else 0,
+        )
+        logger.debug(
+            f"Rendered prompt {self.name}: ~{rendered.estimated_tokens} input tokens "
+            f"({self.prefix_tokens} cacheable), max_output_tokens={rendered.max_output_tokens}"
+        )
+        return rendered
+
+
+class PromptRegistry:
+    """Named prompt templates"""
+
+    def __init__(self):
+        self._templates: Dict[str, PromptTemplate] = {}
+
+    def register(self, template: PromptTemplate) -> PromptTemplate:
+        if template.name in self._templates:
+            raise ValueError(f"Prompt template {template.name!r} is already registered")
+        self._templates[template.name] = template
+        return template
+
+    def get(self, name: str) -> PromptTemplate:
+        try:
+            return self._templates[name]
+        except KeyError:
+            raise KeyError(f"Unknown prompt template {name!r}")
+
+    def render(self, name: str, **fields: Any) -> RenderedPrompt:
+        return self.get(name).render(**fields)
+
+
+# Global prompt registry
+prompt_registry = PromptRegistry()
@@ -0,0 +1,170 @@
+"""
+Roadmap prompt templates
+Static curriculum-designer instructions and JSON schemas, with the
+roadmap request appended per call
+"""
+
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.schemas import RoadmapCreate
+from app.templates.prompts import PromptTemplate, RenderedPrompt, prompt_registry
+from app.utils.roadmap_cache import normalize_time_unit
+
+ROADMAP_TEMPLATE = "roadmap"
+CONTINUATION_TEMPLATE = "roadmap_continuation"
+
+# Approximate study weeks per time unit, for sizing the output budget
+UNIT_WEEKS = {
+    "hours": 0.1,
+    "days": 1 / 7,
+    "weeks": 1.0,
+    "months": 4.35,
+    "years": 52.0,
+}
+
+MODULE_SCHEMA = """
+        {
+          "title": "string",
+          "timeline": "string",
+          "topics": [
+            {
+              "title": "string",
+              "subtopics": [
+                { "title": "string" }
+              ]
+            }
+          ]
+        }"""
+
+ROADMAP_PREFIX = """
+You are an expert curriculum designer. Your task is to generate a structured learning roadmap in a specific JSON format.
+
+**Strict Instructions:**
+1.  **Output JSON ONLY:** The entire response must be a single, valid JSON object. Do not include any text, explanations, or markdown formatting before or after the JSON.
+2.  **Adhere to the Schema:** The JSON structure must follow this exact schema:
+
+    ```json
+    {
+      "title": "string",
+      "description": "string",
+      "roadmap_plan": {
+        "modules": [""" + MODULE_SCHEMA + """
+        ]
+      }
+    }
+    ```
+3.  **Use the Roadmap Details:** The user message gives the subject, goal, optional prior experience and target duration. Cover the whole duration.
+"""
+
+CONTINUATION_PREFIX = """
+You are an expert curriculum designer. A learning roadmap you were writing was cut off before it was finished, and you must now complete it.
+
+**Strict Instructions:**
+1.  **Continue where it stopped:** Generate ONLY the remaining modules needed to cover the target duration. Do NOT repeat modules that were already written.
+2.  **Output JSON ONLY:** The entire response must be a single, valid JSON object with this exact schema:
+
+    ```json
+    {
+      "modules": [""" + MODULE_SCHEMA + """
+      ]
+    }
+    ```
+"""
+
+
+def _details(roadmap_create: RoadmapCreate) -> str:
+    prior_experience_text = (
+        f"- **Prior Experience:** \"{roadmap_create.prior_experience}\"\n"
+        if roadmap_create.prior_experience
+        else ""
+    )
+    return (
+        f"- **Subject:** \"{roadmap_create.subject}\"\n"
+        f"- **Primary Goal:** \"{roadmap_create.goal}\"\n"
+        f"{prior_experience_text}"
+        f"- **Target Duration:** {roadmap_create.time_value} {roadmap_create.time_unit}\n"
+    )
+
+
+def output_token_budget(roadmap_create: RoadmapCreate, **_: Any) -> int:
+    """Visible output tokens scaled to the roadmap's duration.
+
+    gemini-2.5 models spend thinking tokens out of max_output_tokens, and the
+    google-generativeai SDK has no thinking_budget to cap them separately, so
+    the templates add a fixed thinking reserve on top of this.
+    """
+    weeks = max(roadmap_create.time_value, 1) * UNIT_WEEKS.get(normalize_time_unit(roadmap_create.time_unit), 1.0)
+    budget = settings.ROADMAP_OUTPUT_TOKENS_MIN + int(weeks * settings.ROADMAP_OUTPUT_TOKENS_PER_WEEK)
+    return min(budget, settings.ROADMAP_OUTPUT_TOKENS_MAX)
+
+
+def _roadmap_suffix(roadmap_create: RoadmapCreate) -> str:
+    return f"""
+**Roadmap Details:**
+{_details(roadmap_create)}
+Begin the JSON output immediately.
+"""
+
+
+def _continuation_suffix(
+    roadmap_create: RoadmapCreate,
+    roadmap_title: str,
+    modules: List[Dict[str, Any]],
+    partial_module_title: Optional[str] = None,
+) -> str:
+    written = "\n".join(
+        f"{m_idx + 1}. {module.get('title', '')}" for m_idx, module in enumerate(modules)
+    )
+    restart_text = (
+        f" The module titled \"{partial_module_title}\" was cut off; write it again in full."
+        if partial_module_title
+        else ""
+    )
+    return f"""
+**Roadmap Details:**
+- **Title:** "{roadmap_title}"
+{_details(roadmap_create)}
+**Modules already written (do NOT repeat them):**
+{written}
+
+Continue from module {len(modules) + 1}.{restart_text}
+
+Begin the JSON output immediately.
+"""
+
+
+prompt_registry.register(PromptTemplate(
+    name=ROADMAP_TEMPLATE,
+    prefix=ROADMAP_PREFIX,
+    suffix=_roadmap_suffix,
+    output_budget=output_token_budget,
+    thinking_tokens=settings.ROADMAP_THINKING_TOKENS,
+))
+
+prompt_registry.register(PromptTemplate(
+    name=CONTINUATION_TEMPLATE,
+    prefix=CONTINUATION_PREFIX,
+    suffix=_continuation_suffix,
+    output_budget=output_token_budget,
+    thinking_tokens=settings.ROADMAP_THINKING_TOKENS,
+))
+
+
+def render_roadmap_prompt(roadmap_create: RoadmapCreate) -> RenderedPrompt:
+    return prompt_registry.render(ROADMAP_TEMPLATE, roadmap_create=roadmap_create)
+
+
+def render_continuation_prompt(
+    roadmap_create: RoadmapCreate,
+    roadmap_title: str,
+    modules: List[Dict[str, Any]],
+    partial_module_title: Optional[str] = None,
+) -> RenderedPrompt:
+    return prompt_registry.render(
+        CONTINUATION_TEMPLATE,
+        roadmap_create=roadmap_create,
+        roadmap_title=roadmap_title,
+        modules=modules,
+        partial_module_title=partial_module_title,
+    )
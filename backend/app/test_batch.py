@@ -0,0 +1,83 @@
+import pytest
+
+from app.database.batch import BatchProcessor, BatchRowsFailed
+
+
+class FakeSession:
+    """Rows become visible on commit; a row with bad=True violates a constraint"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.inserted = []
+        self.committed = False
+        self._staged = []
+
+    def bulk_insert_mappings(self, model, rows):
+        if self.fail:
+            raise RuntimeError("database unavailable")
+        if any(row.get("bad") for row in rows):
+            raise RuntimeError("constraint violated")
+        self._staged.append((model.__name__, rows))
+
+    def commit(self):
+        self.inserted.extend(self._staged)
+        self._staged = []
+        self.committed = True
+
+    def rollback(self):
+        self._staged = []
+
+
+def test_callbacks_fire_for_every_operation_group():
+    processor = BatchProcessor()
+    fired = []
+    processor.add_operation("roadmap", "insert", {"id": 1}, callback=lambda: fired.append("roadmap"), auto_flush=False)
+    processor.add_operation("goal", "insert", {"id": 2}, callback=lambda: fired.append("goal"), auto_flush=False)
+
+    session = FakeSession()
+    processor.flush(session)
+    assert session.committed
+    assert sorted(fired) == ["goal", "roadmap"]
+
+
+def test_failed_flush_requeues_operations_until_max_attempts():
+    processor = BatchProcessor(max_attempts=2)
+    processor.add_operation("roadmap", "insert", {"id": 1}, auto_flush=False)
+
+    with pytest.raises(RuntimeError):
+        processor.flush(FakeSession(fail=True))
+    assert processor.pending_count == 1
+
+    processor.add_operation("roadmap", "insert", {"id": 2}, auto_flush=False)
+    session = FakeSession()
+    processor.flush(session)
+    assert [row["id"] for _, rows in session.inserted for row in rows] == [1, 2]
+
+    processor.add_operation("roadmap", "insert", {"id": 3}, auto_flush=False)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            processor.flush(FakeSession(fail=True))
+    assert processor.pending_count == 0
+
+
+def test_one_bad_row_does_not_hold_back_the_batch():
+    processor = BatchProcessor(max_attempts=2)
+    flushed, dropped = [], []
+    for row in ({"id": 1}, {"id": 2, "bad": True}, {"id": 3}):
+        processor.add_operation(
+            "roadmap", "insert", row, auto_flush=False,
+            callback=lambda row=row: flushed.append(row["id"]),
+            on_dropped=lambda row=row: dropped.append(row["id"]),
+        )
+
+    session = FakeSession()
+    with pytest.raises(BatchRowsFailed):
+        processor.flush(session)
+    assert [row["id"] for _, rows in session.inserted for row in rows] == [1, 3]
+    assert flushed == [1, 3]
+    # Only the bad row is retried, and it is dropped once it runs out of attempts
+    assert processor.pending_count == 1
+    with pytest.raises(RuntimeError):
+        processor.flush(session)
+    assert processor.pending_count == 0
+    assert dropped == [2]
@@ -0,0 +1,111 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import auth
+from app.utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ClientError(Exception):
+    status = 401
+
+
+def make_breaker(clock, **kwargs):
+    options = dict(window_size=10, min_calls=4, open_seconds=30, half_open_max_calls=1, clock=clock)
+    options.update(kwargs)
+    return CircuitBreaker("test", **options)
+
+
+def fail(breaker, exc=RuntimeError("down")):
+    with pytest.raises(type(exc)):
+        with breaker.protect():
+            raise exc
+
+
+def test_trips_on_error_rate_and_fails_fast():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        fail(breaker)
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as exc:
+        breaker.before_call()
+    assert exc.value.retry_after == 30
+    assert breaker.get_stats()["rejected"] == 1
+
+
+def test_half_open_probe_closes_or_reopens():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        fail(breaker)
+
+    clock.now = 31
+    fail(breaker)
+    assert breaker.state == OPEN
+
+    clock.now = 62
+    with breaker.protect():
+        assert breaker.state == HALF_OPEN
+        # Only one probe at a time
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+    assert breaker.state == CLOSED
+
+
+def test_client_errors_and_cancellations_do_not_trip():
+    clock = FakeClock()
+    breaker = make_breaker(clock, is_failure=lambda exc: not isinstance(exc, ClientError))
+    for _ in range(10):
+        fail(breaker, ClientError())
+        fail(breaker, asyncio.CancelledError())
+
+    assert breaker.state == CLOSED
+    assert breaker.get_stats()["failures"] == 0
+
+
+def test_trips_on_slow_calls():
+    clock = FakeClock()
+    breaker = make_breaker(clock, slow_call_seconds=5, slow_call_rate_threshold=0.5)
+    for _ in range(4):
+        with breaker.protect() as call:
+            clock.now += 6
+            call.stop()
+    assert breaker.state == OPEN
+
+
+def test_token_verification_served_stale_while_supabase_is_down(monkeypatch):
+    clock = FakeClock()
+    breaker = make_breaker(clock, min_calls=1, is_failure=auth._is_supabase_outage)
+    user = SimpleNamespace(id="uid-1", email="a@example.com")
+    calls = []
+
+    def get_user(token):
+        calls.append(token)
+        if len(calls) > 1:
+            raise ConnectionError("supabase down")
+        return SimpleNamespace(user=user)
+
+    monkeypatch.setattr(auth, "supabase", SimpleNamespace(auth=SimpleNamespace(get_user=get_user)))
+    monkeypatch.setattr(auth, "supabase_breaker", breaker)
+    monkeypatch.setattr(auth.settings, "AUTH_TOKEN_CACHE_TTL_SECONDS", 0)
+
+    assert asyncio.run(auth.verify_supabase_token("token-1")) is user
+    # Supabase fails: the earlier verification is reused and the breaker trips
+    assert asyncio.run(auth.verify_supabase_token("token-1")) is user
+    assert breaker.state == OPEN
+    # Open circuit: no upstream call at all
+    assert asyncio.run(auth.verify_supabase_token("token-1")) is user
+    assert len(calls) == 2
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(auth.verify_supabase_token("unknown-token"))
@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+import pytest
+
+from app.utils.gemini_client import GeminiClient
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class _SyncOnlyModel:
+    """Stands in for an SDK model without an async path"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def generate_content(self, prompt, generation_config=None):
+        time.sleep(self.delay)
+        return _Response(f"echo:{prompt}")
+
+
+def _client_with(model, **kwargs) -> GeminiClient:
+    client = GeminiClient(**kwargs)
+    client._models["stub"] = model
+    return client
+
+
+def test_sync_sdk_call_does_not_block_event_loop():
+    client = _client_with(_SyncOnlyModel(delay=0.3), thread_pool_size=2)
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        text = await client.generate("hi", model="stub")
+        task.cancel()
+        return text, ticks
+
+    text, ticks = asyncio.run(scenario())
+    assert text == "echo:hi"
+    assert ticks >= 10
+
+
+def test_timeout_is_enforced():
+    client = _client_with(_SyncOnlyModel(delay=0.5), thread_pool_size=1)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(client.generate("hi", model="stub", timeout=0.05))
+
+
+def test_concurrency_is_bounded():
+    client = _client_with(_SyncOnlyModel(delay=0.1), max_concurrency=2, thread_pool_size=8)
+
+    async def scenario():
+        start = time.monotonic()
+        await asyncio.gather(*(client.generate(str(i), model="stub") for i in range(4)))
+        return time.monotonic() - start
+
+    # Four calls through two slots take at least two rounds
+    assert asyncio.run(scenario()) >= 0.2
+
+
+def test_model_handles_are_reused():
+    client = GeminiClient()
+    assert client.get_model("models/gemini-2.5-flash") is client.get_model("models/gemini-2.5-flash")
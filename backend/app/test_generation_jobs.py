@@ -0,0 +1,160 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core.websocket_manager import manager
+from app.utils import generation_jobs
+from app.utils.generation_jobs import CallerQueueFullError, GenerationJobQueue, JobQueueFullError
+
+
+class FakeSocket:
+    def __init__(self):
+        self.messages = []
+
+    async def send_text(self, message):
+        self.messages.append(json.loads(message))
+
+
+async def wait_for_status(queue, job_id, statuses=("completed", "failed")):
+    for _ in range(200):
+        job = await queue.get(job_id)
+        if job["status"] in statuses:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_job_runs_and_pushes_progress_to_user():
+    socket = FakeSocket()
+    manager.active_connections[7] = [socket]
+
+    async def handler(job, report):
+        await report("generating")
+        return {"title": job.request["subject"]}
+
+    async def scenario():
+        queue = GenerationJobQueue(worker_count=1)
+        queue.handler = handler
+        queue.start()
+        try:
+            job = await queue.submit({"subject": "Rust"}, user_id=7)
+            return await wait_for_status(queue, job.id)
+        finally:
+            await queue.stop()
+
+    try:
+        job = asyncio.run(scenario())
+    finally:
+        manager.active_connections.pop(7, None)
+
+    assert job["status"] == "completed"
+    assert job["result"] == {"title": "Rust"}
+    stages = [m["stage"] for m in socket.messages]
+    assert stages == ["started", "generating", "completed"]
+    assert socket.messages[-1]["result"] == {"title": "Rust"}
+
+
+def test_failed_job_records_error_and_expires():
+    async def handler(job, report):
+        raise RuntimeError("model unavailable")
+
+    async def scenario():
+        queue = GenerationJobQueue(worker_count=1, job_ttl=0)
+        queue.handler = handler
+        queue.start()
+        try:
+            job = await queue.submit({"subject": "Go"})
+            finished = await wait_for_status(queue, job.id)
+            await asyncio.sleep(0.01)
+            removed = queue.cleanup()
+            return finished, removed, await queue.get(job.id)
+        finally:
+            await queue.stop()
+
+    finished, removed, after = asyncio.run(scenario())
+    assert finished["status"] == "failed"
+    assert finished["error"] == "model unavailable"
+    assert removed == 1
+    assert after is None
+
+
+class SharedQueueRedis:
+    """Just enough of a Redis client for the shared queue's counters and progress channel"""
+
+    def __init__(self, length=0, per_caller=None):
+        self.length = length
+        self.per_caller = per_caller or {}
+        self.keys = []
+        self.published = []
+
+    def llen(self, key):
+        self.keys.append(key)
+        return self.length
+
+    def get(self, key):
+        self.keys.append(key)
+        return self.per_caller.get(key)
+
+    def setex(self, key, ttl, value):
+        pass
+
+    def publish(self, channel, message):
+        self.published.append((channel, json.loads(message)))
+
+
+def redis_queue(redis_client, **options):
+    queue = GenerationJobQueue(use_redis=True, redis_url="redis://localhost:6379/0", **options)
+    queue._redis_client = redis_client
+    return queue
+
+
+def test_limit_counts_jobs_queued_by_other_instances():
+    redis_client = SharedQueueRedis(length=3)
+
+    async def scenario():
+        queue = redis_queue(redis_client, max_queued=3)
+        with pytest.raises(JobQueueFullError):
+            await queue.submit({"subject": "Elixir"})
+
+    asyncio.run(scenario())
+    assert redis_client.keys == [generation_jobs.REDIS_QUEUE_KEY]
+
+
+def test_one_caller_cannot_fill_the_queue():
+    async def scenario():
+        queue = GenerationJobQueue(worker_count=0, max_queued_per_caller=2)
+        queue.start()
+        try:
+            for _ in range(2):
+                await queue.submit({"subject": "Zig"}, caller="ip:203.0.113.7", caller_weight=0.5)
+            with pytest.raises(CallerQueueFullError):
+                await queue.submit({"subject": "Zig"}, caller="ip:203.0.113.7")
+            other = await queue.submit({"subject": "Zig"}, caller="ip:198.51.100.20")
+            assert other.caller == "ip:198.51.100.20"
+        finally:
+            await queue.stop()
+
+    asyncio.run(scenario())
+
+    # Jobs waiting in Redis count against their caller on every instance
+    redis_client = SharedQueueRedis(per_caller={"roadmap:jobs:queued:user:7": b"2"})
+
+    async def shared():
+        with pytest.raises(CallerQueueFullError):
+            await redis_queue(redis_client, max_queued_per_caller=2).submit({"subject": "Zig"}, caller="user:7")
+
+    asyncio.run(shared())
+
+
+def test_progress_is_published_for_other_instances_in_redis_mode():
+    redis_client = SharedQueueRedis()
+    queue = redis_queue(redis_client)
+    queue._listener = object()  # Subscribed; delivery happens from the channel
+    job = generation_jobs.GenerationJob(id="j1", request={}, user_id=7)
+
+    asyncio.run(queue._update(job, status="running", stage="generating"))
+    channel, event = redis_client.published[0]
+    assert channel == generation_jobs.REDIS_PROGRESS_CHANNEL
+    assert event["user_id"] == 7
+    assert json.loads(event["message"])["stage"] == "generating"
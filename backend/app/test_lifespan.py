@@ -0,0 +1,25 @@
+from fastapi.testclient import TestClient
+
+from app.database.batch import batch_processor
+from app.database.cache import query_cache
+from app.main import app
+from app.routers import roadmaps
+from app.utils.gemini_client import gemini_client
+
+
+def test_shutdown_stops_services_in_dependency_order(monkeypatch):
+    calls = []
+
+    async def stop_jobs():
+        calls.append("jobs")
+
+    monkeypatch.setattr(roadmaps.generation_jobs, "start", lambda: calls.append("start jobs"))
+    monkeypatch.setattr(roadmaps.generation_jobs, "stop", stop_jobs)
+    monkeypatch.setattr(batch_processor, "flush", lambda session=None: calls.append("flush"))
+    monkeypatch.setattr(query_cache, "start", lambda: calls.append("start cache"))
+    monkeypatch.setattr(query_cache, "stop", lambda timeout=2.0: calls.append("cache"))
+    monkeypatch.setattr(gemini_client, "shutdown", lambda: calls.append("gemini"))
+
+    with TestClient(app):
+        assert calls == ["start cache", "start jobs"]
+    assert calls[2:] == ["jobs", "flush", "cache", "gemini"]
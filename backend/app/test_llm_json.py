@@ -0,0 +1,69 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from app.utils.llm_json import (
+    LLMOutputError,
+    extract_json_object,
+    parse_roadmap_output,
+)
+
+CORPUS_DIR = Path(__file__).resolve().parent.parent / "benchmarks" / "corpus" / "roadmap_outputs"
+
+ROADMAP = {
+    "title": "T",
+    "description": "D",
+    "roadmap_plan": {"modules": [{"title": "M", "timeline": "W1", "topics": [{"title": "t", "subtopics": [{"title": "s"}]}]}]},
+}
+
+
+def test_extraction_ignores_braces_in_strings_and_prose():
+    text = 'Sure {here}:\n```json\n{"a": "x}\\"{", "b": [1, {"c": 2}]}\n```\ntrailing }'
+    extracted = extract_json_object(text)
+    assert extracted.complete
+    assert json.loads(extracted.text) == {"a": 'x}"{', "b": [1, {"c": 2}]}
+
+
+def test_extraction_flags_truncated_output():
+    extracted = extract_json_object('{"a": [1, 2')
+    assert not extracted.complete
+
+
+@pytest.mark.parametrize(
+    "text, method",
+    [
+        (json.dumps(ROADMAP), "direct"),
+        ("```json\n" + json.dumps(ROADMAP) + "\n```", "extracted"),
+        (json.dumps(ROADMAP)[:-3], "repaired"),
+        (json.dumps(ROADMAP).replace('"s"}', '"s"},'), "repaired"),
+    ],
+)
+def test_parse_methods(text, method):
+    data, used = parse_roadmap_output(text)
+    assert used == method
+    assert data["roadmap_plan"]["modules"][0]["title"] == "M"
+
+
+def test_validation_coerces_common_drift():
+    data, _ = parse_roadmap_output(json.dumps({"title": "T", "modules": [{"topics": [{"title": "t", "subtopics": ["a", "b"]}]}]}))
+    module = data["roadmap_plan"]["modules"][0]
+    assert module["title"] == "Module 1"
+    assert module["topics"][0]["subtopics"] == [{"title": "a"}, {"title": "b"}]
+
+
+def test_non_json_output_raises():
+    with pytest.raises(LLMOutputError):
+        parse_roadmap_output("I can't help with that.")
+
+
+def test_recorded_corpus_recovers():
+    samples = sorted(CORPUS_DIR.glob("*.txt"))
+    recovered = 0
+    for path in samples:
+        try:
+            parse_roadmap_output(path.read_text())
+            recovered += 1
+        except LLMOutputError:
+            assert path.name.endswith("no_json.txt")
+    assert recovered == len(samples) - 1
@@ -0,0 +1,126 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.schemas import RoadmapCreate
+from app.templates.roadmap import render_roadmap_prompt
+from app.utils.llm_providers import HedgedLLM, LatencyHistogram, LLMProvider, OpenAICompatibleProvider
+
+
+class StubProvider(LLMProvider):
+    """Local provider with injected latency and optional failure"""
+
+    def __init__(self, name, latency, text=None, error=None):
+        super().__init__(model="stub")
+        self.name = name
+        self.latency = latency
+        self.text = text if text is not None else f"from {name}"
+        self.error = error
+        self.calls = 0
+        self.cancelled = False
+
+    async def generate(self, prompt, **kwargs):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.latency)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+        return self.text
+
+
+def test_fast_primary_is_not_hedged():
+    primary = StubProvider("primary", 0.01)
+    secondary = StubProvider("secondary", 0.01)
+    llm = HedgedLLM(primary, [secondary], default_delay=0.2)
+
+    assert asyncio.run(llm.generate("hi")) == "from primary"
+    assert secondary.calls == 0
+    assert llm.get_stats()["hedged"] == 0
+
+
+def test_slow_primary_is_hedged_and_loser_cancelled():
+    primary = StubProvider("primary", 1.0)
+    secondary = StubProvider("secondary", 0.02)
+    llm = HedgedLLM(primary, [secondary], default_delay=0.05)
+
+    assert asyncio.run(llm.generate("hi")) == "from secondary"
+    assert primary.cancelled
+    stats = llm.get_stats()
+    assert stats["hedged"] == 1
+    assert stats["hedge_wins"] == 1
+    assert stats["hedge_rate"] == 1.0
+
+
+def test_hedge_delay_follows_observed_p95():
+    llm = HedgedLLM(StubProvider("primary", 0), min_samples=5, default_delay=30.0)
+    assert llm.hedge_delay("primary/stub") == 30.0
+    for latency in [0.1] * 18 + [0.5, 2.0]:
+        llm.histogram("primary/stub").observe(latency)
+    assert llm.hedge_delay("primary/stub") == 0.5
+
+
+def test_failed_primary_fails_over_and_invalid_responses_are_skipped():
+    primary = StubProvider("primary", 0.01, error=RuntimeError("down"))
+    invalid = StubProvider("invalid", 0.01, text="   ")
+    backup = StubProvider("backup", 0.01)
+    llm = HedgedLLM(primary, [invalid, backup], default_delay=5)
+
+    assert asyncio.run(llm.generate("hi")) == "from backup"
+    stats = llm.get_stats()
+    assert stats["failovers"] == 1
+    assert stats["latency"]["primary/stub"]["errors"] == 1
+    assert stats["latency"]["invalid/stub"]["errors"] == 1
+
+
+def test_all_providers_failing_raises_last_error():
+    llm = HedgedLLM(
+        StubProvider("primary", 0.01, error=RuntimeError("a")),
+        [StubProvider("secondary", 0.01, error=RuntimeError("b"))],
+    )
+    with pytest.raises(RuntimeError, match="b"):
+        asyncio.run(llm.generate("hi"))
+
+
+def test_histogram_buckets_and_percentiles():
+    histogram = LatencyHistogram(buckets=(1, 10))
+    for latency in (0.5, 5, 50):
+        histogram.observe(latency)
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"] == {"le_1": 1, "le_10": 1, "le_inf": 1}
+    assert snapshot["p50"] == 5
+
+
+class RecordingCompletions:
+    def __init__(self):
+        self.requests = []
+
+    async def create(self, **kwargs):
+        self.requests.append(kwargs)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="{}"))])
+
+
+def test_openai_compatible_provider_clamps_max_tokens():
+    completions = RecordingCompletions()
+    provider = OpenAICompatibleProvider("deepseek", "key", "deepseek-chat", max_output_tokens=8192)
+    provider._client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    async def send(time_value, time_unit):
+        prompt = render_roadmap_prompt(
+            RoadmapCreate(subject="Rust", goal="write a CLI", time_value=time_value, time_unit=time_unit)
+        )
+        await provider.generate(
+            prompt.prompt, system_instruction=prompt.system_instruction,
+            generation_config=prompt.generation_config, thinking_tokens=prompt.thinking_tokens,
+        )
+        return prompt
+
+    short = asyncio.run(send(1, "weeks"))
+    asyncio.run(send(2, "years"))
+    # The Gemini thinking reserve is dropped, then the provider's own cap applies
+    assert completions.requests[0]["max_tokens"] == short.max_output_tokens - short.thinking_tokens
+    assert completions.requests[1]["max_tokens"] == 8192
+    assert all(request["max_tokens"] <= 8192 for request in completions.requests)
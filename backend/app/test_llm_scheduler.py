@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+from app.routers.roadmaps import llm_caller_for
+from app.utils.llm_scheduler import LLMCaller, LLMScheduler, RateLimitExceeded, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_refills_and_goes_into_debt():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10, capacity=100, clock=clock)
+
+    assert bucket.reserve(100) == 0
+    assert bucket.wait_time(50) == 5.0
+    assert bucket.reserve(50) == 5.0
+    clock.now = 20
+    assert bucket.available() == 100  # Capped at capacity
+
+
+def test_caller_over_its_budget_is_rejected_fast():
+    # 60 tokens per minute = 1 token per second per caller
+    scheduler = LLMScheduler(global_tokens_per_minute=60000, caller_tokens_per_minute=60, queue_deadline=1.0)
+    alice = LLMCaller("user:1")
+
+    async def scenario():
+        await scheduler.acquire(60, alice)
+        with pytest.raises(RateLimitExceeded) as exc:
+            await scheduler.acquire(30, alice)
+        assert exc.value.scope == "caller"
+        assert exc.value.retry_after == pytest.approx(29, abs=0.5)
+        # Other callers are unaffected
+        await scheduler.acquire(60, LLMCaller("user:2"))
+
+    asyncio.run(scenario())
+    stats = scheduler.get_stats()
+    assert stats["admitted"] == 2
+    assert stats["rejected_caller"] == 1
+
+
+def test_release_refunds_unused_tokens():
+    scheduler = LLMScheduler(global_tokens_per_minute=60000, caller_tokens_per_minute=60, queue_deadline=1.0)
+    alice = LLMCaller("user:1")
+
+    async def scenario():
+        ticket = await scheduler.acquire(60, alice)
+        scheduler.release(ticket, 10)
+        await scheduler.acquire(50, alice)
+
+    asyncio.run(scenario())
+
+
+def test_global_queue_is_fair_across_callers():
+    # 600 tokens/s globally, burst of 100: each 100-token call waits ~0.17s
+    scheduler = LLMScheduler(global_tokens_per_minute=36000, caller_tokens_per_minute=10 ** 7,
+                             global_burst=100, queue_deadline=5.0)
+    order = []
+
+    async def call(caller):
+        await scheduler.acquire(100, caller)
+        order.append(caller.key)
+
+    async def scenario():
+        heavy, light = LLMCaller("heavy"), LLMCaller("light")
+        await scheduler.acquire(100, heavy)  # Drain the burst
+        tasks = [asyncio.ensure_future(call(heavy)) for _ in range(4)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.ensure_future(call(light)))
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    # The light caller overtakes the heavy caller's backlog
+    assert order.index("light") <= 1
+
+
+def test_global_backlog_past_deadline_is_rejected():
+    scheduler = LLMScheduler(global_tokens_per_minute=600, caller_tokens_per_minute=10 ** 7,
+                             global_burst=100, queue_deadline=0.5)
+
+    async def scenario():
+        await scheduler.acquire(100, LLMCaller("a"))
+        with pytest.raises(RateLimitExceeded) as exc:
+            await scheduler.acquire(100, LLMCaller("b"))
+        assert exc.value.scope == "global"
+
+    asyncio.run(scenario())
+
+
+def test_disabled_scheduler_admits_everything():
+    scheduler = LLMScheduler(global_tokens_per_minute=1, caller_tokens_per_minute=1, enabled=False)
+    ticket = asyncio.run(scheduler.acquire(10 ** 6))
+    assert ticket.cost == 0
+
+
+def proxied_request(forwarded_for: str) -> Request:
+    # Every request arrives from the same front-end proxy address
+    return Request({
+        "type": "http",
+        "headers": [(b"x-forwarded-for", forwarded_for.encode())],
+        "client": ("169.254.1.1", 40000),
+    })
+
+
+def test_forwarded_clients_get_separate_buckets():
+    scheduler = LLMScheduler(global_tokens_per_minute=60000, caller_tokens_per_minute=60, queue_deadline=1.0)
+    first = llm_caller_for(proxied_request("203.0.113.7"), None)
+    second = llm_caller_for(proxied_request("198.51.100.20"), None)
+    # A client-supplied entry left of the proxy's own does not change the identity
+    spoofed = llm_caller_for(proxied_request("10.0.0.1, 203.0.113.7"), None)
+    assert first.key == spoofed.key == "ip:203.0.113.7"
+    assert second.key == "ip:198.51.100.20"
+
+    async def scenario():
+        await scheduler.acquire(60, first)
+        with pytest.raises(RateLimitExceeded):
+            await scheduler.acquire(30, spoofed)
+        await scheduler.acquire(60, second)
+
+    asyncio.run(scenario())
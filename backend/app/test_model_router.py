@@ -0,0 +1,79 @@
+import pytest
+
+from app.utils.model_router import ModelRouter
+
+
+def make_router(**kwargs):
+    options = dict(
+        defaults={"roadmap": "models/gemini-2.5-flash"},
+        candidates={"roadmap": ["gemini-2.0-flash", "gemini-2.5-pro"]},
+        costs={"gemini-2.5-flash": 2.5, "gemini-2.0-flash": 0.4, "gemini-2.5-pro": 10.0, "gemini-2.5-flash-lite": 0.4},
+        cost_ceilings={"roadmap": 2.5},
+        lite_model="gemini-2.5-flash-lite",
+        degrade_in_flight=2,
+        min_samples=3,
+        explore_rate=0.0,
+    )
+    options.update(kwargs)
+    return ModelRouter(**options)
+
+
+def record(router, model, latency, ok=True, times=3):
+    for _ in range(times):
+        router.stats_for(model).record(latency, ok, 1000)
+
+
+def test_default_until_latencies_are_known_then_fastest():
+    router = make_router()
+    assert router.route("roadmap").model == "gemini-2.5-flash"
+
+    record(router, "gemini-2.5-flash", 20.0)
+    record(router, "gemini-2.0-flash", 8.0)
+    decision = router.route("roadmap")
+    assert (decision.model, decision.reason) == ("gemini-2.0-flash", "fastest")
+
+
+def test_cost_ceiling_and_requested_model():
+    router = make_router()
+    record(router, "gemini-2.5-pro", 1.0)
+
+    assert router.route("roadmap").model != "gemini-2.5-pro"
+    assert router.route("roadmap", requested="gemini-2.5-pro").model == "gemini-2.5-flash"
+    assert router.route("roadmap", requested="models/gemini-2.0-flash").reason == "requested"
+
+
+def test_unhealthy_models_are_skipped():
+    router = make_router()
+    record(router, "gemini-2.0-flash", 1.0, ok=False)
+    record(router, "gemini-2.5-flash", 20.0)
+
+    assert router.route("roadmap").model == "gemini-2.5-flash"
+
+
+def test_degrades_to_lite_model_when_calls_pile_up():
+    router = make_router()
+    first, second = router.route("roadmap"), router.route("roadmap")
+
+    with router.track(first), router.track(second):
+        decision = router.route("roadmap")
+    assert (decision.model, decision.reason) == ("gemini-2.5-flash-lite", "degraded")
+    assert router.route("roadmap").reason != "degraded"
+
+
+def test_tracking_records_outcomes_and_decisions():
+    router = make_router()
+    decision = router.route("roadmap")
+
+    with router.track(decision) as call:
+        call.output_chars = 500
+    with pytest.raises(RuntimeError):
+        with router.track(decision):
+            raise RuntimeError("boom")
+
+    stats = router.get_stats()
+    model_stats = stats["models"]["gemini-2.5-flash"]
+    assert model_stats["samples"] == 2
+    assert model_stats["error_rate"] == 0.5
+    assert model_stats["avg_output_chars"] == 500
+    assert stats["decisions"][0]["count"] == 1
+    assert stats["in_flight"] == {}
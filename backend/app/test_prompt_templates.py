@@ -0,0 +1,64 @@
+import re
+
+import pytest
+
+from app.core.config import settings
+from app.schemas import RoadmapCreate
+from app.templates.prompts import PromptRegistry, PromptTemplate, estimate_tokens
+from app.templates.roadmap import render_continuation_prompt, render_roadmap_prompt
+from app.utils.fake_llm import DEFAULT_CORPUS_DIR
+
+
+def make_request(time_value=4, time_unit="weeks", **kwargs):
+    return RoadmapCreate(subject="Rust", goal="write a CLI tool", time_value=time_value, time_unit=time_unit, **kwargs)
+
+
+def test_prefix_is_identical_across_requests():
+    a = render_roadmap_prompt(make_request())
+    b = render_roadmap_prompt(make_request(time_value=6, prior_experience="Python"))
+
+    assert a.system_instruction == b.system_instruction
+    assert "Rust" not in a.system_instruction
+    assert '"Rust"' in a.prompt
+    assert "Prior Experience" in b.prompt and "Prior Experience" not in a.prompt
+    assert a.estimated_tokens == pytest.approx(len(a.text) / 4, abs=3)
+
+
+def test_output_budget_scales_with_duration():
+    short = render_roadmap_prompt(make_request(time_value=3, time_unit="days"))
+    medium = render_roadmap_prompt(make_request(time_value=3, time_unit="months"))
+    long = render_roadmap_prompt(make_request(time_value=5, time_unit="years"))
+
+    assert short.max_output_tokens < medium.max_output_tokens < long.max_output_tokens
+    assert long.max_output_tokens == settings.ROADMAP_OUTPUT_TOKENS_MAX + settings.ROADMAP_THINKING_TOKENS
+    assert medium.generation_config == {"max_output_tokens": medium.max_output_tokens}
+
+
+@pytest.mark.parametrize("sample", sorted(DEFAULT_CORPUS_DIR.glob("*.txt")), ids=lambda path: path.name)
+def test_output_budget_covers_recorded_outputs(sample):
+    text = sample.read_text(encoding="utf-8")
+    weeks = [int(week) for week in re.findall(r'"timeline":\s*"Week (\d+)', text)]
+    if not weeks:
+        pytest.skip("no weekly timeline to size a request from")
+    rendered = render_roadmap_prompt(make_request(time_value=max(weeks), time_unit="weeks"))
+    # Thinking is spent from the same budget before any JSON is written
+    assert rendered.max_output_tokens - settings.ROADMAP_THINKING_TOKENS >= estimate_tokens(text)
+
+
+def test_continuation_lists_written_modules():
+    rendered = render_continuation_prompt(
+        make_request(), "Rust CLI", [{"title": "Basics"}, {"title": "Cargo"}], "Error handling"
+    )
+    assert "1. Basics\n2. Cargo" in rendered.prompt
+    assert "Continue from module 3" in rendered.prompt
+    assert '"Error handling" was cut off' in rendered.prompt
+
+
+def test_registry_rejects_duplicates_and_unknown_names():
+    registry = PromptRegistry()
+    registry.register(PromptTemplate(name="t", prefix="static", suffix=lambda **_: "dynamic"))
+    with pytest.raises(ValueError):
+        registry.register(PromptTemplate(name="t", prefix="x", suffix=lambda **_: ""))
+    with pytest.raises(KeyError):
+        registry.get("missing")
+    assert registry.render("t").max_output_tokens is None
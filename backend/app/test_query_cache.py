@@ -0,0 +1,232 @@
+import asyncio
+import threading
+import time
+
+from app.core.config import settings
+from app.database.cache import (
+    CachedResult,
+    QueryCache,
+    _needs_refresh,
+    cached_query,
+    estimate_size,
+    invalidate_user_cache,
+    query_cache,
+    user_tag,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction_keeps_recently_used():
+    cache = QueryCache(max_size=3, default_ttl=60)
+    for key in "abc":
+        cache.set(key, key.upper())
+    assert cache.get("a") == "A"  # a becomes most recent
+
+    cache.set("d", "D")
+    assert cache.get("b") is None
+    assert [cache.get(k) for k in "acd"] == ["A", "C", "D"]
+    assert len(cache) == 3
+
+
+def test_entries_expire_on_the_monotonic_clock():
+    clock = FakeClock()
+    cache = QueryCache(max_size=10, default_ttl=60, clock=clock)
+    cache.set("short", 1, ttl=5)
+    cache.set("long", 2)
+
+    clock.now += 10
+    assert cache.get("short") is None
+    assert cache.get("long") == 2
+    assert cache.get_stats()["total_entries"] == 1
+
+
+def test_expired_entries_are_purged_by_later_writes():
+    clock = FakeClock()
+    cache = QueryCache(max_size=100, default_ttl=1, clock=clock)
+    for i in range(5):
+        cache.set(f"old:{i}", i)
+    clock.now += 2
+    cache.set("new", "x", ttl=60)
+    assert len(cache) == 1
+
+
+def test_byte_budget_evicts_least_recent():
+    cache = QueryCache(max_size=100, default_ttl=60, max_bytes=3 * estimate_size(b"x" * 1000) + 300)
+    for i in range(3):
+        cache.set(f"k{i}", b"x" * 1000)
+    cache.get("k0")
+    cache.set("k3", b"x" * 1000)
+
+    assert cache.get("k1") is None
+    assert cache.get("k0") is not None
+    # Values larger than the whole budget are not cached at all
+    cache.set("huge", b"x" * 10000)
+    assert cache.get("huge") is None
+    assert cache.get_stats()["memory_usage_mb"] * 1024 * 1024 <= cache.max_bytes
+
+
+def test_resetting_keys_does_not_grow_the_expiry_heap_unbounded():
+    cache = QueryCache(max_size=10, default_ttl=60, shards=1)
+    for i in range(10000):
+        cache.set("same", i)
+    assert cache.get("same") == 9999
+    assert len(cache._shards[0].expiry) <= 2 * 1 + 64 + 1
+
+
+def test_delete_prefix_spans_shards():
+    cache = QueryCache(max_size=10000, default_ttl=60, shards=8)
+    for i in range(100):
+        cache.set(f"user:1:{i}", i)
+        cache.set(f"user:2:{i}", i)
+
+    assert cache.delete_prefix("user:1:") == 100
+    assert cache.get("user:1:5") is None
+    assert cache.get("user:2:5") == 5
+
+
+def test_stats_are_kept_as_running_totals():
+    clock = FakeClock()
+    cache = QueryCache(max_size=3, default_ttl=60, clock=clock)
+    cache.set("user:1:profile", "a" * 100)
+    cache.set("user:2:profile", "b" * 100)
+    cache.set("roadmap:7:", {"title": "x"})
+    cache.get("user:1:profile")
+    cache.get("user:9:profile")
+    cache.set("auth:token:abc", 1, ttl=1)  # Evicts the least recent user entry
+    clock.now += 2
+    cache.get("auth:token:abc")
+
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["expirations"]) == (1, 2, 1, 1)
+    assert stats["hit_rate"] == round(1 / 3, 4)
+    assert stats["namespaces"]["user"]["entries"] == 1
+    assert stats["namespaces"]["roadmap"]["entries"] == 1
+    assert "auth" not in stats["namespaces"]
+    assert stats["bytes"] == sum(ns["bytes"] for ns in stats["namespaces"].values())
+
+    cache.delete_prefix("user:")
+    cache.delete("roadmap:7:")
+    stats = cache.get_stats()
+    assert stats["bytes"] == 0 and stats["namespaces"] == {}
+
+
+def test_delete_tag_removes_only_tagged_entries():
+    cache = QueryCache(max_size=1000, default_ttl=60, shards=4)
+    for i in range(20):
+        cache.set(f"q{i}", i, tags=(f"user:{i % 2}", "table:roadmap"))
+    cache.set("other", "x", tags=("user:9",))
+
+    assert cache.delete_tag("user:1") == 10
+    assert [cache.get(f"q{i}") for i in range(4)] == [0, None, 2, None]
+    assert cache.delete_tag("user:1") == 0
+
+    # Evicted and deleted entries leave no dangling index entries
+    cache.delete("other")
+    assert cache.delete_tag("table:roadmap") == 10
+    assert len(cache) == 0
+    assert cache.get_stats()["tags"] == 0
+
+
+def test_cached_query_default_keys_are_invalidated_by_tag():
+    calls = []
+
+    @cached_query(ttl=60, tags=lambda user_id: (user_tag(user_id),))
+    def load_settings(user_id):
+        calls.append(user_id)
+        return {"user": user_id, "version": len(calls)}
+
+    assert load_settings(41) == load_settings(41) == {"user": 41, "version": 1}
+    invalidate_user_cache(41)
+    assert load_settings(41)["version"] == 2
+
+
+def test_concurrent_misses_share_one_call():
+    calls = []
+    release = threading.Event()
+
+    @cached_query(ttl=60, cache_key_func=lambda: "test:flight:sync")
+    def slow_sync():
+        calls.append(1)
+        release.wait(5)
+        return "sync"
+
+    @cached_query(ttl=60, cache_key_func=lambda: "test:flight:async")
+    async def slow_async():
+        calls.append(2)
+        await asyncio.sleep(0.01)
+        return "async"
+
+    threads = [threading.Thread(target=slow_sync) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    async def burst():
+        return await asyncio.gather(*(slow_async() for _ in range(8)))
+
+    assert asyncio.run(burst()) == ["async"] * 8
+    assert calls == [1, 2]
+
+
+def test_none_results_are_cached_only_when_asked():
+    calls = []
+
+    @cached_query(ttl=60, cache_key_func=lambda key: f"test:negative:{key}", negative_ttl=30)
+    def find_negative(key):
+        calls.append(key)
+        return None
+
+    @cached_query(ttl=60, cache_key_func=lambda key: f"test:plain:{key}")
+    def find_plain(key):
+        calls.append(key)
+        return None
+
+    assert find_negative("a") is None and find_negative("a") is None
+    assert find_plain("b") is None and find_plain("b") is None
+    assert calls == ["a", "b", "b"]
+
+
+def test_expired_results_are_served_stale_while_refreshing():
+    versions = iter(range(1, 10))
+
+    @cached_query(ttl=60, cache_key_func=lambda: "test:swr", stale_ttl=300, early_refresh_beta=0)
+    async def load():
+        return next(versions)
+
+    async def scenario():
+        assert await load() == 1
+        record = query_cache.get("test:swr")
+        query_cache.set("test:swr", record._replace(fresh_until=time.time() - 1), 300)
+
+        assert await load() == 1  # Stale value, refresh scheduled
+        for _ in range(5):
+            await asyncio.sleep(0)
+        assert await load() == 2
+
+    asyncio.run(scenario())
+
+
+def test_early_refresh_probability_grows_near_expiry():
+    now = time.time()
+    slow = CachedResult("v", fresh_until=now + 1, compute_seconds=10)
+    assert sum(_needs_refresh(slow, beta=1.0) for _ in range(200)) > 150
+    assert not _needs_refresh(slow, beta=0)
+
+    far = CachedResult("v", fresh_until=now + 3600, compute_seconds=0.01)
+    assert not any(_needs_refresh(far, beta=1.0) for _ in range(200))
+
+
+def test_global_cache_is_sharded_and_byte_bounded():
+    stats = query_cache.get_stats()
+    assert stats["shards"] == settings.QUERY_CACHE_SHARDS
+    assert stats["max_bytes"] == settings.QUERY_CACHE_MAX_BYTES
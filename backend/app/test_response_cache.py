@@ -0,0 +1,71 @@
+import gzip
+
+import orjson
+from starlette.requests import Request
+
+from app.utils.response_cache import ResponseCache, encode_payload, encoded_response
+
+
+def make_request(**headers):
+    raw = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+DATA = {"title": "Rust", "modules": [{"title": f"Module {i}"} for i in range(100)]}
+
+
+def test_payload_is_encoded_once_with_compressed_variant():
+    payload = encode_payload(DATA)
+
+    assert orjson.loads(payload.body) == DATA
+    assert gzip.decompress(payload.gzip) == payload.body
+    assert payload.etag.startswith('"') and payload.etag == encode_payload(DATA).etag
+    assert encode_payload({"small": True}).gzip is None
+
+
+def test_response_negotiates_encoding():
+    payload = encode_payload(DATA)
+
+    plain = encoded_response(payload, make_request())
+    assert plain.body == payload.body
+    assert "content-encoding" not in plain.headers
+
+    zipped = encoded_response(payload, make_request(accept_encoding="deflate, gzip;q=0.8"))
+    assert zipped.headers["content-encoding"] == "gzip"
+    assert zipped.body == payload.gzip
+    # Different bytes, so a different ETag than the identity body
+    assert zipped.headers["etag"] != plain.headers["etag"]
+
+    refused = encoded_response(payload, make_request(accept_encoding="gzip;q=0"))
+    assert "content-encoding" not in refused.headers
+
+
+def test_matching_etag_returns_304():
+    payload = encode_payload(DATA)
+
+    response = encoded_response(payload, make_request(if_none_match=f'"other", W/{payload.etag}'))
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == payload.etag
+
+
+def test_cache_keeps_meta_and_invalidates():
+    cache = ResponseCache()
+    payload = cache.set("roadmap:1", DATA, meta=42)
+
+    assert cache.get("roadmap:1") == (42, payload)
+    cache.invalidate("roadmap:1")
+    assert cache.get("roadmap:1") is None
+
+
+def test_each_encoding_revalidates_with_its_own_etag():
+    payload = encode_payload(DATA)
+    zipped = encoded_response(payload, make_request(accept_encoding="gzip"))
+
+    response = encoded_response(payload, make_request(accept_encoding="gzip", if_none_match=zipped.headers["etag"]))
+    assert response.status_code == 304
+    assert response.headers["etag"] == zipped.headers["etag"]
+
+    # The gzip ETag still names the current body when the client drops compression
+    plain = encoded_response(payload, make_request(if_none_match=zipped.headers["etag"]))
+    assert plain.status_code == 304 and plain.headers["etag"] == payload.etag
@@ -1,11 +1,41 @@
+import asyncio
+import json
+
 import pytest
+from fastapi import Request
 from fastapi.testclient import TestClient
 from app.main import app
+from app.routers.roadmaps import generate_roadmap_stream, roadmap_single_flight
 from app.schemas import RoadmapCreate
+from app.utils.fake_llm import DEFAULT_CORPUS_DIR, FakeLLM
+from app.utils.gemini_client import gemini_client
+from app.utils.llm_providers import hedged_llm
+from app.utils.llm_scheduler import llm_scheduler
+from app.utils.model_router import RouteDecision, model_router
+from app.utils.roadmap_cache import roadmap_cache_key, roadmap_result_cache
 
 client = TestClient(app)
 
-def test_generate_roadmap():
+
+def corpus_output(name: str) -> str:
+    return (DEFAULT_CORPUS_DIR / name).read_text(encoding="utf-8")
+
+
+def stream_events(response):
+    return [line[len("event: "):] for line in response.text.splitlines() if line.startswith("event: ")]
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Replay a recorded Gemini output instead of calling the API"""
+    fake = FakeLLM.from_corpus(pattern="01_clean.txt", latency_median=0)
+    gemini_client.use_model_factory(fake.get_model)
+    monkeypatch.setattr(hedged_llm, "enabled", False)
+    yield fake
+    gemini_client.use_model_factory(None)
+
+
+def test_generate_roadmap(fake_llm):
     request_data = {
         "subject": "Quantum Computing",
         "goal": "Understand the basics of quantum computing",
@@ -19,3 +49,206 @@ def test_generate_roadmap():
     assert roadmap["description"] is not None
     assert roadmap["roadmap_plan"] is not None
     assert len(roadmap["roadmap_plan"]["modules"]) > 0
+    assert fake_llm.calls == 1
+    timing = response.headers["Server-Timing"]
+    for name in ("cache", "prompt", "llm", "parse", "ids", "save", "serialize", "total"):
+        assert f"{name};dur=" in timing
+
+
+def test_generate_roadmap_stream(fake_llm):
+    request_data = {
+        "subject": "Streaming Signal Processing",
+        "goal": "Filter signals in real time",
+        "time_value": 3,
+        "time_unit": "weeks",
+    }
+    response = client.post("/roadmaps/generate/stream", json=request_data)
+    assert response.status_code == 200
+    events = [line[len("event: "):] for line in response.text.splitlines() if line.startswith("event: ")]
+    assert events[0] == "meta"
+    assert "module" in events
+    assert events[-1] == "done"
+
+
+def test_generate_roadmap_upstream_failure(fake_llm):
+    fake_llm.failure_rate = 1.0
+    request_data = {
+        "subject": "Failing Upstream Topic",
+        "goal": "Observe the error path",
+        "time_value": 1,
+        "time_unit": "weeks",
+    }
+    response = client.post("/roadmaps/generate", json=request_data)
+    assert response.status_code == 500
+
+
+def test_generate_roadmap_repairs_raw_newlines(fake_llm):
+    fake_llm.outputs = [corpus_output("12_raw_newline_in_string.txt")]
+    request_data = {
+        "subject": "Raw Newline Music Theory",
+        "goal": "Parse strings with raw control characters",
+        "time_value": 6,
+        "time_unit": "weeks",
+    }
+    response = client.post("/roadmaps/generate", json=request_data)
+    assert response.status_code == 200
+    assert len(response.json()["roadmap_plan"]["modules"]) == 6
+    assert fake_llm.calls == 1  # Complete output, no continuation call
+
+    response = client.post("/roadmaps/generate/stream", json={**request_data, "subject": "Raw Newline Streamed"})
+    events = stream_events(response)
+    assert "error" not in events
+    assert events.count("module") == 6
+    assert events[-1] == "done"
+
+
+def test_stream_normalizes_string_subtopics(fake_llm):
+    fake_llm.outputs = [corpus_output("11_string_subtopics.txt")]
+    request_data = {
+        "subject": "Streamed String Subtopics",
+        "goal": "Coerce bare subtopic strings",
+        "time_value": 4,
+        "time_unit": "weeks",
+    }
+    response = client.post("/roadmaps/generate/stream", json=request_data)
+    events = stream_events(response)
+    assert "error" not in events
+    assert "module" in events
+    assert events[-1] == "done"
+
+    modules = [
+        json.loads(line[len("data: "):])
+        for event, line in zip(response.text.splitlines(), response.text.splitlines()[1:])
+        if event == "event: module"
+    ]
+    subtopic = modules[0]["topics"][0]["subtopics"][0]
+    assert isinstance(subtopic, dict) and subtopic["id"] and subtopic["title"]
+
+
+def test_downgraded_generation_is_cached_under_the_model_that_ran(fake_llm, monkeypatch):
+    monkeypatch.setattr(
+        model_router, "route",
+        lambda use_case, requested=None: RouteDecision(use_case, "gemini-2.5-flash-lite", "degraded", requested),
+    )
+    request_data = {
+        "subject": "Degraded Model Caching",
+        "goal": "Keep lite output out of the premium cache",
+        "time_value": 2,
+        "time_unit": "weeks",
+        "model": "gemini-2.5-flash",
+    }
+    assert client.post("/roadmaps/generate", json=request_data).status_code == 200
+    requested = RoadmapCreate(**request_data)
+    ran_as = requested.model_copy(update={"model": "gemini-2.5-flash-lite"})
+    assert asyncio.run(roadmap_result_cache.get(roadmap_cache_key(requested)))[0] is None
+    assert asyncio.run(roadmap_result_cache.get(roadmap_cache_key(ran_as)))[0] is not None
+
+    # A second premium request is not served the lite result
+    response = client.post("/roadmaps/generate", json=request_data)
+    assert response.headers["X-Cache"] == "MISS"
+    assert fake_llm.calls == 2
+
+
+def test_unknown_requested_model_is_rejected(fake_llm):
+    request_data = {
+        "subject": "Unknown Model",
+        "goal": "Ask for a model the router never runs",
+        "time_value": 1,
+        "time_unit": "weeks",
+        "model": "gemini-2.5-pro",
+    }
+    for path in ("/roadmaps/generate", "/roadmaps/generate/stream", "/roadmaps/jobs"):
+        assert client.post(path, json=request_data).status_code == 400
+    assert client.post("/roadmaps/generate/batch", json={"items": [request_data]}).status_code == 400
+    assert fake_llm.calls == 0
+
+
+def test_remote_follower_reads_the_result_its_leader_stored(fake_llm, monkeypatch):
+    monkeypatch.setattr(
+        model_router, "route",
+        lambda use_case, requested=None: RouteDecision(use_case, "gemini-2.5-flash-lite", "degraded", requested),
+    )
+    monkeypatch.setattr(roadmap_single_flight, "distributed", True)
+    monkeypatch.setattr(roadmap_single_flight, "poll_interval", 0)
+    monkeypatch.setattr(roadmap_single_flight, "_release", lambda lock_key, token: None)
+    monkeypatch.setattr(roadmap_single_flight, "_lock_held", lambda lock_key: False)
+    request_data = {
+        "subject": "Remote Follower",
+        "goal": "Share a downgraded result across instances",
+        "time_value": 2,
+        "time_unit": "weeks",
+        "model": "gemini-2.5-flash",
+    }
+
+    monkeypatch.setattr(roadmap_single_flight, "_acquire", lambda lock_key, token: True)
+    assert client.post("/roadmaps/generate", json=request_data).status_code == 200
+
+    # Another instance led this flight; the follower must find what it stored
+    monkeypatch.setattr(roadmap_single_flight, "_acquire", lambda lock_key, token: False)
+    response = client.post("/roadmaps/generate", json=request_data)
+    assert response.status_code == 200
+    assert fake_llm.calls == 1
+    assert roadmap_single_flight.get_stats()["remote_hits"] >= 1
+
+
+def test_stream_returns_its_ticket_when_the_body_never_starts(fake_llm, monkeypatch):
+    released = []
+    monkeypatch.setattr(llm_scheduler, "release", lambda ticket, used_tokens: released.append(used_tokens))
+    request = Request({"type": "http", "method": "POST", "path": "/roadmaps/generate/stream", "headers": [], "client": ("10.0.0.9", 1234)})
+    roadmap_create = RoadmapCreate(subject="Dropped Stream", goal="Disconnect before the first byte", time_value=1, time_unit="weeks")
+
+    async def disconnect_before_body():
+        response = await generate_roadmap_stream(roadmap_create, request, None)
+        await response.background()
+        await response.background()
+
+    asyncio.run(disconnect_before_body())
+    assert released == [0]
+    assert fake_llm.calls == 0
+
+    # A stream that runs settles once from its own accounting
+    released.clear()
+    response = client.post("/roadmaps/generate/stream", json={**roadmap_create.model_dump(), "subject": "Completed Stream"})
+    assert stream_events(response)[-1] == "done"
+    assert len(released) == 1 and released[0] > 0
+
+
+def batch_lines(response):
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def test_batch_dedupes_identical_items(fake_llm):
+    item = {"subject": "Batch Dedup Astronomy", "goal": "Name the planets", "time_value": 2, "time_unit": "weeks"}
+    same = {**item, "subject": "  batch dedup ASTRONOMY ", "time_unit": "wk"}
+    other = {"subject": "Batch Dedup Pottery", "goal": "Throw a bowl", "time_value": 3, "time_unit": "weeks"}
+    response = client.post("/roadmaps/generate/batch", json={"items": [item, other, same]})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    lines = batch_lines(response)
+    results = {line["index"]: line for line in lines[:-1]}
+    assert sorted(results) == [0, 1, 2]
+    assert all(line["status"] == "ok" for line in results.values())
+    # Normalized duplicates share one generation
+    assert fake_llm.calls == 2
+    assert results[0]["roadmap"]["roadmap_plan"] == results[2]["roadmap"]["roadmap_plan"]
+    assert lines[-1] == {"status": "complete", "total": 3, "unique": 2, "succeeded": 3, "failed": 0}
+
+
+def test_batch_reports_failed_items_on_their_own_lines(fake_llm, monkeypatch):
+    recorded = corpus_output("01_clean.txt")
+    no_json = corpus_output("14_no_json.txt")
+    monkeypatch.setattr(fake_llm, "output_for", lambda prompt: no_json if "Unparseable" in prompt else recorded)
+    items = [
+        {"subject": "Batch Errors Woodworking", "goal": "Build a stool", "time_value": 2, "time_unit": "weeks"},
+        {"subject": "Unparseable Batch Falconry", "goal": "Fly a hawk", "time_value": 2, "time_unit": "weeks"},
+    ]
+    response = client.post("/roadmaps/generate/batch", json={"items": items})
+    assert response.status_code == 200
+
+    lines = batch_lines(response)
+    results = {line["index"]: line for line in lines[:-1]}
+    assert results[0]["status"] == "ok" and results[0]["roadmap"]["title"]
+    assert results[1]["status"] == "error"
+    assert results[1]["status_code"] == 500 and results[1]["detail"]
+    assert lines[-1] == {"status": "complete", "total": 2, "unique": 2, "succeeded": 1, "failed": 1}
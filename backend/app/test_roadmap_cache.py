@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+from app.database.cache import RedisCacheTier
+from app.schemas import RoadmapCreate
+from app.utils.circuit_breaker import CircuitBreaker
+from app.utils.roadmap_cache import RoadmapResultCache, roadmap_cache_key
+
+
+def _request(**overrides) -> RoadmapCreate:
+    fields = {"subject": "Python", "goal": "Learn the basics", "time_value": 2, "time_unit": "weeks"}
+    fields.update(overrides)
+    return RoadmapCreate(**fields)
+
+
+def test_equivalent_requests_share_a_key():
+    base = roadmap_cache_key(_request())
+    assert roadmap_cache_key(_request(subject="  python ")) == base
+    assert roadmap_cache_key(_request(goal="learn   the BASICS")) == base
+    assert roadmap_cache_key(_request(time_unit="Week")) == base
+    assert roadmap_cache_key(_request(model="models/gemini-2.5-flash")) == base
+
+
+def test_different_requests_do_not_collide():
+    base = roadmap_cache_key(_request())
+    assert roadmap_cache_key(_request(time_value=3)) != base
+    assert roadmap_cache_key(_request(prior_experience="some")) != base
+    assert roadmap_cache_key(_request(model="gemini-2.5-pro")) != base
+
+
+def test_memory_tier_round_trip():
+    cache = RoadmapResultCache(max_entries=4, ttl=60)
+    data = {"title": "T", "roadmap_plan": {"modules": []}}
+
+    async def scenario():
+        assert await cache.get("k") == (None, None)
+        await cache.set("k", data)
+        return await cache.get("k")
+
+    assert asyncio.run(scenario()) == (data, "memory")
+
+
+class StoredPayloads:
+    """Pipeline-only Redis stand-in returning fixed (payload, pttl) pairs"""
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def pipeline(self, transaction=False):
+        return self
+
+    def get(self, key):
+        pass
+
+    def pttl(self, key):
+        pass
+
+    def execute(self):
+        return [self.payload, 60000]
+
+
+def test_corrupt_redis_entry_is_a_miss():
+    tier = RedisCacheTier("redis://localhost:6379/0", breaker=CircuitBreaker("test_roadmap_cache_reads"))
+    tier._client = StoredPayloads(b"\x00{not json")
+    cache = RoadmapResultCache(max_entries=4, ttl=60, tier=tier)
+    assert asyncio.run(cache.get("k")) == (None, None)
+
+    data = {"title": "T", "roadmap_plan": {"modules": []}}
+    tier._client = StoredPayloads(tier.encode(data))
+    assert asyncio.run(cache.get("k")) == (data, "redis")
+
+
+def test_unreachable_redis_fails_fast():
+    breaker = CircuitBreaker("test_roadmap_cache", window_size=4, min_calls=2, open_seconds=60)
+    tier = RedisCacheTier("redis://127.0.0.1:1/0", timeout=0.05, breaker=breaker)
+    cache = RoadmapResultCache(max_entries=4, ttl=60, tier=tier)
+    data = {"title": "T", "roadmap_plan": {"modules": []}}
+
+    async def scenario():
+        for i in range(20):
+            assert await cache.get(f"missing:{i}") == (None, None)
+            await cache.set(f"written:{i}", data)
+
+    start = time.perf_counter()
+    asyncio.run(scenario())
+    assert time.perf_counter() - start < 2.0
@@ -0,0 +1,46 @@
+from app.utils.roadmap_index import RoadmapIndex, RoadmapIndexCache, build_roadmap_index
+
+PLAN = {
+    "modules": [
+        {"topics": [
+            {"subtopics": [{"id": "a"}, {"id": "b"}]},
+            {"subtopics": [{"id": "c"}]},
+        ]},
+        {"topics": [{"subtopics": []}, {"subtopics": [{"id": "d"}]}]},
+    ]
+}
+
+
+def test_index_maps_ids_to_offsets_and_order():
+    index = RoadmapIndex(build_roadmap_index(PLAN))
+
+    assert index.total == 4
+    assert index.locate("c") == (0, 1, 0)
+    assert index.locate("d") == (1, 1, 0)
+    assert index.ordinal("d") == 3
+    assert index.get_subtopic(PLAN, "b") == {"id": "b"}
+    assert index.locate("missing") is None
+
+
+def test_neighbours_and_progress():
+    index = RoadmapIndex.from_plan(PLAN)
+
+    assert index.next_subtopic_id("c") == "d"
+    assert index.next_subtopic_id("d") is None
+    assert index.previous_subtopic_id("a") is None
+    assert index.previous_subtopic_id("c") == "b"
+    assert index.progress(["a", "c", "c", "unknown"]) == 50.0
+
+
+def test_cache_prefers_stored_index_and_rebuilds_legacy_rows():
+    cache = RoadmapIndexCache()
+    stored = build_roadmap_index({"modules": [{"topics": [{"subtopics": [{"id": "x"}]}]}]})
+
+    with_column = cache.get({"id": 1, "roadmap_plan": PLAN, "roadmap_index": stored})
+    legacy = cache.get({"id": 2, "roadmap_plan": PLAN, "roadmap_index": None})
+
+    assert with_column.order == ["x"]
+    assert legacy.order == ["a", "b", "c", "d"]
+    assert cache.get({"id": 1}) is with_column
+    cache.invalidate(1)
+    assert cache.get({"id": 1, "roadmap_plan": PLAN}).order == ["a", "b", "c", "d"]
@@ -0,0 +1,48 @@
+from app.schemas import RoadmapCreate
+from app.utils.roadmap_similarity import RoadmapSimilarityIndex, request_tokens
+
+
+def make_request(subject, goal="", time_value=4, time_unit="weeks", **kwargs):
+    return RoadmapCreate(subject=subject, goal=goal, time_value=time_value, time_unit=time_unit, **kwargs)
+
+
+def test_rephrased_requests_share_tokens():
+    assert request_tokens(make_request("learn python basics")) == request_tokens(
+        make_request("Learn the basics of Python")
+    )
+
+
+def test_near_duplicate_is_found_above_threshold():
+    index = RoadmapSimilarityIndex(threshold=0.8)
+    index.add(make_request("Python", "build web applications with Django"), "key-django")
+    index.add(make_request("Rust", "systems programming"), "key-rust")
+
+    match = index.find(make_request("python", "Build web application with django"))
+    assert match is not None
+    assert match[0] == "key-django"
+    assert match[1] >= 0.8
+
+    assert index.find(make_request("Python", "data analysis with pandas")) is None
+
+
+def test_duration_and_experience_must_match():
+    index = RoadmapSimilarityIndex(threshold=0.8)
+    index.add(make_request("Go", "concurrency patterns"), "key")
+
+    assert index.find(make_request("Go", "concurrency patterns", time_value=8)) is None
+    assert index.find(make_request("Go", "concurrency patterns", time_unit="wk")) is not None
+    assert index.find(make_request("Go", "concurrency patterns", prior_experience="C developer")) is None
+
+
+def test_eviction_and_removal_clean_up_buckets():
+    index = RoadmapSimilarityIndex(max_entries=2)
+    index.add(make_request("Kotlin"), "a")
+    index.add(make_request("Swift"), "b")
+    index.add(make_request("Haskell"), "c")
+
+    assert index.find(make_request("Kotlin")) is None
+    index.remove("b")
+    index.remove("c")
+    stats = index.get_stats()
+    assert stats["entries"] == 0
+    assert stats["buckets"] == 0
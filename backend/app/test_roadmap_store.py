@@ -0,0 +1,175 @@
+import asyncio
+import itertools
+from datetime import timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import JSON
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.core.auth import get_current_user, get_optional_current_user
+from app.database.batch import BatchRowsFailed, batch_processor
+from app.database.cache import query_cache
+from app.database.roadmap_store import RoadmapStore, SequenceIdAllocator
+from app.database.session import get_db
+from app.main import app
+from app.routers import roadmaps as roadmaps_router
+from app.sql_models import Roadmap, User
+
+
+@compiles(JSONB, "sqlite")
+def _jsonb_as_json(element, compiler, **kw):
+    # SQLite stands in for Postgres here; JSONB columns store plain JSON
+    return compiler.process(JSON(), **kw)
+
+
+def _row(user_id=None, title="Learn SQL"):
+    return {
+        "user_id": user_id,
+        "title": title,
+        "description": "A plan",
+        "roadmap_plan": {"modules": [{"id": "module_1", "title": "Basics", "timeline": "Week 1", "topics": []}]},
+        "roadmap_index": None,
+        "subject": "SQL",
+        "goal": "Write queries",
+        "time_value": 2,
+        "time_unit": "weeks",
+        "model": None,
+    }
+
+
+# IDs are unique across tests so no response cached by one test matches another
+_ids = itertools.count(1000)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine, tables=[User.__table__, Roadmap.__table__])
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def store(monkeypatch):
+    # Each test has its own database, so reads cached by earlier tests are stale
+    query_cache.clear()
+    store = RoadmapStore()
+    monkeypatch.setattr(store._allocator, "_reserve_block", lambda: [next(_ids) for _ in range(3)])
+    monkeypatch.setattr(roadmaps_router, "roadmap_store", store)
+    yield store
+    batch_processor._pending_operations.clear()
+
+
+def test_allocator_reserves_ids_in_blocks(monkeypatch):
+    allocator = SequenceIdAllocator("roadmap", block_size=3)
+    blocks = iter([[1, 2, 3], [4, 5, 6]])
+    calls = []
+    monkeypatch.setattr(allocator, "_reserve_block", lambda: calls.append(1) or next(blocks))
+    assert [allocator.next_id() for _ in range(4)] == [1, 2, 3, 4]
+    assert len(calls) == 2
+
+
+def test_saved_roadmap_is_readable_before_and_after_flush(engine, store):
+    row = store.save(_row(user_id=None))
+    with Session(engine) as session:
+        assert store.get(session, row["id"])["title"] == "Learn SQL"
+
+        batch_processor.flush(session)
+        assert row["id"] not in store._pending
+        stored = store.get(session, row["id"])
+        assert stored["id"] == row["id"] and stored["title"] == "Learn SQL"
+
+
+def test_unflushed_rows_expire_from_pending(engine, store):
+    old = store.save(_row())
+    store._pending[old["id"]]["created_at"] -= timedelta(seconds=store.pending_ttl + 1)
+    store.save(_row(title="Newer"))
+    batch_processor._pending_operations.clear()
+
+    assert old["id"] not in store._pending
+    with Session(engine) as session:
+        assert store.get(session, old["id"]) is None
+
+
+def test_bad_row_in_a_flush_leaves_the_good_rows_persisted(engine, store):
+    good = store.save(_row(title="Good"))
+    bad = store.save({**_row(), "title": None})
+    other = store.save(_row(title="Also good"))
+    with Session(engine) as session:
+        with pytest.raises(BatchRowsFailed):
+            batch_processor.flush(session)
+        assert session.get(Roadmap, good["id"]).title == "Good"
+        assert session.get(Roadmap, other["id"]).title == "Also good"
+        assert store.get(session, bad["id"]) is not None
+
+        # Once the bad row runs out of attempts it is discarded everywhere
+        for _ in range(batch_processor.max_attempts - 1):
+            with pytest.raises(Exception):
+                batch_processor.flush(session)
+        assert batch_processor.pending_count == 0
+        assert bad["id"] not in store._pending
+        assert store.get(session, bad["id"]) is None
+
+
+def test_cached_reads_are_invalidated_on_update_and_delete(engine, store):
+    row = store.save(_row())
+    with Session(engine) as session:
+        batch_processor.flush(session)
+        assert store.get(session, row["id"])["title"] == "Learn SQL"
+
+        roadmap = session.get(Roadmap, row["id"])
+        roadmap.title = "Learn Postgres"
+        session.add(roadmap)
+        session.commit()
+        assert store.get(session, row["id"])["title"] == "Learn Postgres"
+
+        session.delete(session.get(Roadmap, row["id"]))
+        session.commit()
+        assert store.get(session, row["id"]) is None
+
+
+def test_roadmap_endpoints_read_through_the_store(engine, store):
+    with Session(engine) as session:
+        user = User(supabase_uid="uid-store", email="store@example.com", is_active=True)
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+
+    def override_db():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_db
+    app.dependency_overrides[get_current_user] = lambda: user
+    app.dependency_overrides[get_optional_current_user] = lambda: user
+    try:
+        client = TestClient(app)
+        mine = store.save(_row(user_id=user.id, title="Mine"))
+        response = client.get(f"/roadmaps/{mine['id']}")
+        assert response.status_code == 200 and response.json()["title"] == "Mine"
+
+        with Session(engine) as session:
+            batch_processor.flush(session)
+        listed = client.get("/users/me/roadmaps").json()
+        assert [item["id"] for item in listed] == [mine["id"]]
+
+        app.dependency_overrides[get_optional_current_user] = lambda: None
+        other = store.save(_row(user_id=user.id, title="Private"))
+        assert client.get(f"/roadmaps/{other['id']}").status_code == 404
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_unsaved_roadmap_has_no_id(store, monkeypatch):
+    def fail(row):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(store, "save", fail)
+    roadmap_create = roadmaps_router.RoadmapCreate(subject="SQL", goal="Write queries", time_value=2, time_unit="weeks")
+    roadmap_data = {"title": "T", "description": "D", "roadmap_plan": _row()["roadmap_plan"]}
+    saved = asyncio.run(roadmaps_router.save_roadmap(roadmap_data, roadmap_create))
+    assert saved["id"] is None
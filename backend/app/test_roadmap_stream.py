@@ -0,0 +1,87 @@
+import json
+
+from app.utils.roadmap_stream import ModuleStreamParser, detect_truncation
+
+
+def _roadmap(module_count: int) -> dict:
+    return {
+        "title": "Braces {inside} \"quoted\" title",
+        "description": "D",
+        "roadmap_plan": {
+            "modules": [
+                {
+                    "title": f"Module {i}",
+                    "timeline": "Week 1",
+                    "topics": [{"title": "t}", "subtopics": [{"title": "s]"}]}],
+                }
+                for i in range(module_count)
+            ]
+        },
+    }
+
+
+def _feed_in_chunks(text: str, size: int):
+    parser = ModuleStreamParser()
+    modules = []
+    for i in range(0, len(text), size):
+        modules.extend(parser.feed(text[i:i + size]))
+    return parser, modules
+
+
+def test_modules_are_emitted_regardless_of_chunking():
+    data = _roadmap(4)
+    text = "```json\n" + json.dumps(data, indent=2) + "\n```"
+
+    for size in (1, 5, 64, len(text)):
+        parser, modules = _feed_in_chunks(text, size)
+        assert modules == data["roadmap_plan"]["modules"]
+        assert parser.title == data["title"]
+        assert parser.description == "D"
+        assert parser.finished
+
+
+def test_module_is_emitted_as_soon_as_it_closes():
+    text = json.dumps(_roadmap(2))
+    first_end = text.index('"Module 1"')
+
+    parser = ModuleStreamParser()
+    modules = parser.feed(text[:first_end])
+    assert [m["title"] for m in modules] == ["Module 0"]
+    assert [m["title"] for m in parser.feed(text[first_end:])] == ["Module 1"]
+
+
+def test_truncated_output_keeps_completed_modules():
+    text = json.dumps(_roadmap(3))
+    cut = text.index('"Module 2"') + 20
+
+    parser, modules = _feed_in_chunks(text[:cut], 7)
+    assert [m["title"] for m in modules] == ["Module 0", "Module 1"]
+    assert not parser.finished
+
+
+def test_detect_truncation_reports_last_complete_module_and_topic():
+    data = _roadmap(3)
+    for module in data["roadmap_plan"]["modules"]:
+        module["topics"].append({"title": "second", "subtopics": [{"title": "x"}]})
+    text = json.dumps(data)
+    cut = text.index('"second"', text.index('"Module 2"')) + 3
+
+    truncated = detect_truncation(text[:cut])
+    assert [m["title"] for m in truncated.modules] == ["Module 0", "Module 1"]
+    assert truncated.partial_module_title == "Module 2"
+    assert truncated.last_complete_module == "Module 1"
+    assert truncated.last_complete_topic == "t}"
+    assert not truncated.modules_closed
+
+
+def test_detect_truncation_ignores_complete_output():
+    assert detect_truncation(json.dumps(_roadmap(2))) is None
+
+
+def test_raw_control_characters_do_not_break_the_scan():
+    text = '{"title": "Line\nbreak", "description": "Tab\there", "roadmap_plan": {"modules": [{"title": "M\n1", "topics": []}]}}'
+    parser, modules = _feed_in_chunks(text, 7)
+    assert parser.finished
+    assert parser.title == "Line\nbreak"
+    assert modules == [{"title": "M\n1", "topics": []}]
+    assert detect_truncation(text) is None
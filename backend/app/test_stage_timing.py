@@ -0,0 +1,53 @@
+import asyncio
+import json
+import logging
+
+import pytest
+
+from app.utils import stage_timing
+from app.utils.stage_timing import StageMetrics, log_raw_output, stage, start_stage_timer
+
+
+def test_stages_accumulate_into_server_timing(monkeypatch):
+    metrics = StageMetrics("test")
+    monkeypatch.setattr(stage_timing, "generation_stages", metrics)
+
+    async def handler():
+        timer = start_stage_timer()
+        with stage("llm"):
+            pass
+
+        async def child():
+            # Spawned tasks record into the request's timer
+            with stage("llm"):
+                pass
+        await asyncio.ensure_future(child())
+
+        with pytest.raises(ValueError):
+            with stage("parse"):
+                raise ValueError("bad output")
+        return timer
+
+    timer = asyncio.run(handler())
+    assert list(timer.durations) == ["llm", "parse"]
+    header = timer.server_timing()
+    assert header.startswith("llm;dur=") and ", parse;dur=" in header and ", total;dur=" in header
+    assert metrics.get_stats()["llm"]["count"] == 2
+
+
+def test_raw_output_log_is_sampled_and_capped(monkeypatch, caplog):
+    monkeypatch.setattr(stage_timing.settings, "LLM_RAW_OUTPUT_SAMPLE_RATE", 0.0)
+    monkeypatch.setattr(stage_timing.settings, "LLM_RAW_OUTPUT_MAX_CHARS", 100)
+    text = "{" + "x" * 1000 + "}"
+
+    with caplog.at_level(logging.INFO, logger=stage_timing.__name__):
+        log_raw_output(text)
+        assert not caplog.records
+        log_raw_output(text, force=True, error="parse failed")
+
+    record = json.loads(caplog.records[0].getMessage())
+    assert record["chars"] == len(text)
+    assert record["truncated"] is True
+    assert record["head"].startswith("{") and record["tail"].endswith("}")
+    assert len(record["head"]) + len(record["tail"]) == 100
+    assert record["error"] == "parse failed"
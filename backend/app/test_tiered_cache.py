@@ -0,0 +1,197 @@
+import asyncio
+import threading
+from datetime import datetime
+from threading import Event
+
+import pytest
+
+from app.database.cache import CachedResult, QueryCache, RedisCacheTier, TieredCache
+from app.utils.circuit_breaker import CircuitBreaker
+from app.utils.response_cache import ResponseCache
+
+
+class SharedRedis:
+    """In-memory stand-in for the Redis server shared by several instances"""
+
+    def __init__(self):
+        self.values = {}
+        self.tags = {}
+        self.subscribers = []
+
+
+class InMemoryTier:
+    """RedisCacheTier interface over SharedRedis; publish delivers synchronously"""
+
+    def __init__(self, server: SharedRedis, fail: bool = False):
+        self.server = server
+        self.fail = fail
+        self.reads = 0
+        self.read_threads = []
+        self.breaker = CircuitBreaker("test_l2", window_size=4, min_calls=2, open_seconds=60)
+
+    def get(self, key):
+        with self.breaker.protect():
+            self.reads += 1
+            self.read_threads.append(threading.current_thread())
+            if self.fail:
+                raise ConnectionError("redis down")
+            stored = self.server.values.get(key)
+        return None if stored is None else (stored[0], 30.0, stored[1])
+
+    def set(self, key, value, ttl, tags=()):
+        with self.breaker.protect():
+            self.server.values[key] = (value, tags)
+            for tag in tags:
+                self.server.tags.setdefault(tag, set()).add(key)
+
+    def delete_tag(self, tag):
+        for key in self.server.tags.pop(tag, ()):
+            self.server.values.pop(key, None)
+
+    def delete(self, key):
+        self.server.values.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        for key in [k for k in self.server.values if k.startswith(prefix)]:
+            del self.server.values[key]
+
+    def publish(self, message):
+        for handler in list(self.server.subscribers):
+            handler(message)
+
+    def listen(self, handler, on_subscribed, stop: Event):
+        self.server.subscribers.append(handler)
+        on_subscribed()
+        stop.wait()
+        self.server.subscribers.remove(handler)
+
+
+def make_instance(server, **options):
+    cache = TieredCache(QueryCache(max_size=100, default_ttl=60), InMemoryTier(server, **options))
+    cache.start()
+    return cache
+
+
+def test_l1_miss_is_filled_from_the_shared_tier():
+    server = SharedRedis()
+    a, b = make_instance(server), make_instance(server)
+    try:
+        a.set("roadmap:1:x", {"title": "Go"})
+        a.flush()
+        assert b.l1.get("roadmap:1:x") is None
+        assert b.get("roadmap:1:x") == {"title": "Go"}
+        assert b.l1.get("roadmap:1:x") == {"title": "Go"}
+        assert b.get_stats()["l2"]["l2_hits"] == 1
+    finally:
+        a.stop()
+        b.stop()
+
+
+def test_invalidations_reach_other_instances():
+    server = SharedRedis()
+    a, b = make_instance(server), make_instance(server)
+    try:
+        a.set("user:7:roadmaps", [1])
+        a.flush()
+        assert b.get("user:7:roadmaps") == [1]
+
+        a.delete_prefix("user:7:")
+        a.flush()
+        assert b.l1.get("user:7:roadmaps") is None
+        assert b.get("user:7:roadmaps") is None
+        assert b.get_stats()["l2"]["invalidations_received"] == 1
+    finally:
+        a.stop()
+        b.stop()
+
+
+def test_tag_invalidation_covers_entries_filled_from_l2():
+    server = SharedRedis()
+    a, b = make_instance(server), make_instance(server)
+    try:
+        a.set("5f4dcc3b5aa765d6", {"id": 3}, tags=("user:3", "table:user"))
+        a.flush()
+        assert b.get("5f4dcc3b5aa765d6") == {"id": 3}
+
+        b.delete_tag("user:3")
+        b.flush()
+        assert a.l1.get("5f4dcc3b5aa765d6") is None
+        assert a.get("5f4dcc3b5aa765d6") is None
+    finally:
+        a.stop()
+        b.stop()
+
+
+def test_attached_cache_invalidations_reach_other_instances():
+    server = SharedRedis()
+    a, b = make_instance(server), make_instance(server)
+    try:
+        responses_a = ResponseCache(name="responses", invalidations=a)
+        responses_b = ResponseCache(name="responses", invalidations=b)
+        responses_a.set("roadmap:9", {"title": "Go"})
+        responses_b.set("roadmap:9", {"title": "Go"})
+
+        responses_a.invalidate("roadmap:9")
+        a.flush()
+        assert responses_a.get("roadmap:9") is None
+        assert responses_b.get("roadmap:9") is None
+        # Response bytes are never written to the shared tier
+        assert server.values == {}
+    finally:
+        a.stop()
+        b.stop()
+
+
+def test_failing_tier_degrades_to_l1_only():
+    cache = make_instance(SharedRedis(), fail=True)
+    try:
+        cache.set("user:1:profile", "cached")
+        for _ in range(5):
+            assert cache.get("user:1:missing") is None
+        # The breaker opened after two failed reads; later misses skip Redis
+        assert cache.l2.reads == 2
+        assert cache.get("user:1:profile") == "cached"
+    finally:
+        cache.stop()
+
+
+def test_async_reads_reach_redis_off_the_event_loop():
+    server = SharedRedis()
+    a, b = make_instance(server), make_instance(server)
+    try:
+        a.set("user:uid:abc", CachedResult(7, 1e12, 0.01))
+        a.flush()
+
+        async def read():
+            return await b.aget("user:uid:abc"), threading.current_thread()
+
+        record, loop_thread = asyncio.run(read())
+        assert record == CachedResult(7, 1e12, 0.01)
+        assert b.l2.read_threads and loop_thread not in b.l2.read_threads
+    finally:
+        a.stop()
+        b.stop()
+
+
+def test_payloads_keep_types_and_compress_when_large():
+    tier = RedisCacheTier("redis://localhost:6379/0", compress_min_bytes=256)
+    small = {"id": 1, "created_at": datetime(2024, 5, 1, 12, 30), "title": None}
+    large = {"steps": ["lesson " * 20] * 50}
+    assert tier.decode(tier.encode(small, ("user:1",))) == (small, ("user:1",))
+    encoded = tier.encode(large)
+    assert encoded[:1] == b"\x01" and len(encoded) < 1000
+    assert tier.decode(encoded) == (large, ())
+
+    record = CachedResult([small], 1700000000.0, 0.2)
+    value, _ = tier.decode(tier.encode(record))
+    assert isinstance(value, CachedResult) and value == record
+
+
+def test_payloads_are_json_not_pickle():
+    tier = RedisCacheTier("redis://localhost:6379/0")
+    assert tier.encode({"id": 1}, ("user:1",))[1:].startswith(b"{")
+    # Objects with no JSON form stay in L1 rather than being pickled
+    with pytest.raises(TypeError):
+        tier.encode(object())
+    # Entries written in another layout read as misses
+    assert tier.decode(b"\x00" + b'{"v":0,"value":1}') is None
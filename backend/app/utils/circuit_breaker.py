@@ -0,0 +1,208 @@
+"""
+Circuit breakers for upstream services
+Trip on a high error or slow-call rate over recent calls, fail fast while
+open, and let a few probe calls through once the cool-down has passed
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the upstream while its circuit is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"Circuit {name} is open, retry after {retry_after:.1f}s")
+
+
+class BreakerCall:
+    """Timing of one guarded call; callers may narrow what counts as latency"""
+
+    def __init__(self, clock: Callable[[], float]):
+        self.clock = clock
+        self.started = clock()
+        self.ended: Optional[float] = None
+
+    def start(self) -> None:
+        """Restart the clock, e.g. once a local concurrency slot is acquired"""
+        self.started = self.clock()
+
+    def stop(self) -> None:
+        """Stop the clock early, e.g. at the first streamed chunk"""
+        if self.ended is None:
+            self.ended = self.clock()
+
+    @property
+    def duration(self) -> float:
+        return (self.ended if self.ended is not None else self.clock()) - self.started
+
+
+class CircuitBreaker:
+    """Per-upstream breaker over a sliding window of call outcomes"""
+
+    def __init__(self, name: str, failure_rate_threshold: float = 0.5,
+                 slow_call_seconds: Optional[float] = None, slow_call_rate_threshold: float = 0.8,
+                 window_size: int = 20, min_calls: int = 10, open_seconds: float = 30.0,
+                 half_open_max_calls: int = 2,
+                 is_failure: Callable[[BaseException], bool] = lambda exc: True,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.is_failure = is_failure
+        self.clock = clock
+        self.state = CLOSED
+        self._calls: Deque[Tuple[bool, bool]] = deque(maxlen=window_size)  # (failed, slow)
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self._lock = Lock()
+        self._stats = {"calls": 0, "failures": 0, "slow_calls": 0, "rejected": 0, "trips": 0}
+
+    def _transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        logger.warning(f"Circuit {self.name}: {self.state} -> {state}")
+        self.state = state
+        self._probes = 0
+        self._probe_successes = 0
+        if state == OPEN:
+            self._opened_at = self.clock()
+            self._stats["trips"] += 1
+        elif state == CLOSED:
+            self._calls.clear()
+
+    def before_call(self) -> None:
+        """Admit a call or raise CircuitOpenError"""
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self._opened_at + self.open_seconds - self.clock()
+                if remaining > 0:
+                    self._stats["rejected"] += 1
+                    raise CircuitOpenError(self.name, remaining)
+                self._transition(HALF_OPEN)
+
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_max_calls:
+                    self._stats["rejected"] += 1
+                    raise CircuitOpenError(self.name, self.open_seconds)
+                self._probes += 1
+            self._stats["calls"] += 1
+
+    def record(self, failed: bool, duration: float) -> None:
+        slow = self.slow_call_seconds is not None and duration >= self.slow_call_seconds
+        with self._lock:
+            self._stats["failures"] += failed
+            self._stats["slow_calls"] += slow
+
+            if self.state == HALF_OPEN:
+                if failed or slow:
+                    self._transition(OPEN)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_max_calls:
+                        self._transition(CLOSED)
+                return
+
+            if self.state != CLOSED:
+                return
+            self._calls.append((failed, slow))
+            if len(self._calls) < self.min_calls:
+                return
+            failure_rate = sum(f for f, _ in self._calls) / len(self._calls)
+            slow_rate = sum(s for _, s in self._calls) / len(self._calls)
+            if failure_rate >= self.failure_rate_threshold or slow_rate >= self.slow_call_rate_threshold:
+                self._transition(OPEN)
+
+    def retry_after(self) -> float:
+        """Seconds until calls are admitted again; 0 when not open"""
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self.open_seconds - self.clock())
+
+    def release_probe(self) -> None:
+        """Give back a half-open probe slot for a call that ended without an outcome"""
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes:
+                self._probes -= 1
+
+    @contextmanager
+    def protect(self) -> Iterator[BreakerCall]:
+        """Guard one upstream call; cancellations and caller errors are not counted"""
+        self.before_call()
+        call = BreakerCall(self.clock)
+        try:
+            yield call
+        except (asyncio.CancelledError, GeneratorExit):
+            self.release_probe()
+            raise
+        except Exception as e:
+            self.record(self.is_failure(e), call.duration)
+            raise
+        self.record(False, call.duration)
+
+    def get_stats(self) -> Dict[str, Any]:
+        retry_after = self.retry_after()
+        with self._lock:
+            calls = list(self._calls)
+            stats = dict(self._stats)
+            state = self.state
+        stats.update({
+            "state": state,
+            "retry_after": round(retry_after, 2),
+            "window_calls": len(calls),
+            "window_failure_rate": round(sum(f for f, _ in calls) / len(calls), 4) if calls else 0.0,
+            "window_slow_rate": round(sum(s for _, s in calls) / len(calls), 4) if calls else 0.0,
+        })
+        return stats
+
+
+class CircuitBreakerRegistry:
+    """Named breakers, one per upstream"""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = Lock()
+
+    def get(self, name: str, **options: Any) -> CircuitBreaker:
+        """Return the breaker for name, creating it with options on first use"""
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                defaults = {
+                    "failure_rate_threshold": settings.CIRCUIT_FAILURE_RATE_THRESHOLD,
+                    "window_size": settings.CIRCUIT_WINDOW_SIZE,
+                    "min_calls": settings.CIRCUIT_MIN_CALLS,
+                    "open_seconds": settings.CIRCUIT_OPEN_SECONDS,
+                }
+                breaker = self._breakers[name] = CircuitBreaker(name, **{**defaults, **options})
+            return breaker
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {name: breaker.get_stats() for name, breaker in breakers.items()}
+
+
+# Global breaker registry
+circuit_breakers = CircuitBreakerRegistry()
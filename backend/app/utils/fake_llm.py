@@ -0,0 +1,151 @@
+"""
+Offline LLM stand-in
+Replays recorded raw model outputs with a configurable latency distribution
+and failure rate, behind the same model-handle interface gemini_client uses
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import random
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator, List, Optional, Sequence
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CORPUS_DIR = Path(__file__).resolve().parents[2] / "benchmarks" / "corpus" / "roadmap_outputs"
+
+
+class FakeLLMError(RuntimeError):
+    """Injected upstream failure"""
+
+
+@dataclass
+class FakeResponse:
+    text: str
+
+
+class FakeLLM:
+    """Recorded outputs plus a latency/failure model.
+
+    Latency is log-normal around ``latency_median`` (``latency_sigma`` 0 makes
+    it fixed). Streams spend ``first_chunk_fraction`` of the latency before the
+    first chunk and spread the rest over the remaining chunks. The output for
+    a prompt is chosen by hashing it, so reruns replay the same text.
+    """
+
+    def __init__(self, outputs: Sequence[str], latency_median: float = 1.0,
+                 latency_sigma: float = 0.0, failure_rate: float = 0.0,
+                 chunk_size: int = 512, first_chunk_fraction: float = 0.3,
+                 seed: Optional[int] = None):
+        if not outputs:
+            raise ValueError("FakeLLM needs at least one recorded output")
+        self.outputs = list(outputs)
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.failure_rate = failure_rate
+        self.chunk_size = chunk_size
+        self.first_chunk_fraction = first_chunk_fraction
+        self._random = random.Random(seed)
+        self.calls = 0
+        self.failures = 0
+
+    @classmethod
+    def from_corpus(cls, corpus_dir: Optional[Path] = None, pattern: str = "*.txt", **options: Any) -> "FakeLLM":
+        corpus_dir = Path(corpus_dir or DEFAULT_CORPUS_DIR)
+        paths = sorted(corpus_dir.glob(pattern))
+        if not paths:
+            raise ValueError(f"No recorded outputs matching {pattern!r} in {corpus_dir}")
+        logger.info(f"Fake LLM replaying {len(paths)} recorded outputs from {corpus_dir}")
+        return cls([p.read_text(encoding="utf-8") for p in paths], **options)
+
+    def latency(self) -> float:
+        if self.latency_median <= 0:
+            return 0.0
+        if self.latency_sigma <= 0:
+            return self.latency_median
+        return self._random.lognormvariate(math.log(self.latency_median), self.latency_sigma)
+
+    def output_for(self, prompt: str) -> str:
+        digest = hashlib.blake2b(prompt.encode("utf-8"), digest_size=8).digest()
+        return self.outputs[int.from_bytes(digest, "big") % len(self.outputs)]
+
+    def should_fail(self) -> bool:
+        self.calls += 1
+        if self.failure_rate > 0 and self._random.random() < self.failure_rate:
+            self.failures += 1
+            return True
+        return False
+
+    def chunks(self, text: str) -> List[str]:
+        return [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)] or [""]
+
+    def get_model(self, model: str, system_instruction: Optional[str] = None) -> "FakeGenerativeModel":
+        return FakeGenerativeModel(self, model, system_instruction)
+
+
+class FakeGenerativeModel:
+    """Duck-types the parts of genai.GenerativeModel that GeminiClient calls"""
+
+    def __init__(self, fake: FakeLLM, model_name: str, system_instruction: Optional[str] = None):
+        self.fake = fake
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+
+    async def generate_content_async(self, prompt: str, generation_config: Any = None, stream: bool = False):
+        latency = self.fake.latency()
+        text = self.fake.output_for(prompt)
+        if stream:
+            return self._stream_async(text, latency)
+        await asyncio.sleep(latency)
+        if self.fake.should_fail():
+            raise FakeLLMError("Injected LLM failure")
+        return FakeResponse(text)
+
+    async def _stream_async(self, text: str, latency: float) -> AsyncIterator[FakeResponse]:
+        chunks = self.fake.chunks(text)
+        await asyncio.sleep(latency * self.fake.first_chunk_fraction)
+        if self.fake.should_fail():
+            raise FakeLLMError("Injected LLM failure")
+        gap = latency * (1 - self.fake.first_chunk_fraction) / max(1, len(chunks) - 1)
+        for i, chunk in enumerate(chunks):
+            if i:
+                await asyncio.sleep(gap)
+            yield FakeResponse(chunk)
+
+    def generate_content(self, prompt: str, generation_config: Any = None, stream: bool = False):
+        latency = self.fake.latency()
+        text = self.fake.output_for(prompt)
+        if stream:
+            return self._stream_sync(text, latency)
+        time.sleep(latency)
+        if self.fake.should_fail():
+            raise FakeLLMError("Injected LLM failure")
+        return FakeResponse(text)
+
+    def _stream_sync(self, text: str, latency: float) -> Iterator[FakeResponse]:
+        chunks = self.fake.chunks(text)
+        time.sleep(latency * self.fake.first_chunk_fraction)
+        if self.fake.should_fail():
+            raise FakeLLMError("Injected LLM failure")
+        gap = latency * (1 - self.fake.first_chunk_fraction) / max(1, len(chunks) - 1)
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(gap)
+            yield FakeResponse(chunk)
+
+
+def fake_llm_from_settings() -> FakeLLM:
+    return FakeLLM.from_corpus(
+        settings.LLM_FAKE_CORPUS_DIR or None,
+        pattern=settings.LLM_FAKE_CORPUS_PATTERN,
+        latency_median=settings.LLM_FAKE_LATENCY_MEDIAN_SECONDS,
+        latency_sigma=settings.LLM_FAKE_LATENCY_SIGMA,
+        failure_rate=settings.LLM_FAKE_FAILURE_RATE,
+        seed=settings.LLM_FAKE_SEED,
+    )
@@ -1,26 +1,252 @@
-import google.generativeai as genai
+"""
+Async Gemini client
+Keeps LLM round trips off the event loop with pooled model handles,
+bounded concurrency and per-call timeouts
+"""
+
+import asyncio
+import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+import google.generativeai as genai
+
+from app.core.config import settings
+from app.utils.circuit_breaker import circuit_breakers
+
+logger = logging.getLogger(__name__)
 
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
-async def generate_text(prompt: str, model: str = "models/gemini-2.5-flash"):
-    try:
-        gen_model = genai.GenerativeModel(model)
-        response = gen_model.generate_content(
-            prompt,
-            generation_config={
-                "temperature": 0,
-                "top_p": 1,
-                "top_k": 1,
-            },
+DEFAULT_MODEL = "models/gemini-2.5-flash"
+
+DEFAULT_GENERATION_CONFIG = {
+    "temperature": 0,
+    "top_p": 1,
+    "top_k": 1,
+}
+
+
+class GeminiClient:
+    """Async facade over the Gemini SDK with cached model handles"""
+
+    def __init__(self, max_concurrency: int = 8, timeout: float = 90.0,
+                 thread_pool_size: int = 8, use_native_async: bool = True):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.use_native_async = use_native_async
+        self._models: Dict[str, genai.GenerativeModel] = {}
+        # Swapped for FakeLLM.get_model in tests and load benchmarks
+        self.model_factory: Callable[..., Any] = genai.GenerativeModel
+        self._models_lock = Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=thread_pool_size, thread_name_prefix="gemini"
         )
+        # Semaphores are bound to the loop they were created on
+        self._semaphores: Dict[int, asyncio.Semaphore] = {}
+        self.breaker = circuit_breakers.get("gemini", slow_call_seconds=settings.GEMINI_SLOW_CALL_SECONDS)
+
+    def get_model(self, model: str, system_instruction: Optional[str] = None) -> genai.GenerativeModel:
+        """Return a reusable model handle, creating it on first use.
 
-        if not response or not response.text:
-            raise RuntimeError("Empty response from Gemini")
+        Handles are keyed by model and system instruction, so a template's
+        static prefix is sent identically on every call.
+        """
+        key = model if system_instruction is None else f"{model}\x00{system_instruction}"
+        handle = self._models.get(key)
+        if handle is not None:
+            return handle
+
+        with self._models_lock:
+            handle = self._models.get(key)
+            if handle is None:
+                handle = self.model_factory(model, system_instruction=system_instruction)
+                self._models[key] = handle
+                logger.debug(f"Created Gemini model handle for {model}")
+            return handle
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(id(loop))
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[id(loop)] = semaphore
+        return semaphore
+
+    async def _call(self, gen_model: genai.GenerativeModel, prompt: str,
+                    generation_config: Dict[str, Any]):
+        if self.use_native_async and hasattr(gen_model, "generate_content_async"):
+            return await gen_model.generate_content_async(
+                prompt, generation_config=generation_config
+            )
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            lambda: gen_model.generate_content(
+                prompt, generation_config=generation_config
+            ),
+        )
+
+    async def generate(self, prompt: str, model: str = DEFAULT_MODEL,
+                       generation_config: Optional[Dict[str, Any]] = None,
+                       timeout: Optional[float] = None,
+                       system_instruction: Optional[str] = None) -> str:
+        """Generate text without blocking the event loop"""
+        config = {**DEFAULT_GENERATION_CONFIG, **(generation_config or {})}
+        gen_model = self.get_model(model, system_instruction)
+
+        # Fails fast while Gemini is unhealthy instead of queueing for a timeout
+        with self.breaker.protect() as call:
+            async def _run():
+                async with self._get_semaphore():
+                    call.start()
+                    return await self._call(gen_model, prompt, config)
+
+            response = await asyncio.wait_for(_run(), timeout or self.timeout)
+
+            if not response or not response.text:
+                raise RuntimeError("Empty response from Gemini")
 
         return response.text
 
+    async def _iter_native(self, gen_model: genai.GenerativeModel, prompt: str,
+                           generation_config: Dict[str, Any]) -> AsyncIterator[str]:
+        response = await gen_model.generate_content_async(
+            prompt, generation_config=generation_config, stream=True
+        )
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    async def _iter_threaded(self, gen_model: genai.GenerativeModel, prompt: str,
+                             generation_config: Dict[str, Any]) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        stopped = Event()
+
+        def _produce():
+            try:
+                response = gen_model.generate_content(
+                    prompt, generation_config=generation_config, stream=True
+                )
+                for chunk in response:
+                    if stopped.is_set():
+                        break
+                    if chunk.text:
+                        loop.call_soon_threadsafe(queue.put_nowait, chunk.text)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        loop.run_in_executor(self._executor, _produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Lets the worker thread drop the rest of an abandoned stream
+            stopped.set()
+
+    async def stream(self, prompt: str, model: str = DEFAULT_MODEL,
+                     generation_config: Optional[Dict[str, Any]] = None,
+                     timeout: Optional[float] = None,
+                     system_instruction: Optional[str] = None) -> AsyncIterator[str]:
+        """Yield text chunks as the provider produces them"""
+        config = {**DEFAULT_GENERATION_CONFIG, **(generation_config or {})}
+        gen_model = self.get_model(model, system_instruction)
+        deadline = asyncio.get_running_loop().time() + (timeout or self.timeout)
+
+        if self.use_native_async and hasattr(gen_model, "generate_content_async"):
+            chunks = self._iter_native(gen_model, prompt, config)
+        else:
+            chunks = self._iter_threaded(gen_model, prompt, config)
+
+        # Latency for the breaker is time to first chunk
+        with self.breaker.protect() as call:
+            async with self._get_semaphore():
+                call.start()
+                try:
+                    while True:
+                        remaining = deadline - asyncio.get_running_loop().time()
+                        if remaining <= 0:
+                            raise asyncio.TimeoutError()
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), remaining)
+                        except StopAsyncIteration:
+                            break
+                        call.stop()
+                        yield chunk
+                finally:
+                    await chunks.aclose()
+
+    def use_model_factory(self, factory: Optional[Callable[..., Any]] = None) -> None:
+        """Build model handles with factory (e.g. an offline FakeLLM); None restores the SDK"""
+        with self._models_lock:
+            self.model_factory = factory or genai.GenerativeModel
+            self._models.clear()
+
+    def shutdown(self) -> None:
+        """Release the worker threads"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Global client instance
+gemini_client = GeminiClient(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    timeout=settings.LLM_TIMEOUT_SECONDS,
+    thread_pool_size=settings.LLM_THREAD_POOL_SIZE,
+    use_native_async=settings.LLM_USE_NATIVE_ASYNC,
+)
+
+if settings.LLM_FAKE_PROVIDER:
+    from app.utils.fake_llm import fake_llm_from_settings
+
+    logger.warning("LLM_FAKE_PROVIDER is set: Gemini calls replay recorded outputs")
+    gemini_client.use_model_factory(fake_llm_from_settings().get_model)
+
+
+async def generate_text(prompt: str, model: str = DEFAULT_MODEL,
+                        timeout: Optional[float] = None,
+                        system_instruction: Optional[str] = None,
+                        generation_config: Optional[Dict[str, Any]] = None):
+    try:
+        return await gemini_client.generate(
+            prompt, model=model, timeout=timeout,
+            system_instruction=system_instruction, generation_config=generation_config,
+        )
+
+    except asyncio.TimeoutError:
+        raise RuntimeError(
+            f"Gemini generation timed out after {timeout or gemini_client.timeout}s"
+        )
     except Exception as e:
         # HARD FAIL — never return fake text
         raise RuntimeError(f"Gemini generation failed: {str(e)}")
 
+
+async def stream_text(prompt: str, model: str = DEFAULT_MODEL,
+                      timeout: Optional[float] = None,
+                      system_instruction: Optional[str] = None,
+                      generation_config: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+    try:
+        async for chunk in gemini_client.stream(
+            prompt, model=model, timeout=timeout,
+            system_instruction=system_instruction, generation_config=generation_config,
+        ):
+            yield chunk
+
+    except asyncio.TimeoutError:
+        raise RuntimeError(
+            f"Gemini streaming timed out after {timeout or gemini_client.timeout}s"
+        )
+    except Exception as e:
+        raise RuntimeError(f"Gemini streaming failed: {str(e)}")
@@ -0,0 +1,403 @@
+"""
+Background generation jobs
+Runs roadmap generations on in-process asyncio workers (optionally fed
+from a Redis queue) and pushes progress over the WebSocket manager; with
+Redis, progress is fanned out over pub/sub to whichever instance holds the
+user's sockets
+"""
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from threading import Event, Thread
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import redis
+
+from app.core.websocket_manager import manager
+
+logger = logging.getLogger(__name__)
+
+REDIS_QUEUE_KEY = "roadmap:jobs:queue"
+REDIS_JOB_KEY = "roadmap:job:{job_id}"
+REDIS_CALLER_KEY = "roadmap:jobs:queued:{caller}"
+REDIS_PROGRESS_CHANNEL = "roadmap:jobs:progress"
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class JobQueueFullError(RuntimeError):
+    """Raised when too many jobs are waiting to run"""
+
+
+class CallerQueueFullError(JobQueueFullError):
+    """Raised when one caller already has too many jobs waiting"""
+
+
+@dataclass
+class GenerationJob:
+    id: str
+    request: Dict[str, Any]
+    user_id: Optional[int] = None
+    caller: Optional[str] = None  # LLM scheduler identity, e.g. "user:7" or "ip:203.0.113.7"
+    caller_weight: float = 1.0
+    status: str = "queued"  # queued, running, completed, failed
+    stage: str = "queued"
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+JobHandler = Callable[[GenerationJob, Callable[[str], Awaitable[None]]], Awaitable[Dict[str, Any]]]
+
+
+class GenerationJobQueue:
+    """Bounded job queue with asyncio workers and TTL-based cleanup"""
+
+    def __init__(self, worker_count: int = 2, job_ttl: int = 3600,
+                 max_queued: int = 500, max_queued_per_caller: int = 5,
+                 use_redis: bool = False, redis_url: Optional[str] = None,
+                 pop_timeout: int = 5):
+        self.worker_count = worker_count
+        self.job_ttl = job_ttl
+        self.max_queued = max_queued
+        self.max_queued_per_caller = max_queued_per_caller
+        self.use_redis = use_redis
+        self.redis_url = redis_url
+        self.pop_timeout = pop_timeout
+        self.handler: Optional[JobHandler] = None
+        self._jobs: Dict[str, GenerationJob] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._redis_client: Optional[redis.Redis] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[Thread] = None
+        self._stop = Event()
+
+    # Lifecycle
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._worker(i)) for i in range(self.worker_count)
+        ]
+        self._tasks.append(asyncio.create_task(self._cleanup_loop()))
+        if self.use_redis and self.redis_url:
+            self._loop = asyncio.get_running_loop()
+            self._stop.clear()
+            self._listener = Thread(target=self._listen_progress, name="generation-job-progress", daemon=True)
+            self._listener.start()
+        logger.info(f"Started {self.worker_count} generation job workers (redis queue: {self.use_redis})")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._stop.set()
+        if self._listener is not None:
+            await asyncio.to_thread(self._listener.join, 2.0)
+            self._listener = None
+
+    # Public API
+
+    async def submit(self, request: Dict[str, Any], user_id: Optional[int] = None,
+                     caller: Optional[str] = None, caller_weight: float = 1.0) -> GenerationJob:
+        if caller is not None:
+            mine = sum(1 for job in self._jobs.values() if job.status == "queued" and job.caller == caller)
+            if self.use_redis:
+                mine += await asyncio.to_thread(self._redis_caller_queued, caller)
+            if mine >= self.max_queued_per_caller:
+                raise CallerQueueFullError("Too many of your generation jobs are already queued")
+
+        queued = sum(1 for job in self._jobs.values() if job.status == "queued")
+        if self.use_redis:
+            # Other instances' jobs wait in the shared list, so count those too
+            queued += await asyncio.to_thread(self._redis_queue_length)
+        if queued >= self.max_queued:
+            raise JobQueueFullError("Too many generation jobs are queued")
+
+        job = GenerationJob(
+            id=uuid.uuid4().hex, request=request, user_id=user_id,
+            caller=caller, caller_weight=caller_weight,
+        )
+
+        # Whichever instance pops the job from Redis owns its state from then on
+        if self.use_redis and await self._redis_enqueue(job):
+            return job
+
+        if self._queue is None:
+            raise RuntimeError("Generation job workers are not running")
+        self._jobs[job.id] = job
+        await self._queue.put(job.id)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if self.use_redis:
+            data = await asyncio.to_thread(self._redis_load, job_id)
+            if data is not None:
+                return data
+        job = self._jobs.get(job_id)
+        return job.to_dict() if job is not None else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "workers": self.worker_count,
+            "jobs": counts,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "redis_queue": self.use_redis,
+        }
+
+    # Workers
+
+    async def _next_job_id(self) -> Optional[str]:
+        if not self.use_redis:
+            return await self._queue.get()
+        # Jobs only land locally when Redis refused them
+        try:
+            return self._queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+        if self._redis() is None:
+            try:
+                return await asyncio.wait_for(self._queue.get(), timeout=self.pop_timeout)
+            except asyncio.TimeoutError:
+                return None
+        return await asyncio.to_thread(self._redis_pop)
+
+    async def _worker(self, worker_id: int) -> None:
+        while True:
+            job_id = await self._next_job_id()
+            if job_id is None:
+                continue
+
+            job = self._jobs.get(job_id)
+            if job is None and self.use_redis:
+                data = await asyncio.to_thread(self._redis_load, job_id)
+                if data is not None:
+                    job = GenerationJob(**data)
+                    self._jobs[job.id] = job
+                    if job.caller is not None:
+                        await asyncio.to_thread(self._redis_caller_started, job.caller)
+            if job is None:
+                logger.warning(f"Generation job {job_id} vanished before it ran")
+                continue
+
+            await self._run(job)
+
+    async def _run(self, job: GenerationJob) -> None:
+        async def report(stage: str) -> None:
+            await self._update(job, status="running", stage=stage)
+
+        try:
+            await report("started")
+            if self.handler is None:
+                raise RuntimeError("No generation job handler registered")
+            result = await self.handler(job, report)
+            await self._update(job, status="completed", stage="completed", result=result)
+        except asyncio.CancelledError:
+            await self._update(job, status="failed", stage="failed", error="Job cancelled")
+            raise
+        except Exception as e:
+            detail = getattr(e, "detail", None) or str(e) or type(e).__name__
+            logger.error(f"Generation job {job.id} failed: {detail}")
+            await self._update(job, status="failed", stage="failed", error=str(detail))
+
+    async def _update(self, job: GenerationJob, **changes: Any) -> None:
+        for name, value in changes.items():
+            setattr(job, name, value)
+        job.updated_at = time.time()
+
+        if self.use_redis:
+            await asyncio.to_thread(self._redis_store, job)
+
+        if job.user_id is not None:
+            message = {
+                "type": "roadmap_job",
+                "job_id": job.id,
+                "status": job.status,
+                "stage": job.stage,
+            }
+            if job.status == "completed":
+                message["result"] = job.result
+            elif job.status == "failed":
+                message["error"] = job.error
+            text = json.dumps(message, default=str)
+            # Every instance, this one included, delivers published progress to its own sockets
+            if self.use_redis and self._listener is not None and await asyncio.to_thread(self._redis_publish, job.user_id, text):
+                return
+            await self._deliver(job.user_id, text)
+
+    @staticmethod
+    async def _deliver(user_id: int, text: str) -> None:
+        try:
+            await manager.broadcast_to_user(user_id, text)
+        except Exception as e:
+            logger.debug(f"Could not push job progress to user {user_id}: {e}")
+
+    async def _cleanup_loop(self) -> None:
+        interval = max(1, min(60, self.job_ttl // 4))
+        while True:
+            await asyncio.sleep(interval)
+            self.cleanup()
+
+    def cleanup(self) -> int:
+        """Drop finished jobs older than the TTL; returns how many were removed"""
+        cutoff = time.time() - self.job_ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status in TERMINAL_STATUSES and job.updated_at < cutoff
+        ]
+        for job_id in expired:
+            self._jobs.pop(job_id, None)
+        if expired:
+            logger.debug(f"Removed {len(expired)} expired generation jobs")
+        return len(expired)
+
+    # Redis-backed queue for multi-instance deployments
+
+    def _redis(self) -> Optional[redis.Redis]:
+        """One pooled client for all queue operations; None without a Redis URL"""
+        if self._redis_client is None and self.redis_url:
+            self._redis_client = redis.Redis.from_url(
+                self.redis_url,
+                socket_connect_timeout=1.0,
+                # BRPOP holds the connection for up to pop_timeout
+                socket_timeout=self.pop_timeout + 2.0,
+                health_check_interval=30,
+            )
+        return self._redis_client
+
+    async def _redis_enqueue(self, job: GenerationJob) -> bool:
+        try:
+            return await asyncio.to_thread(self._redis_push, job)
+        except Exception as e:
+            logger.warning(f"Redis job queue unavailable, running job locally: {e}")
+            return False
+
+    def _redis_push(self, job: GenerationJob) -> bool:
+        redis_client = self._redis()
+        if redis_client is None:
+            return False
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.setex(REDIS_JOB_KEY.format(job_id=job.id), self.job_ttl, json.dumps(job.to_dict(), default=str))
+        if job.caller is not None:
+            caller_key = REDIS_CALLER_KEY.format(caller=job.caller)
+            pipe.incr(caller_key)
+            pipe.expire(caller_key, self.job_ttl)
+        pipe.lpush(REDIS_QUEUE_KEY, job.id)
+        pipe.execute()
+        return True
+
+    def _redis_queue_length(self) -> int:
+        redis_client = self._redis()
+        if redis_client is None:
+            return 0
+        try:
+            return redis_client.llen(REDIS_QUEUE_KEY)
+        except Exception as e:
+            logger.warning(f"Redis job queue length unavailable: {e}")
+            return 0
+
+    def _redis_caller_queued(self, caller: str) -> int:
+        redis_client = self._redis()
+        if redis_client is None:
+            return 0
+        try:
+            return max(0, int(redis_client.get(REDIS_CALLER_KEY.format(caller=caller)) or 0))
+        except Exception as e:
+            logger.warning(f"Redis per-caller job count unavailable: {e}")
+            return 0
+
+    def _redis_caller_started(self, caller: str) -> None:
+        try:
+            self._redis().decr(REDIS_CALLER_KEY.format(caller=caller))
+        except Exception as e:
+            logger.warning(f"Could not update queued job count for {caller}: {e}")
+
+    def _redis_pop(self) -> Optional[str]:
+        try:
+            item = self._redis().brpop(REDIS_QUEUE_KEY, timeout=self.pop_timeout)
+        except Exception as e:
+            logger.warning(f"Redis job queue read failed: {e}")
+            # Don't spin while Redis is down
+            time.sleep(1.0)
+            return None
+        if item is None:
+            return None
+        job_id = item[1]
+        return job_id.decode() if isinstance(job_id, bytes) else job_id
+
+    def _redis_store(self, job: GenerationJob) -> None:
+        redis_client = self._redis()
+        if redis_client is None:
+            return
+        try:
+            redis_client.setex(REDIS_JOB_KEY.format(job_id=job.id), self.job_ttl, json.dumps(job.to_dict(), default=str))
+        except Exception as e:
+            logger.warning(f"Could not store job {job.id} state in Redis: {e}")
+
+    def _redis_load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        redis_client = self._redis()
+        if redis_client is None:
+            return None
+        try:
+            payload = redis_client.get(REDIS_JOB_KEY.format(job_id=job_id))
+        except Exception as e:
+            logger.warning(f"Could not load job {job_id} from Redis: {e}")
+            return None
+        return json.loads(payload) if payload else None
+
+    def _redis_publish(self, user_id: int, text: str) -> bool:
+        try:
+            self._redis().publish(REDIS_PROGRESS_CHANNEL, json.dumps({"user_id": user_id, "message": text}))
+            return True
+        except Exception as e:
+            logger.warning(f"Could not publish job progress, delivering locally: {e}")
+            return False
+
+    def _listen_progress(self) -> None:
+        """Deliver progress published by any instance to sockets connected here"""
+        backoff = 1.0
+        while not self._stop.is_set():
+            pubsub = None
+            try:
+                # Blocking reads need their own connection without a read timeout
+                client = redis.Redis.from_url(self.redis_url, socket_connect_timeout=1.0, health_check_interval=30)
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(REDIS_PROGRESS_CHANNEL)
+                backoff = 1.0
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    try:
+                        event = json.loads(message["data"])
+                        if event["user_id"] in manager.active_connections:
+                            asyncio.run_coroutine_threadsafe(
+                                self._deliver(event["user_id"], event["message"]), self._loop
+                            )
+                    except Exception as e:
+                        logger.warning(f"Ignoring malformed job progress message: {e}")
+            except Exception as e:
+                logger.debug(f"Job progress subscriber disconnected: {e}")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
@@ -0,0 +1,214 @@
+"""
+LLM output parsing
+Single-pass JSON extraction, tolerant repair and schema-guided
+validation for model responses
+"""
+
+import json
+import logging
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    import json_repair
+except ImportError:  # pragma: no cover - optional dependency
+    json_repair = None
+
+logger = logging.getLogger(__name__)
+
+# Characters that can change scanner state; everything else is skipped in C
+_STRUCTURAL_RE = re.compile(r'["\\{}\[\]]')
+
+_decoder = json.JSONDecoder()
+
+
+class LLMOutputError(ValueError):
+    """Raised when a model response cannot be turned into the expected structure"""
+
+
+class ExtractedJSON(NamedTuple):
+    text: str
+    complete: bool  # False when the output ended before the object closed
+    start: int
+
+
+def _json_start(text: str) -> int:
+    """Index of the opening brace, preferring one that opens a markdown fence"""
+    fence = text.find("```")
+    while fence != -1:
+        line_end = text.find("\n", fence)
+        if line_end == -1:
+            break
+        body = line_end + 1
+        while body < len(text) and text[body] in " \t\r\n":
+            body += 1
+        if body < len(text) and text[body] == "{":
+            return body
+        fence = text.find("```", line_end)
+    return text.find("{")
+
+
+def extract_json_object(text: str) -> Optional[ExtractedJSON]:
+    """Return the first brace-balanced JSON object in text.
+
+    Scans once, tracking string and escape state so braces inside values
+    are ignored. Content inside a markdown fence is preferred over prose
+    before it.
+    """
+    start = _json_start(text)
+    if start == -1:
+        return None
+
+    depth = 0
+    in_string = False
+    escape_at = -1
+
+    for match in _STRUCTURAL_RE.finditer(text, start):
+        ch = match.group()
+        i = match.start()
+        if in_string:
+            if ch == "\\":
+                if escape_at != i:
+                    escape_at = i + 1  # Next character is escaped
+            elif ch == '"' and escape_at != i:
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{" or ch == "[":
+            depth += 1
+        elif ch == "}" or ch == "]":
+            depth -= 1
+            if depth == 0:
+                return ExtractedJSON(text[start:i + 1], True, start)
+
+    return ExtractedJSON(text[start:], False, start)
+
+
+def repair_json(text: str) -> Any:
+    """Best-effort repair of malformed JSON (trailing commas, truncation, quotes)"""
+    if json_repair is None:
+        raise LLMOutputError("json_repair is not installed; cannot repair model output")
+    try:
+        return json_repair.loads(text)
+    except Exception as e:
+        raise LLMOutputError(f"Could not repair model output: {e}")
+
+
+def parse_llm_json(text: str) -> Tuple[Any, str]:
+    """Parse a model response into JSON.
+
+    Returns (data, method) where method is 'direct', 'extracted' or 'repaired'.
+    """
+    if not text or not text.strip():
+        raise LLMOutputError("Model response was empty")
+
+    stripped = text.strip()
+    if stripped[0] == "{":
+        try:
+            return json.loads(stripped), "direct"
+        except json.JSONDecodeError:
+            pass
+
+    start = _json_start(text)
+    if start == -1:
+        raise LLMOutputError("Model response did not contain a JSON object")
+
+    # Decoding from the first brace ignores fences and prose after the object
+    try:
+        return _decoder.raw_decode(text, start)[0], "extracted"
+    except json.JSONDecodeError:
+        pass
+
+    extracted = extract_json_object(text)
+
+    if extracted.complete:
+        try:
+            return json.loads(extracted.text), "extracted"
+        except json.JSONDecodeError as e:
+            logger.debug(f"Extracted JSON invalid, attempting repair: {e}")
+
+    data = repair_json(extracted.text)
+    if not isinstance(data, dict) or not data:
+        raise LLMOutputError("Model response could not be repaired into a JSON object")
+    return data, "repaired"
+
+
+def _as_title(value: Any, fallback: str) -> str:
+    if isinstance(value, str) and value.strip():
+        return value
+    return fallback
+
+
+def _normalize_subtopics(raw: Any) -> List[Dict[str, Any]]:
+    subtopics = []
+    for item in raw if isinstance(raw, list) else []:
+        if isinstance(item, str):
+            item = {"title": item}
+        if isinstance(item, dict) and _as_title(item.get("title"), ""):
+            subtopics.append(item)
+    return subtopics
+
+
+def _normalize_topics(raw: Any) -> List[Dict[str, Any]]:
+    topics = []
+    for t_idx, item in enumerate(raw if isinstance(raw, list) else []):
+        if isinstance(item, str):
+            item = {"title": item}
+        if not isinstance(item, dict):
+            continue
+        item["title"] = _as_title(item.get("title"), f"Topic {t_idx + 1}")
+        item["subtopics"] = _normalize_subtopics(item.get("subtopics"))
+        topics.append(item)
+    return topics
+
+
+def normalize_roadmap_module(module: Dict[str, Any], m_idx: int) -> Dict[str, Any]:
+    """Coerce one module in place: titles, timeline, and topic/subtopic dicts"""
+    module["title"] = _as_title(module.get("title"), f"Module {m_idx + 1}")
+    if not isinstance(module.get("timeline"), str):
+        module["timeline"] = ""
+    module["topics"] = _normalize_topics(module.get("topics"))
+    return module
+
+
+def validate_roadmap_data(data: Any) -> Dict[str, Any]:
+    """Coerce parsed output into the roadmap schema or raise LLMOutputError.
+
+    Tolerates the shapes models commonly drift into: modules at the top
+    level, bare string subtopics, missing titles or topic lists.
+    """
+    if not isinstance(data, dict):
+        raise LLMOutputError("Roadmap output is not a JSON object")
+
+    plan = data.get("roadmap_plan")
+    if not isinstance(plan, dict):
+        if isinstance(data.get("modules"), list):
+            plan = {"modules": data.pop("modules")}
+        else:
+            raise LLMOutputError("Invalid roadmap structure from AI. 'roadmap_plan' or 'modules' is missing.")
+        data["roadmap_plan"] = plan
+
+    raw_modules = plan.get("modules")
+    if not isinstance(raw_modules, list):
+        raise LLMOutputError("Invalid roadmap structure from AI. 'roadmap_plan' or 'modules' is missing.")
+
+    modules = []
+    for m_idx, module in enumerate(raw_modules):
+        if not isinstance(module, dict):
+            continue
+        modules.append(normalize_roadmap_module(module, m_idx))
+
+    if not modules:
+        raise LLMOutputError("Roadmap output contained no modules")
+
+    plan["modules"] = modules
+    for field in ("title", "description"):
+        if field in data and not isinstance(data[field], str):
+            data.pop(field)
+    return data
+
+
+def parse_roadmap_output(text: str) -> Tuple[Dict[str, Any], str]:
+    """Extract, repair if needed and validate a roadmap response"""
+    data, method = parse_llm_json(text)
+    return validate_roadmap_data(data), method
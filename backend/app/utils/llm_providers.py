@@ -0,0 +1,342 @@
+"""
+LLM providers and hedged requests
+A common interface over Gemini and OpenAI-compatible APIs; when the primary
+is slower than its observed p95, a secondary is raced against it
+"""
+
+import asyncio
+import bisect
+import logging
+import math
+import time
+from collections import deque
+from threading import Lock
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence
+
+from app.core.config import settings
+from app.utils.circuit_breaker import CircuitOpenError
+from app.utils.gemini_client import DEFAULT_MODEL, GeminiClient, gemini_client
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 12, 16, 24, 32, 48, 64, 96, 128)
+
+
+class LLMProvider:
+    """One upstream model API.
+
+    generation_config follows Gemini: max_output_tokens includes
+    thinking_tokens, which only models that think before answering spend.
+    """
+
+    name = "provider"
+    thinks = False
+
+    def __init__(self, model: str, max_output_tokens: Optional[int] = None):
+        self.model = model
+        self.max_output_tokens = max_output_tokens
+
+    def output_limit(self, generation_config: Optional[Dict[str, Any]], thinking_tokens: int = 0) -> Optional[int]:
+        """max_output_tokens for this provider: without the thinking reserve it won't use, within its cap"""
+        requested = (generation_config or {}).get("max_output_tokens")
+        if requested and not self.thinks:
+            requested = max(1, requested - thinking_tokens)
+        if self.max_output_tokens is None:
+            return requested
+        return min(requested, self.max_output_tokens) if requested else self.max_output_tokens
+
+    async def generate(self, prompt: str, *, model: Optional[str] = None,
+                       system_instruction: Optional[str] = None,
+                       generation_config: Optional[Dict[str, Any]] = None,
+                       timeout: Optional[float] = None, thinking_tokens: int = 0) -> str:
+        raise NotImplementedError
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+    thinks = True
+
+    def __init__(self, client: GeminiClient = gemini_client, model: str = DEFAULT_MODEL):
+        super().__init__(model)
+        self.client = client
+
+    async def generate(self, prompt: str, *, model: Optional[str] = None,
+                       system_instruction: Optional[str] = None,
+                       generation_config: Optional[Dict[str, Any]] = None,
+                       timeout: Optional[float] = None, thinking_tokens: int = 0) -> str:
+        return await self.client.generate(
+            prompt,
+            model=model or self.model,
+            generation_config=generation_config,
+            timeout=timeout,
+            system_instruction=system_instruction,
+        )
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Chat-completions providers (OpenAI, DeepSeek)"""
+
+    def __init__(self, name: str, api_key: str, model: str, base_url: Optional[str] = None,
+                 timeout: float = 90.0, max_output_tokens: Optional[int] = None):
+        super().__init__(model, max_output_tokens)
+        self.name = name
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            from openai import AsyncOpenAI
+
+            self._client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, timeout=self.timeout)
+        return self._client
+
+    async def generate(self, prompt: str, *, model: Optional[str] = None,
+                       system_instruction: Optional[str] = None,
+                       generation_config: Optional[Dict[str, Any]] = None,
+                       timeout: Optional[float] = None, thinking_tokens: int = 0) -> str:
+        # Model names are provider specific, so a Gemini override does not apply here
+        messages = []
+        if system_instruction:
+            messages.append({"role": "system", "content": system_instruction})
+        messages.append({"role": "user", "content": prompt})
+
+        kwargs: Dict[str, Any] = {"model": self.model, "messages": messages, "temperature": 0}
+        max_tokens = self.output_limit(generation_config, thinking_tokens)
+        if max_tokens:
+            kwargs["max_tokens"] = max_tokens
+
+        response = await asyncio.wait_for(
+            self._get_client().chat.completions.create(**kwargs), timeout or self.timeout
+        )
+        text = response.choices[0].message.content if response.choices else None
+        if not text:
+            raise RuntimeError(f"Empty response from {self.name}")
+        return text
+
+
+class LatencyHistogram:
+    """Cumulative bucket counts plus a rolling window for percentiles"""
+
+    def __init__(self, window: int = 200, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.errors = 0
+        self._recent: Deque[float] = deque(maxlen=window)
+        self._lock = Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self._recent.append(seconds)
+
+    def observe_error(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    @property
+    def samples(self) -> int:
+        return len(self._recent)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._recent:
+                return None
+            ordered = sorted(self._recent)
+        # Nearest-rank percentile
+        rank = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+        return ordered[rank]
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50, p95, p99 = (self.percentile(q) for q in (50, 95, 99))
+        with self._lock:
+            buckets = {f"le_{bound}": count for bound, count in zip(self.buckets, self.counts)}
+            buckets["le_inf"] = self.counts[-1]
+            return {
+                "count": sum(self.counts),
+                "errors": self.errors,
+                "p50": p50,
+                "p95": p95,
+                "p99": p99,
+                "buckets": buckets,
+            }
+
+
+class HedgedLLM:
+    """Send to the primary; race a secondary once the primary exceeds its p95.
+
+    The first valid response wins and the other call is cancelled. A primary
+    that fails outright fails over to the secondaries immediately.
+    """
+
+    def __init__(self, primary: LLMProvider, secondaries: Sequence[LLMProvider] = (),
+                 percentile: float = 95.0, min_samples: int = 20,
+                 default_delay: float = 30.0, enabled: bool = True):
+        self.primary = primary
+        self.secondaries = list(secondaries)
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.enabled = enabled
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._stats_lock = Lock()
+        self._stats = {"requests": 0, "hedged": 0, "hedge_wins": 0, "failovers": 0}
+
+    def _count(self, counter: str) -> None:
+        with self._stats_lock:
+            self._stats[counter] += 1
+
+    def histogram(self, label: str) -> LatencyHistogram:
+        histogram = self._histograms.get(label)
+        if histogram is None:
+            histogram = self._histograms.setdefault(label, LatencyHistogram())
+        return histogram
+
+    def hedge_delay(self, label: str) -> float:
+        histogram = self.histogram(label)
+        if histogram.samples < self.min_samples:
+            return self.default_delay
+        return histogram.percentile(self.percentile)
+
+    async def _timed(self, provider: LLMProvider, label: str, validate: Callable[[str], bool],
+                     prompt: str, **kwargs: Any) -> str:
+        start = time.perf_counter()
+        try:
+            text = await provider.generate(prompt, **kwargs)
+            if not validate(text):
+                raise RuntimeError(f"{provider.name} returned an invalid response")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.histogram(label).observe_error()
+            raise
+        self.histogram(label).observe(time.perf_counter() - start)
+        return text
+
+    async def generate(self, prompt: str, *, model: Optional[str] = None,
+                       system_instruction: Optional[str] = None,
+                       generation_config: Optional[Dict[str, Any]] = None,
+                       timeout: Optional[float] = None, thinking_tokens: int = 0,
+                       validate: Optional[Callable[[str], bool]] = None) -> str:
+        self._count("requests")
+        validate = validate or (lambda text: bool(text and text.strip()))
+        kwargs = {
+            "system_instruction": system_instruction,
+            "generation_config": generation_config,
+            "timeout": timeout,
+            "thinking_tokens": thinking_tokens,
+        }
+        primary_label = f"{self.primary.name}/{model or self.primary.model}"
+        primary = asyncio.ensure_future(
+            self._timed(self.primary, primary_label, validate, prompt, model=model, **kwargs)
+        )
+        if not self.enabled or not self.secondaries:
+            return await primary
+
+        pending = {primary}
+        errors: List[BaseException] = []
+        backups = iter(self.secondaries)
+        try:
+            done, _ = await asyncio.wait(pending, timeout=self.hedge_delay(primary_label))
+            if primary in done:
+                if primary.exception() is None:
+                    return primary.result()
+                errors.append(primary.exception())
+                pending.discard(primary)
+                self._count("failovers")
+                logger.warning(f"Primary LLM provider failed, failing over: {primary.exception()}")
+            else:
+                self._count("hedged")
+                logger.info(f"Primary LLM provider exceeded p{self.percentile:g}, sending hedge request")
+
+            while True:
+                if not pending:
+                    backup = next(backups, None)
+                    if backup is None:
+                        raise errors[-1]
+                    pending.add(asyncio.ensure_future(
+                        self._timed(backup, f"{backup.name}/{backup.model}", validate, prompt, **kwargs)
+                    ))
+                elif len(pending) == 1 and primary in pending:
+                    backup = next(backups, None)
+                    if backup is not None:
+                        pending.add(asyncio.ensure_future(
+                            self._timed(backup, f"{backup.name}/{backup.model}", validate, prompt, **kwargs)
+                        ))
+
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self._count("hedge_wins")
+                        return task.result()
+                    errors.append(task.exception())
+        finally:
+            for task in (primary, *pending):
+                if not task.done():
+                    task.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["hedge_rate"] = round(stats["hedged"] / stats["requests"], 4) if stats["requests"] else 0.0
+        stats["providers"] = [self.primary.name] + [p.name for p in self.secondaries]
+        stats["latency"] = {label: h.snapshot() for label, h in self._histograms.items()}
+        return stats
+
+
+def build_secondary_providers() -> List[LLMProvider]:
+    """Secondaries in LLM_HEDGE_PROVIDERS order, skipping any without credentials"""
+    available = {}
+    if settings.DEEPSEEK_KEY:
+        available["deepseek"] = lambda: OpenAICompatibleProvider(
+            "deepseek", settings.DEEPSEEK_KEY, settings.DEEPSEEK_MODEL,
+            base_url="https://api.deepseek.com", timeout=settings.LLM_TIMEOUT_SECONDS,
+            max_output_tokens=settings.DEEPSEEK_MAX_OUTPUT_TOKENS,
+        )
+    if settings.OPENAI_API_KEY:
+        available["openai"] = lambda: OpenAICompatibleProvider(
+            "openai", settings.OPENAI_API_KEY, settings.OPENAI_HEDGE_MODEL,
+            timeout=settings.LLM_TIMEOUT_SECONDS,
+            max_output_tokens=settings.OPENAI_HEDGE_MAX_OUTPUT_TOKENS,
+        )
+
+    providers = []
+    for name in settings.LLM_HEDGE_PROVIDERS.split(","):
+        factory = available.get(name.strip().lower())
+        if factory is not None:
+            providers.append(factory())
+    return providers
+
+
+# Global hedged LLM entry point
+hedged_llm = HedgedLLM(
+    GeminiProvider(),
+    build_secondary_providers(),
+    percentile=settings.LLM_HEDGE_PERCENTILE,
+    min_samples=settings.LLM_HEDGE_MIN_SAMPLES,
+    default_delay=settings.LLM_HEDGE_DEFAULT_DELAY_SECONDS,
+    enabled=settings.LLM_HEDGING_ENABLED,
+)
+
+
+async def generate_llm_text(prompt: str, model: Optional[str] = None,
+                            timeout: Optional[float] = None,
+                            system_instruction: Optional[str] = None,
+                            generation_config: Optional[Dict[str, Any]] = None,
+                            thinking_tokens: int = 0) -> str:
+    try:
+        return await hedged_llm.generate(
+            prompt, model=model, timeout=timeout,
+            system_instruction=system_instruction, generation_config=generation_config,
+            thinking_tokens=thinking_tokens,
+        )
+    except CircuitOpenError:
+        # Callers turn this into a fast 503 rather than a generic failure
+        raise
+    except asyncio.TimeoutError:
+        raise RuntimeError(f"LLM generation timed out after {timeout or settings.LLM_TIMEOUT_SECONDS}s")
+    except Exception as e:
+        raise RuntimeError(f"LLM generation failed: {str(e)}")
@@ -0,0 +1,267 @@
+"""
+LLM call scheduling
+Per-caller and global token buckets, sized in estimated tokens, with weighted
+fair queueing across callers; requests that would wait past the deadline are
+rejected up front with a retry hint
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.database.cache import QueryCache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class LLMCaller:
+    key: str
+    weight: float = 1.0
+
+
+ANONYMOUS_CALLER = LLMCaller("anonymous")
+
+# Who the current LLM call is for; set by endpoints and job workers
+current_llm_caller: ContextVar[Optional[LLMCaller]] = ContextVar("current_llm_caller", default=None)
+
+
+class RateLimitExceeded(Exception):
+    """Raised instead of queueing when the wait would exceed the deadline"""
+
+    def __init__(self, scope: str, retry_after: float):
+        self.scope = scope
+        self.retry_after = retry_after
+        super().__init__(f"LLM {scope} rate limit exceeded, retry after {retry_after:.1f}s")
+
+
+class TokenBucket:
+    """Classic token bucket; reservations may drive the balance negative"""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount tokens are available"""
+        self._refill()
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def reserve(self, amount: float) -> float:
+        """Take amount now and return how long the caller must wait before using it"""
+        wait = self.wait_time(amount)
+        self.tokens -= amount
+        return wait
+
+    def refund(self, amount: float) -> None:
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+@dataclass(order=True)
+class _Waiter:
+    finish: float
+    seq: int
+    start: float = field(compare=False)
+    caller: str = field(compare=False)
+    cost: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+@dataclass
+class LLMTicket:
+    caller: str
+    cost: float
+    waited: float = 0.0
+
+
+class LLMScheduler:
+    """Admission control for LLM calls.
+
+    A call first reserves its estimated tokens from the caller's bucket,
+    then waits its turn for the global bucket. Global turns go to the
+    smallest virtual finish time (start + cost / weight), so a caller
+    submitting many calls cannot crowd out one submitting a few.
+    """
+
+    def __init__(self, global_tokens_per_minute: float, caller_tokens_per_minute: float,
+                 global_burst: Optional[float] = None, caller_burst: Optional[float] = None,
+                 queue_deadline: float = 10.0, max_callers: int = 10000, enabled: bool = True):
+        self.global_rate = global_tokens_per_minute / 60
+        self.caller_rate = caller_tokens_per_minute / 60
+        self.global_capacity = global_burst or global_tokens_per_minute
+        self.caller_capacity = caller_burst or caller_tokens_per_minute
+        self.queue_deadline = queue_deadline
+        self.enabled = enabled
+        self._global = TokenBucket(self.global_rate, self.global_capacity)
+        # An idle bucket refills completely, so forgetting it after that is lossless
+        refill_seconds = math.ceil(self.caller_capacity / self.caller_rate)
+        self._callers = QueryCache(max_size=max_callers, default_ttl=refill_seconds)
+        self._queue: List[_Waiter] = []
+        self._queued_tokens = 0.0
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._stats_lock = Lock()
+        self._stats = {
+            "admitted": 0,
+            "queued": 0,
+            "rejected_caller": 0,
+            "rejected_global": 0,
+            "wait_seconds": 0.0,
+        }
+
+    def _count(self, counter: str, amount: float = 1) -> None:
+        with self._stats_lock:
+            self._stats[counter] += amount
+
+    def _caller_bucket(self, caller: str) -> TokenBucket:
+        key = f"llm_bucket:{caller}"
+        bucket = self._callers.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.caller_rate, self.caller_capacity)
+        self._callers.set(key, bucket)
+        return bucket
+
+    def _global_wait(self, cost: float) -> float:
+        """Estimated wait behind everything already queued for the global bucket"""
+        return self._global.wait_time(self._queued_tokens + cost)
+
+    async def acquire(self, tokens: float, caller: Optional[LLMCaller] = None) -> LLMTicket:
+        caller = caller or current_llm_caller.get() or ANONYMOUS_CALLER
+        # A single call larger than a bucket would otherwise never be admitted
+        cost = float(min(tokens, self.caller_capacity, self.global_capacity))
+        if not self.enabled:
+            return LLMTicket(caller.key, 0.0)
+
+        bucket = self._caller_bucket(caller.key)
+        caller_wait = bucket.wait_time(cost)
+        if caller_wait > self.queue_deadline:
+            self._count("rejected_caller")
+            raise RateLimitExceeded("caller", caller_wait - self.queue_deadline)
+        global_wait = self._global_wait(cost)
+        if global_wait > self.queue_deadline:
+            self._count("rejected_global")
+            raise RateLimitExceeded("global", global_wait - self.queue_deadline)
+
+        started = time.monotonic()
+        bucket.reserve(cost)
+        try:
+            if caller_wait:
+                await asyncio.sleep(caller_wait)
+            await self._take_global(caller, cost)
+        except BaseException:
+            bucket.refund(cost)
+            raise
+
+        waited = time.monotonic() - started
+        self._count("admitted")
+        self._count("wait_seconds", waited)
+        return LLMTicket(caller.key, cost, waited)
+
+    async def _take_global(self, caller: LLMCaller, cost: float) -> None:
+        if not self._queue and self._global.wait_time(cost) == 0:
+            self._global.reserve(cost)
+            return
+
+        start = max(self._virtual_time, self._last_finish.get(caller.key, 0.0))
+        finish = start + cost / max(caller.weight, 1e-6)
+        self._last_finish[caller.key] = finish
+        waiter = _Waiter(finish, next(self._seq), start, caller.key, cost,
+                         asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queue, waiter)
+        self._queued_tokens += cost
+        self._count("queued")
+        self._dispatch()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as we were cancelled
+                self._global.refund(cost)
+            if self._queue:
+                self._dispatch()
+            raise
+
+    def _dispatch(self) -> None:
+        """Grant global tokens to queued calls in virtual finish order"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._queue:
+            waiter = self._queue[0]
+            if waiter.future.done():
+                heapq.heappop(self._queue)
+                self._queued_tokens -= waiter.cost
+                continue
+            wait = self._global.wait_time(waiter.cost)
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._queue)
+            self._queued_tokens -= waiter.cost
+            self._global.reserve(waiter.cost)
+            self._virtual_time = waiter.start
+            waiter.future.set_result(None)
+
+        # Idle: finish times only matter relative to each other
+        self._queued_tokens = 0.0
+        self._virtual_time = 0.0
+        self._last_finish.clear()
+
+    def release(self, ticket: LLMTicket, used_tokens: float) -> None:
+        """Return the unused part of a reservation once the real size is known"""
+        unused = ticket.cost - used_tokens
+        if unused <= 0:
+            return
+        self._caller_bucket(ticket.caller).refund(unused)
+        self._global.refund(unused)
+        if self._queue:
+            self._dispatch()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["avg_wait_seconds"] = round(stats.pop("wait_seconds") / stats["admitted"], 4) if stats["admitted"] else 0.0
+        stats.update({
+            "enabled": self.enabled,
+            "waiting": len(self._queue),
+            "queued_tokens": int(self._queued_tokens),
+            "global_tokens_available": int(self._global.available()),
+            "global_tokens_per_minute": int(self.global_rate * 60),
+            "caller_tokens_per_minute": int(self.caller_rate * 60),
+            "queue_deadline_seconds": self.queue_deadline,
+        })
+        return stats
+
+
+# Global LLM scheduler
+llm_scheduler = LLMScheduler(
+    global_tokens_per_minute=settings.LLM_GLOBAL_TOKENS_PER_MINUTE,
+    caller_tokens_per_minute=settings.LLM_USER_TOKENS_PER_MINUTE,
+    queue_deadline=settings.LLM_QUEUE_DEADLINE_SECONDS,
+    enabled=settings.LLM_RATE_LIMIT_ENABLED,
+)
@@ -0,0 +1,230 @@
+"""
+Model routing
+Picks a model per use case from rolling latency, error rate and output size,
+within a cost ceiling, and degrades to a lighter model under load
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _model_name(model: Optional[str]) -> Optional[str]:
+    if model and model.startswith("models/"):
+        return model[len("models/"):]
+    return model
+
+
+@dataclass
+class RouteDecision:
+    use_case: str
+    model: str
+    reason: str  # default, fastest, requested, degraded, explore, fallback
+    requested: Optional[str] = None
+
+
+class ModelStats:
+    """Rolling window of call outcomes for one model"""
+
+    def __init__(self, window: int = 100):
+        self._calls: Deque[Tuple[float, bool, int]] = deque(maxlen=window)
+        self._lock = Lock()
+
+    def record(self, latency: float, ok: bool, output_chars: int = 0) -> None:
+        with self._lock:
+            self._calls.append((latency, ok, output_chars))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = list(self._calls)
+        ok_calls = [c for c in calls if c[1]]
+        latencies = sorted(c[0] for c in ok_calls)
+        return {
+            "samples": len(calls),
+            "error_rate": round(1 - len(ok_calls) / len(calls), 4) if calls else 0.0,
+            "p50_latency": latencies[len(latencies) // 2] if latencies else None,
+            "avg_output_chars": int(sum(c[2] for c in ok_calls) / len(ok_calls)) if ok_calls else None,
+        }
+
+
+@dataclass
+class CallTracker:
+    decision: RouteDecision
+    started: float = field(default_factory=time.perf_counter)
+    output_chars: int = 0
+
+
+class ModelRouter:
+    """Routes use cases to the fastest healthy model under their cost ceiling"""
+
+    def __init__(self, defaults: Dict[str, str], candidates: Dict[str, List[str]],
+                 costs: Dict[str, float], cost_ceilings: Dict[str, float],
+                 lite_model: Optional[str] = None, degrade_in_flight: int = 16,
+                 max_error_rate: float = 0.2, min_samples: int = 10,
+                 explore_rate: float = 0.05):
+        self.defaults = {k: _model_name(v) for k, v in defaults.items()}
+        self.candidates = {k: [_model_name(m) for m in v] for k, v in candidates.items()}
+        self.costs = {_model_name(k): v for k, v in costs.items()}
+        self.cost_ceilings = cost_ceilings
+        self.lite_model = _model_name(lite_model)
+        self.degrade_in_flight = degrade_in_flight
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.explore_rate = explore_rate
+        self._stats: Dict[str, ModelStats] = {}
+        self._in_flight: Counter = Counter()
+        self._decisions: Counter = Counter()
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=50)
+        self._lock = Lock()
+
+    def stats_for(self, model: str) -> ModelStats:
+        with self._lock:
+            stats = self._stats.get(model)
+            if stats is None:
+                stats = self._stats[model] = ModelStats()
+            return stats
+
+    def _within_ceiling(self, use_case: str, model: str) -> bool:
+        ceiling = self.cost_ceilings.get(use_case)
+        if ceiling is None:
+            return True
+        cost = self.costs.get(model)
+        return cost is not None and cost <= ceiling
+
+    def _healthy(self, model: str) -> bool:
+        snapshot = self.stats_for(model).snapshot()
+        return snapshot["samples"] < self.min_samples or snapshot["error_rate"] <= self.max_error_rate
+
+    def _eligible(self, use_case: str) -> List[str]:
+        default = self.defaults.get(use_case)
+        models = list(self.candidates.get(use_case, []))
+        if default and default not in models:
+            models.insert(0, default)
+        return [m for m in models if self._within_ceiling(use_case, m)]
+
+    def offers(self, use_case: str, model: str) -> bool:
+        """Whether a requested model can ever be routed to for this use case"""
+        return _model_name(model) in self._eligible(use_case)
+
+    def route(self, use_case: str, requested: Optional[str] = None) -> RouteDecision:
+        requested = _model_name(requested)
+        default = self.defaults.get(use_case) or requested
+        eligible = self._eligible(use_case)
+        if requested and requested not in eligible:
+            logger.warning(f"Requested model {requested} is not a {use_case} candidate {eligible}; routing elsewhere")
+        healthy = [m for m in eligible if self._healthy(m)]
+
+        with self._lock:
+            in_flight = sum(self._in_flight.values())
+
+        if requested and requested in healthy:
+            decision = RouteDecision(use_case, requested, "requested", requested)
+        elif (self.lite_model and in_flight >= self.degrade_in_flight
+              and self._within_ceiling(use_case, self.lite_model) and self._healthy(self.lite_model)):
+            decision = RouteDecision(use_case, self.lite_model, "degraded", requested)
+        elif not healthy:
+            decision = RouteDecision(use_case, default, "fallback", requested)
+        elif len(healthy) > 1 and random.random() < self.explore_rate:
+            decision = RouteDecision(use_case, random.choice(healthy), "explore", requested)
+        else:
+            decision = RouteDecision(use_case, *self._fastest(healthy, default), requested)
+
+        self._log(decision, in_flight)
+        return decision
+
+    def _fastest(self, models: List[str], default: Optional[str]) -> Tuple[str, str]:
+        measured = []
+        for model in models:
+            snapshot = self.stats_for(model).snapshot()
+            if snapshot["samples"] >= self.min_samples and snapshot["p50_latency"] is not None:
+                measured.append((snapshot["p50_latency"], model))
+        if not measured:
+            return (default if default in models else models[0]), "default"
+        return min(measured)[1], "fastest"
+
+    def _log(self, decision: RouteDecision, in_flight: int) -> None:
+        with self._lock:
+            self._decisions[(decision.use_case, decision.model, decision.reason)] += 1
+            self._recent.append({
+                "use_case": decision.use_case,
+                "model": decision.model,
+                "reason": decision.reason,
+                "requested": decision.requested,
+                "in_flight": in_flight,
+                "at": time.time(),
+            })
+        if decision.reason != "default":
+            logger.info(
+                f"Routed {decision.use_case} to {decision.model} ({decision.reason}, "
+                f"requested={decision.requested}, in_flight={in_flight})"
+            )
+
+    @contextmanager
+    def track(self, decision: RouteDecision) -> Iterator[CallTracker]:
+        """Count the call as in flight and record its outcome for the model"""
+        tracker = CallTracker(decision)
+        with self._lock:
+            self._in_flight[decision.model] += 1
+        ok = False
+        abandoned = False
+        try:
+            yield tracker
+            ok = True
+        except (asyncio.CancelledError, GeneratorExit):
+            # The caller went away; says nothing about the model
+            abandoned = True
+            raise
+        finally:
+            with self._lock:
+                self._in_flight[decision.model] -= 1
+            if not abandoned:
+                self.stats_for(decision.model).record(
+                    time.perf_counter() - tracker.started, ok, tracker.output_chars
+                )
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = list(self._stats)
+            decisions = [
+                {"use_case": u, "model": m, "reason": r, "count": n}
+                for (u, m, r), n in self._decisions.items()
+            ]
+            recent = list(self._recent)
+            in_flight = {m: n for m, n in self._in_flight.items() if n}
+        return {
+            "models": {m: {**self.stats_for(m).snapshot(), "cost": self.costs.get(m)} for m in models},
+            "in_flight": in_flight,
+            "decisions": decisions,
+            "recent": recent,
+            "cost_ceilings": self.cost_ceilings,
+        }
+
+
+# Global model router
+model_router = ModelRouter(
+    defaults={
+        "roadmap": settings.DEFAULT_ROADMAP_MODEL,
+        "feedback": settings.DEFAULT_FEEDBACK_MODEL,
+        "learning_content": settings.DEFAULT_LEARNING_CONTENT_MODEL,
+        "visualization": settings.DEFAULT_VISUALIZATION_MODEL,
+        "learning_resources": settings.DEFAULT_LEARNING_RESOURCES_MODEL,
+    },
+    candidates=settings.LLM_ROUTE_CANDIDATES,
+    costs=settings.LLM_MODEL_COSTS,
+    cost_ceilings=settings.LLM_COST_CEILINGS,
+    lite_model=settings.LLM_LITE_MODEL,
+    degrade_in_flight=settings.LLM_DEGRADE_IN_FLIGHT,
+    max_error_rate=settings.LLM_ROUTE_MAX_ERROR_RATE,
+    min_samples=settings.LLM_ROUTE_MIN_SAMPLES,
+    explore_rate=settings.LLM_ROUTE_EXPLORE_RATE,
+)
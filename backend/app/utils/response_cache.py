@@ -0,0 +1,149 @@
+"""
+Pre-serialized response cache
+Holds final JSON bytes with gzip/brotli variants and an ETag, so hot reads
+skip model validation and encoding entirely. Invalidations are shared with
+other instances over the query cache's pub/sub channel
+"""
+
+import gzip
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Any, Optional, Set, Tuple
+
+import orjson
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.core.config import settings
+from app.database.cache import QueryCache, TieredCache, query_cache
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class EncodedPayload:
+    body: bytes
+    etag: str
+    gzip: Optional[bytes] = None
+    br: Optional[bytes] = None
+
+
+def encode_payload(data: Any, compress_min_bytes: int = 1024) -> EncodedPayload:
+    """Serialize once and precompute the compressed variants"""
+    body = orjson.dumps(data, default=str)
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    if len(body) < compress_min_bytes:
+        return EncodedPayload(body=body, etag=etag)
+    return EncodedPayload(
+        body=body,
+        etag=etag,
+        gzip=gzip.compress(body, compresslevel=6),
+        br=brotli.compress(body, quality=5) if brotli is not None else None,
+    )
+
+
+def _accepted_encodings(header: str) -> Set[str]:
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding)
+    return accepted
+
+
+def representation_etag(etag: str, encoding: Optional[str]) -> str:
+    """Each content coding is a distinct representation and needs its own ETag"""
+    return etag if encoding is None else f'{etag[:-1]}-{encoding}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # Any coding of the same body is still current, so all variants revalidate
+    variants = {representation_etag(etag, encoding) for encoding in (None, "gzip", "br")}
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") in variants:
+            return True
+    return False
+
+
+def encoded_response(payload: EncodedPayload, request: Request,
+                     media_type: str = "application/json") -> Response:
+    """Raw response for a cached payload, honouring If-None-Match and Accept-Encoding"""
+    body, encoding = payload.body, None
+    accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+    if payload.br is not None and "br" in accepted:
+        body, encoding = payload.br, "br"
+    elif payload.gzip is not None and "gzip" in accepted:
+        body, encoding = payload.gzip, "gzip"
+
+    headers = {
+        "ETag": representation_etag(payload.etag, encoding),
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "private, no-cache",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, payload.etag):
+        return Response(status_code=304, headers=headers)
+
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+class ResponseCache:
+    """Encoded payloads keyed by resource, with explicit invalidation.
+
+    Payloads stay in process memory; when an invalidation channel is given,
+    invalidate() also drops the entry on every other instance.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: int = 3600, compress_min_bytes: int = 1024,
+                 name: str = "responses", invalidations: Optional[TieredCache] = None):
+        self.compress_min_bytes = compress_min_bytes
+        self.name = name
+        self._cache = QueryCache(max_size=max_entries, default_ttl=ttl)
+        self._invalidations = invalidations
+        if invalidations is not None:
+            invalidations.attach(name, self._cache)
+
+    def get(self, key: str) -> Optional[Tuple[Any, EncodedPayload]]:
+        """Return (meta, payload) for a cached resource"""
+        return self._cache.get(key)
+
+    def set(self, key: str, data: Any, meta: Any = None) -> EncodedPayload:
+        """Encode data and cache it alongside meta (e.g. the owner for access checks)"""
+        payload = encode_payload(data, self.compress_min_bytes)
+        self._cache.set(key, (meta, payload))
+        return payload
+
+    def invalidate(self, key: str) -> None:
+        if self._invalidations is not None:
+            self._invalidations.invalidate_attached(self.name, "delete", key)
+        else:
+            self._cache.delete(key)
+        logger.debug(f"Invalidated cached response {key}")
+
+
+# Global cache for roadmap reads
+roadmap_response_cache = ResponseCache(
+    max_entries=settings.ROADMAP_RESPONSE_CACHE_MAX_ENTRIES,
+    ttl=settings.ROADMAP_RESPONSE_CACHE_TTL_SECONDS,
+    compress_min_bytes=settings.RESPONSE_COMPRESS_MIN_BYTES,
+    name="roadmap_responses",
+    invalidations=query_cache,
+)
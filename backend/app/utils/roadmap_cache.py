@@ -0,0 +1,142 @@
+"""
+Generated roadmap result cache
+Generation is deterministic (temperature 0, top_k 1), so results are
+content-addressed by the normalized request and served from memory or Redis
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.database.cache import QueryCache, RedisCacheTier, query_cache
+from app.schemas import RoadmapCreate
+from app.utils.circuit_breaker import CircuitOpenError
+from app.utils.gemini_client import DEFAULT_MODEL
+
+logger = logging.getLogger(__name__)
+
+# Bump when the prompt or ID scheme changes so stale plans are not served
+CACHE_VERSION = "v2"
+
+TIME_UNIT_ALIASES = {
+    "h": "hours", "hr": "hours", "hrs": "hours", "hour": "hours", "hours": "hours",
+    "d": "days", "day": "days", "days": "days",
+    "w": "weeks", "wk": "weeks", "wks": "weeks", "week": "weeks", "weeks": "weeks",
+    "m": "months", "mo": "months", "month": "months", "months": "months",
+    "y": "years", "yr": "years", "yrs": "years", "year": "years", "years": "years",
+}
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(value: Optional[str]) -> str:
+    """Case-fold and collapse whitespace"""
+    if not value:
+        return ""
+    return _WHITESPACE_RE.sub(" ", value).strip().casefold()
+
+
+def normalize_time_unit(unit: Optional[str]) -> str:
+    unit = normalize_text(unit)
+    return TIME_UNIT_ALIASES.get(unit, unit)
+
+
+def normalize_model(model: Optional[str]) -> str:
+    model = (model or DEFAULT_MODEL).strip()
+    return model[len("models/"):] if model.startswith("models/") else model
+
+
+def normalize_roadmap_request(roadmap_create: RoadmapCreate) -> Dict[str, Any]:
+    """Canonical form of a request; equal forms produce the same roadmap"""
+    return {
+        "subject": normalize_text(roadmap_create.subject),
+        "goal": normalize_text(roadmap_create.goal),
+        "time_value": roadmap_create.time_value,
+        "time_unit": normalize_time_unit(roadmap_create.time_unit),
+        "model": normalize_model(roadmap_create.model),
+        "prior_experience": normalize_text(roadmap_create.prior_experience),
+    }
+
+
+def roadmap_cache_key(roadmap_create: RoadmapCreate) -> str:
+    normalized = json.dumps(normalize_roadmap_request(roadmap_create), sort_keys=True)
+    digest = hashlib.sha256(normalized.encode()).hexdigest()
+    return f"roadmap:gen:{CACHE_VERSION}:{digest}"
+
+
+class RoadmapResultCache:
+    """Two-layer cache for generated roadmap data (memory, then Redis).
+
+    The Redis layer is the query cache's pooled tier, so a slow or
+    unreachable Redis costs one short timeout until its circuit breaker
+    opens, rather than a fresh connection and ping per lookup.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: int = 86400, enabled: bool = True,
+                 tier: Optional[RedisCacheTier] = None):
+        self.ttl = ttl
+        self.enabled = enabled
+        self.tier = tier
+        self._memory = QueryCache(max_size=max_entries, default_ttl=ttl)
+
+    def _tier_get(self, key: str) -> Optional[Tuple[Any, Optional[float], Tuple[str, ...]]]:
+        try:
+            # Unreadable entries come back as None, i.e. a miss
+            return self.tier.get(key)
+        except CircuitOpenError:
+            return None
+        except Exception as e:
+            logger.warning(f"Roadmap cache Redis read failed: {e}")
+            return None
+
+    def _tier_set(self, key: str, data: Dict[str, Any], ttl: int) -> None:
+        try:
+            self.tier.set(key, data, ttl)
+        except CircuitOpenError:
+            pass
+        except Exception as e:
+            logger.warning(f"Roadmap cache Redis write failed: {e}")
+
+    async def get(self, key: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Return (roadmap_data, layer) where layer is 'memory' or 'redis'"""
+        if not self.enabled:
+            return None, None
+
+        data = self._memory.get(key)
+        if data is not None:
+            return data, "memory"
+
+        if self.tier is None or self.tier.breaker.retry_after() > 0:
+            return None, None
+
+        found = await asyncio.to_thread(self._tier_get, key)
+        if found is None or not isinstance(found[0], dict):
+            return None, None
+
+        data, ttl, _ = found
+        self._memory.set(key, data, ttl)
+        return data, "redis"
+
+    async def set(self, key: str, data: Dict[str, Any], ttl: Optional[int] = None) -> None:
+        if not self.enabled:
+            return
+
+        ttl = ttl or self.ttl
+        self._memory.set(key, data, ttl)
+
+        if self.tier is None or self.tier.breaker.retry_after() > 0:
+            return
+        await asyncio.to_thread(self._tier_set, key, data, ttl)
+
+
+# Global roadmap result cache
+roadmap_result_cache = RoadmapResultCache(
+    max_entries=settings.ROADMAP_CACHE_MAX_ENTRIES,
+    ttl=settings.ROADMAP_CACHE_TTL_SECONDS,
+    enabled=settings.ROADMAP_CACHE_ENABLED,
+    tier=query_cache.l2,
+)
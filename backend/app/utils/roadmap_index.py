@@ -0,0 +1,120 @@
+"""
+Roadmap subtopic index
+Maps subtopic IDs to their (module, topic, subtopic) offsets and flattened
+position, so lookups, "next subtopic" and progress avoid walking the plan
+"""
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.database.cache import QueryCache
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+
+def build_roadmap_index(roadmap_plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the JSON-serializable index for a plan whose IDs are already injected.
+
+    ``order`` lists subtopic IDs in reading order; ``positions`` maps each ID
+    to [module, topic, subtopic, ordinal] offsets.
+    """
+    order: List[str] = []
+    positions: Dict[str, List[int]] = {}
+
+    for m_idx, module in enumerate(roadmap_plan.get("modules", [])):
+        for t_idx, topic in enumerate(module.get("topics", [])):
+            for s_idx, subtopic in enumerate(topic.get("subtopics", [])):
+                subtopic_id = subtopic.get("id")
+                if not subtopic_id or subtopic_id in positions:
+                    continue
+                positions[subtopic_id] = [m_idx, t_idx, s_idx, len(order)]
+                order.append(subtopic_id)
+
+    return {"version": INDEX_VERSION, "order": order, "positions": positions}
+
+
+class RoadmapIndex:
+    """Constant-time subtopic lookups over a stored index"""
+
+    def __init__(self, data: Dict[str, Any]):
+        self.order: List[str] = data["order"]
+        self.positions: Dict[str, List[int]] = data["positions"]
+
+    @classmethod
+    def from_plan(cls, roadmap_plan: Dict[str, Any]) -> "RoadmapIndex":
+        return cls(build_roadmap_index(roadmap_plan))
+
+    @property
+    def total(self) -> int:
+        return len(self.order)
+
+    def locate(self, subtopic_id: str) -> Optional[Tuple[int, int, int]]:
+        position = self.positions.get(subtopic_id)
+        return tuple(position[:3]) if position else None
+
+    def ordinal(self, subtopic_id: str) -> Optional[int]:
+        position = self.positions.get(subtopic_id)
+        return position[3] if position else None
+
+    def next_subtopic_id(self, subtopic_id: str) -> Optional[str]:
+        ordinal = self.ordinal(subtopic_id)
+        if ordinal is None or ordinal + 1 >= len(self.order):
+            return None
+        return self.order[ordinal + 1]
+
+    def previous_subtopic_id(self, subtopic_id: str) -> Optional[str]:
+        ordinal = self.ordinal(subtopic_id)
+        if not ordinal:
+            return None
+        return self.order[ordinal - 1]
+
+    def get_subtopic(self, roadmap_plan: Dict[str, Any], subtopic_id: str) -> Optional[Dict[str, Any]]:
+        location = self.locate(subtopic_id)
+        if location is None:
+            return None
+        m_idx, t_idx, s_idx = location
+        try:
+            return roadmap_plan["modules"][m_idx]["topics"][t_idx]["subtopics"][s_idx]
+        except (KeyError, IndexError, TypeError):
+            return None
+
+    def progress(self, completed_ids: Iterable[str]) -> float:
+        """Percentage of subtopics completed; cost depends on the completed set, not the plan"""
+        if not self.order:
+            return 0.0
+        done = sum(1 for subtopic_id in set(completed_ids) if subtopic_id in self.positions)
+        return round(done / len(self.order) * 100, 2)
+
+
+class RoadmapIndexCache:
+    """In-memory cache of parsed indexes keyed by roadmap ID"""
+
+    def __init__(self, max_size: int = 1000, ttl: int = 3600):
+        self._cache = QueryCache(max_size=max_size, default_ttl=ttl)
+
+    def get(self, roadmap: Dict[str, Any]) -> RoadmapIndex:
+        """Index for a roadmap row, from memory, its stored column, or rebuilt from the plan"""
+        key = f"roadmap_index:{roadmap['id']}"
+        index = self._cache.get(key)
+        if index is not None:
+            return index
+
+        stored = roadmap.get("roadmap_index")
+        if stored and stored.get("version") == INDEX_VERSION:
+            index = RoadmapIndex(stored)
+        else:
+            # Rows saved before the index column existed
+            logger.debug(f"Building missing index for roadmap {roadmap['id']}")
+            index = RoadmapIndex.from_plan(roadmap.get("roadmap_plan") or {})
+
+        self._cache.set(key, index)
+        return index
+
+    def invalidate(self, roadmap_id: int) -> None:
+        self._cache.delete(f"roadmap_index:{roadmap_id}")
+
+
+# Global index cache
+roadmap_index_cache = RoadmapIndexCache()
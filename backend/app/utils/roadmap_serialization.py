@@ -0,0 +1,47 @@
+"""
+Roadmap serialization
+Plans are validated against the typed models once, when generated; responses
+are then written straight to JSON with orjson instead of being revalidated
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import TypeAdapter
+
+from app.schemas import RoadmapModule, RoadmapPlan, RoadmapRead
+
+# Adapters are expensive to build, so they are created once and reused
+roadmap_plan_adapter = TypeAdapter(RoadmapPlan)
+roadmap_module_adapter = TypeAdapter(RoadmapModule)
+
+ROADMAP_READ_FIELDS = tuple(RoadmapRead.model_fields)
+
+
+def validate_roadmap_plan(roadmap_plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate a plan against the typed models and return it as plain JSON data"""
+    plan = roadmap_plan_adapter.validate_python(roadmap_plan)
+    return roadmap_plan_adapter.dump_python(plan, mode="json")
+
+
+def validate_roadmap_module(module: Dict[str, Any]) -> Dict[str, Any]:
+    return roadmap_module_adapter.dump_python(roadmap_module_adapter.validate_python(module), mode="json")
+
+
+def roadmap_payload(row: Dict[str, Any]) -> Dict[str, Any]:
+    """The RoadmapRead view of a stored roadmap row"""
+    return {name: row.get(name) for name in ROADMAP_READ_FIELDS}
+
+
+def dumps(data: Any) -> str:
+    return orjson.dumps(data, default=str).decode()
+
+
+def roadmap_response(row: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> ORJSONResponse:
+    return ORJSONResponse(roadmap_payload(row), headers=headers)
+
+
+def roadmap_list_response(rows: Iterable[Dict[str, Any]]) -> ORJSONResponse:
+    payload: List[Dict[str, Any]] = [roadmap_payload(row) for row in rows]
+    return ORJSONResponse(payload)
@@ -0,0 +1,182 @@
+"""
+Near-duplicate roadmap lookup
+MinHash signatures over subject/goal tokens, bucketed with LSH so that
+rephrased requests ("learn python basics" vs "Learn the basics of Python")
+can reuse an already generated roadmap
+"""
+
+import logging
+import re
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+import mmh3
+
+from app.core.config import settings
+from app.schemas import RoadmapCreate
+from app.utils.roadmap_cache import normalize_model, normalize_text, normalize_time_unit
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z0-9+#]+")
+
+# Words that do not change which roadmap a learner needs
+STOPWORDS = frozenset("""
+a an and are as at be by for from how i in into is it its learn learning me my
+of on or study studying the to understand want with about basic basics
+fundamentals fundamental introduction intro get started beginner beginners
+""".split())
+
+
+def tokenize(text: Optional[str]) -> Set[str]:
+    """Lower-cased word tokens with stopwords removed and plurals folded"""
+    tokens = set()
+    for token in _TOKEN_RE.findall(normalize_text(text)):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.add(token)
+    return tokens
+
+
+def request_tokens(roadmap_create: RoadmapCreate) -> FrozenSet[str]:
+    return frozenset(tokenize(roadmap_create.subject) | tokenize(roadmap_create.goal))
+
+
+def request_partition(roadmap_create: RoadmapCreate) -> str:
+    """Inputs that must match exactly for two roadmaps to be interchangeable"""
+    return "|".join((
+        str(roadmap_create.time_value),
+        normalize_time_unit(roadmap_create.time_unit),
+        normalize_model(roadmap_create.model),
+        normalize_text(roadmap_create.prior_experience),
+    ))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """MinHash with num_perm seeded mmh3 hashes per token"""
+
+    def __init__(self, num_perm: int = 64):
+        self.num_perm = num_perm
+        # Vocabulary is small and repetitive, so per-token hash vectors are cached
+        self._token_hashes = lru_cache(maxsize=65536)(self._hash_token)
+
+    def _hash_token(self, token: str) -> Tuple[int, ...]:
+        return tuple(mmh3.hash(token, seed, signed=False) for seed in range(self.num_perm))
+
+    def signature(self, tokens: FrozenSet[str]) -> Tuple[int, ...]:
+        return tuple(map(min, zip(*map(self._token_hashes, tokens))))
+
+
+class RoadmapSimilarityIndex:
+    """LSH index from request token sets to roadmap result cache keys.
+
+    Candidate lookup touches only the request's band buckets, so cost is
+    independent of how many roadmaps are indexed; candidates are confirmed
+    with exact Jaccard similarity on the token sets.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16,
+                 max_entries: int = 200000, enabled: bool = True):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._hasher = MinHasher(num_perm)
+        # cache_key -> (token set, band keys)
+        self._entries: "OrderedDict[str, Tuple[FrozenSet[str], List[int]]]" = OrderedDict()
+        self._buckets: Dict[int, Set[str]] = {}
+        self._lock = Lock()
+        self._stats = {"lookups": 0, "hits": 0, "candidates": 0}
+
+    def _band_keys(self, partition: str, tokens: FrozenSet[str]) -> List[int]:
+        signature = self._hasher.signature(tokens)
+        return [
+            hash((partition, band, signature[band * self.rows:(band + 1) * self.rows]))
+            for band in range(self.bands)
+        ]
+
+    def add(self, roadmap_create: RoadmapCreate, cache_key: str) -> None:
+        if not self.enabled:
+            return
+        tokens = request_tokens(roadmap_create)
+        if not tokens:
+            return
+        band_keys = self._band_keys(request_partition(roadmap_create), tokens)
+
+        with self._lock:
+            if cache_key in self._entries:
+                self._entries.move_to_end(cache_key)
+                return
+            self._entries[cache_key] = (tokens, band_keys)
+            for band_key in band_keys:
+                self._buckets.setdefault(band_key, set()).add(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._remove_locked(next(iter(self._entries)))
+
+    def remove(self, cache_key: str) -> None:
+        with self._lock:
+            self._remove_locked(cache_key)
+
+    def _remove_locked(self, cache_key: str) -> None:
+        entry = self._entries.pop(cache_key, None)
+        if entry is None:
+            return
+        for band_key in entry[1]:
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(cache_key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def find(self, roadmap_create: RoadmapCreate) -> Optional[Tuple[str, float]]:
+        """Return (cache_key, similarity) of the closest indexed request above the threshold"""
+        if not self.enabled:
+            return None
+        tokens = request_tokens(roadmap_create)
+        if not tokens:
+            return None
+        band_keys = self._band_keys(request_partition(roadmap_create), tokens)
+
+        with self._lock:
+            self._stats["lookups"] += 1
+            candidates: Set[str] = set()
+            for band_key in band_keys:
+                bucket = self._buckets.get(band_key)
+                if bucket:
+                    candidates.update(bucket)
+            self._stats["candidates"] += len(candidates)
+
+            best: Optional[Tuple[str, float]] = None
+            for cache_key in candidates:
+                similarity = jaccard(tokens, self._entries[cache_key][0])
+                if similarity >= self.threshold and (best is None or similarity > best[1]):
+                    best = (cache_key, similarity)
+
+            if best is not None:
+                self._stats["hits"] += 1
+        return best
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "buckets": len(self._buckets)}
+
+
+# Global near-duplicate index
+roadmap_similarity_index = RoadmapSimilarityIndex(
+    threshold=settings.ROADMAP_SIMILARITY_THRESHOLD,
+    max_entries=settings.ROADMAP_SIMILARITY_MAX_ENTRIES,
+    enabled=settings.ROADMAP_SIMILARITY_ENABLED,
+)
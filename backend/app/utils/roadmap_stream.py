@@ -0,0 +1,236 @@
+"""
+Incremental roadmap parser
+Scans streamed LLM output once and emits each roadmap_plan module as soon
+as its closing brace arrives
+"""
+
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = " \t\r\n"
+
+
+def _loads(raw: str) -> Any:
+    """Decode a scanned JSON fragment; raw control characters are tolerated, other damage gives None"""
+    try:
+        return json.loads(raw, strict=False)
+    except ValueError:
+        return None
+
+
+@dataclass
+class TruncatedRoadmap:
+    """What survived of a roadmap response that was cut off mid-output"""
+
+    title: Optional[str]
+    description: Optional[str]
+    modules: List[Dict[str, Any]]
+    partial_module_title: Optional[str] = None
+    partial_topics: List[Dict[str, Any]] = field(default_factory=list)
+    modules_closed: bool = False  # Cut off after the modules array, nothing missing
+
+    @property
+    def last_complete_module(self) -> Optional[str]:
+        return self.modules[-1].get("title") if self.modules else None
+
+    @property
+    def last_complete_topic(self) -> Optional[str]:
+        if self.partial_topics:
+            return self.partial_topics[-1].get("title")
+        if self.modules and self.modules[-1].get("topics"):
+            return self.modules[-1]["topics"][-1].get("title")
+        return None
+
+
+class ModuleStreamParser:
+    """Single-pass JSON scanner that yields completed roadmap modules"""
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._started = False
+        self._finished = False
+
+        # Scanner state
+        self._stack: List[str] = []  # '{' or '['
+        self._keys: List[Optional[str]] = []  # Current key per open container
+        self._in_string = False
+        self._escape = False
+        self._string_start = -1
+        self._pending_string: Optional[str] = None  # Closed string awaiting ':' or ','
+
+        # Modules array tracking
+        self._modules_depth: Optional[int] = None
+        self._modules_closed = False
+        self._module_start = -1
+        self._topic_start = -1
+
+        self.title: Optional[str] = None
+        self.description: Optional[str] = None
+        self.modules_emitted = 0
+
+        # Progress inside the module currently being written
+        self.partial_module_title: Optional[str] = None
+        self.partial_topics: List[Dict[str, Any]] = []
+
+    @property
+    def started(self) -> bool:
+        """True once the opening brace has been seen"""
+        return self._started
+
+    @property
+    def finished(self) -> bool:
+        """True once the top-level object has been closed"""
+        return self._finished
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume a text chunk and return any modules completed by it"""
+        if self._finished or not chunk:
+            return []
+
+        self._text += chunk
+        completed: List[Dict[str, Any]] = []
+        text = self._text
+        i = self._pos
+
+        while i < len(text):
+            ch = text[i]
+
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._open("{")
+                i += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._pending_string = text[self._string_start:i + 1]
+                i += 1
+                continue
+
+            if ch in _WHITESPACE:
+                i += 1
+                continue
+
+            if self._pending_string is not None:
+                raw = self._pending_string
+                self._pending_string = None
+                if ch == ":" and self._stack and self._stack[-1] == "{":
+                    self._keys[-1] = _loads(raw)
+                    i += 1
+                    continue
+                self._on_string_value(raw)
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in "{[":
+                self._open(ch)
+                depth = len(self._stack)
+                if self._in_modules() and ch == "{":
+                    if depth == self._modules_depth + 1:
+                        self._module_start = i
+                        self.partial_module_title = None
+                        self.partial_topics = []
+                    elif depth == self._modules_depth + 3 and self._keys[-3] == "topics":
+                        self._topic_start = i
+                elif ch == "[" and self._keys[-2] == "modules" and self._modules_depth is None:
+                    self._modules_depth = depth
+            elif ch in "}]":
+                closing_depth = len(self._stack)
+                self._close()
+                if self._in_modules() and ch == "}":
+                    if closing_depth == self._modules_depth + 1 and self._module_start >= 0:
+                        module = self._decode(text[self._module_start:i + 1], "module")
+                        self._module_start = -1
+                        self.partial_module_title = None
+                        self.partial_topics = []
+                        if module is not None:
+                            completed.append(module)
+                    elif closing_depth == self._modules_depth + 3 and self._topic_start >= 0:
+                        topic = self._decode(text[self._topic_start:i + 1], "topic")
+                        self._topic_start = -1
+                        if topic is not None:
+                            self.partial_topics.append(topic)
+                elif ch == "]" and closing_depth == self._modules_depth:
+                    self._modules_closed = True
+                if not self._stack:
+                    self._finished = True
+                    i += 1
+                    break
+            i += 1
+
+        self._pos = i
+        self.modules_emitted += len(completed)
+        return completed
+
+    def snapshot(self, modules: List[Dict[str, Any]]) -> TruncatedRoadmap:
+        """Describe the output so far, given the modules this parser emitted"""
+        return TruncatedRoadmap(
+            title=self.title,
+            description=self.description,
+            modules=modules,
+            partial_module_title=self.partial_module_title,
+            partial_topics=list(self.partial_topics),
+            modules_closed=self._modules_closed,
+        )
+
+    def _open(self, ch: str) -> None:
+        self._stack.append(ch)
+        self._keys.append(None)
+
+    def _close(self) -> None:
+        if self._stack:
+            self._stack.pop()
+            self._keys.pop()
+
+    def _in_modules(self) -> bool:
+        return self._modules_depth is not None and not self._modules_closed
+
+    def _on_string_value(self, raw: str) -> None:
+        key = self._keys[-1] if self._keys else None
+        if self._in_modules() and len(self._stack) == self._modules_depth + 1:
+            if key == "title":
+                self.partial_module_title = _loads(raw)
+            return
+
+        # Otherwise only top-level title/description are interesting
+        if len(self._stack) != 1:
+            return
+        if key == "title" and self.title is None:
+            self.title = _loads(raw)
+        elif key == "description" and self.description is None:
+            self.description = _loads(raw)
+
+    def _decode(self, raw: str, kind: str) -> Optional[Dict[str, Any]]:
+        value = _loads(raw)
+        if value is None:
+            logger.warning(f"Skipping undecodable streamed {kind}")
+        return value if isinstance(value, dict) else None
+
+
+def detect_truncation(text: str) -> Optional[TruncatedRoadmap]:
+    """Return the complete part of a truncated roadmap, or None if the output closed normally.
+
+    Output the scanner cannot make sense of is reported as not truncated, so
+    the caller falls back to repairing it.
+    """
+    parser = ModuleStreamParser()
+    try:
+        modules = parser.feed(text)
+    except Exception as e:
+        logger.warning(f"Truncation scan failed, treating output as complete: {e}")
+        return None
+    if parser.finished or not parser.started:
+        return None
+    return parser.snapshot(modules)
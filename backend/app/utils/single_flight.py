@@ -0,0 +1,147 @@
+"""
+Single-flight request coalescing
+Concurrent callers with the same key share one execution; an optional
+Redis lock extends this across instances
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from threading import Lock
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.database.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Deletes the lock only if we still own it
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """Coalesce identical in-flight async calls"""
+
+    def __init__(self, name: str, distributed: bool = False, lock_ttl: int = 120,
+                 remote_wait: float = 90.0, poll_interval: float = 0.5):
+        self.name = name
+        self.distributed = distributed
+        self.lock_ttl = lock_ttl
+        self.remote_wait = remote_wait
+        self.poll_interval = poll_interval
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._stats_lock = Lock()
+        self._stats = {
+            "leader_calls": 0,
+            "coalesced_calls": 0,
+            "remote_waits": 0,
+            "remote_hits": 0,
+            "remote_fallbacks": 0,
+        }
+
+    def _count(self, counter: str) -> None:
+        with self._stats_lock:
+            self._stats[counter] += 1
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]],
+                 remote_result: Optional[Callable[[], Awaitable[Optional[Any]]]] = None) -> Any:
+        """Run fn once per key; concurrent callers await the leader's result.
+
+        When distributed mode is on and another instance holds the lock,
+        remote_result is polled until the shared result appears.
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self._count("coalesced_calls")
+            logger.debug(f"SingleFlight[{self.name}] coalesced call for {key[:24]}...")
+            # Shield so a follower disconnecting does not cancel shared work
+            return await asyncio.shield(task)
+
+        self._count("leader_calls")
+        task = asyncio.ensure_future(self._lead(key, fn, remote_result))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _lead(self, key: str, fn: Callable[[], Awaitable[Any]],
+                    remote_result: Optional[Callable[[], Awaitable[Optional[Any]]]]) -> Any:
+        try:
+            if not self.distributed or remote_result is None:
+                return await fn()
+
+            token = uuid.uuid4().hex
+            lock_key = f"singleflight:{self.name}:{key}"
+            acquired = await asyncio.to_thread(self._acquire, lock_key, token)
+
+            if acquired is False:
+                result = await self._wait_for_remote(lock_key, remote_result)
+                if result is not None:
+                    return result
+                self._count("remote_fallbacks")
+                return await fn()
+
+            try:
+                return await fn()
+            finally:
+                if acquired:
+                    await asyncio.to_thread(self._release, lock_key, token)
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _wait_for_remote(self, lock_key: str,
+                               remote_result: Callable[[], Awaitable[Optional[Any]]]) -> Optional[Any]:
+        self._count("remote_waits")
+        deadline = time.monotonic() + self.remote_wait
+
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            result = await remote_result()
+            if result is not None:
+                self._count("remote_hits")
+                return result
+            if not await asyncio.to_thread(self._lock_held, lock_key):
+                # The other instance finished or died; one last look before taking over
+                result = await remote_result()
+                if result is not None:
+                    self._count("remote_hits")
+                return result
+
+        logger.warning(f"SingleFlight[{self.name}] gave up waiting on remote leader")
+        return None
+
+    def _acquire(self, lock_key: str, token: str) -> Optional[bool]:
+        """True if acquired, False if held elsewhere, None if Redis is unavailable"""
+        try:
+            with get_redis_client() as redis_client:
+                if redis_client is None:
+                    return None
+                return bool(redis_client.set(lock_key, token, nx=True, ex=self.lock_ttl))
+        except Exception as e:
+            logger.warning(f"SingleFlight[{self.name}] lock acquire failed: {e}")
+            return None
+
+    def _release(self, lock_key: str, token: str) -> None:
+        try:
+            with get_redis_client() as redis_client:
+                if redis_client is not None:
+                    redis_client.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+        except Exception as e:
+            logger.warning(f"SingleFlight[{self.name}] lock release failed: {e}")
+
+    def _lock_held(self, lock_key: str) -> bool:
+        try:
+            with get_redis_client() as redis_client:
+                return bool(redis_client is not None and redis_client.exists(lock_key))
+        except Exception:
+            return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["in_flight"] = len(self._inflight)
+        return stats
@@ -0,0 +1,123 @@
+"""
+Stage timing for request handling
+Named stage timers that feed process-wide histograms and, for the current
+request, a Server-Timing header; plus sampled, size-capped raw output logs
+"""
+
+import hashlib
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import Any, Dict, Iterator, Optional
+
+import orjson
+
+from app.core.config import settings
+from app.utils.llm_providers import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# Bucket upper bounds in seconds, from in-process work up to LLM calls
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 40, 80)
+
+
+class StageTimer:
+    """Per-request stage durations, in the order stages first ran"""
+
+    def __init__(self):
+        self.durations: Dict[str, float] = {}
+        self.started = time.perf_counter()
+
+    def add(self, name: str, seconds: float) -> None:
+        # Repeated stages (e.g. continuation calls) accumulate
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def as_millis(self) -> Dict[str, float]:
+        return {name: round(seconds * 1000, 1) for name, seconds in self.durations.items()}
+
+    def server_timing(self, total: bool = True) -> str:
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.durations.items()]
+        if total:
+            parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+# Timer for the request being handled; copied into tasks it spawns
+current_stage_timer: ContextVar[Optional[StageTimer]] = ContextVar("current_stage_timer", default=None)
+
+
+class StageMetrics:
+    """Histograms of stage durations across requests"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, LatencyHistogram(buckets=STAGE_BUCKETS))
+        histogram.observe(seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            histograms = dict(self._histograms)
+        return {stage: histogram.snapshot() for stage, histogram in histograms.items()}
+
+
+# Global roadmap generation stage metrics
+generation_stages = StageMetrics("roadmap_generation")
+
+
+def start_stage_timer() -> StageTimer:
+    """Begin timing the current request"""
+    timer = StageTimer()
+    current_stage_timer.set(timer)
+    return timer
+
+
+def record_stage(name: str, seconds: float) -> None:
+    generation_stages.observe(name, seconds)
+    timer = current_stage_timer.get()
+    if timer is not None:
+        timer.add(name, seconds)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block as the named stage, whether or not it raises"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def log_raw_output(text: str, source: str = "llm", force: bool = False, **fields: Any) -> None:
+    """Log a sample of raw model output as one structured, size-capped line.
+
+    ``force`` bypasses sampling, e.g. when the output failed to parse.
+    """
+    if not force and random.random() >= settings.LLM_RAW_OUTPUT_SAMPLE_RATE:
+        return
+    limit = settings.LLM_RAW_OUTPUT_MAX_CHARS
+    record = {
+        "event": "raw_output",
+        "source": source,
+        "chars": len(text),
+        "digest": hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest(),
+        "truncated": len(text) > limit,
+        **fields,
+    }
+    if len(text) > limit:
+        # Both ends: the opening shows the shape, the end shows where it broke off
+        record["head"] = text[:limit // 2]
+        record["tail"] = text[-(limit // 2):]
+    else:
+        record["head"] = text
+    logger.info(orjson.dumps(record, default=str).decode())
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for POST /roadmaps/generate against an offline LLM
+Drives the ASGI app in-process at a fixed concurrency while Gemini is replaced
+by FakeLLM replaying benchmarks/corpus/roadmap_outputs, and reports
+throughput, latency percentiles, event-loop lag and memory
+
+Run from the backend directory:
+    python benchmarks/bench_generate_load.py [--concurrency 32] [--requests 400]
+        [--latency 1.0] [--sigma 0.4] [--failure-rate 0.02] [--json out.json]
+
+Every request uses a fresh subject so the result cache and near-duplicate
+reuse do not short-circuit generation; pass --repeat-subjects to measure
+the cached path instead. Hedging and the LLM rate limiter are off unless
+--hedging / --rate-limit are given, so the numbers isolate this process.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+SUBJECT_WORDS = [
+    "quantum", "compilers", "ecology", "baroque", "topology", "sourdough", "kubernetes",
+    "phonetics", "glaciers", "cryptography", "volcanoes", "jazz", "genomics", "origami",
+    "databases", "astronomy", "typography", "welding", "mycology", "robotics",
+]
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+def request_body(index: int, repeat_subjects: bool) -> Dict:
+    if repeat_subjects:
+        index %= len(SUBJECT_WORDS)
+    # Distinct token sets keep near-duplicate matching from reusing results
+    words = [SUBJECT_WORDS[(index // len(SUBJECT_WORDS) ** k) % len(SUBJECT_WORDS)] for k in range(3)]
+    return {
+        "subject": f"{' '.join(words)} {index}",
+        "goal": f"Become productive with {words[0]} topic {index}",
+        "time_value": 2 + index % 6,
+        "time_unit": "weeks",
+    }
+
+
+def rss_mib() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return None
+
+
+async def sample_loop_lag(samples: List[float], interval: float, stop: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+async def run(args) -> Dict:
+    import httpx
+
+    from app.main import app
+    from app.utils.fake_llm import FakeLLM
+    from app.utils.gemini_client import gemini_client
+
+    fake = FakeLLM.from_corpus(
+        args.corpus,
+        pattern=args.pattern,
+        latency_median=args.latency,
+        latency_sigma=args.sigma,
+        failure_rate=args.failure_rate,
+        seed=args.seed,
+    )
+    gemini_client.use_model_factory(fake.get_model)
+
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    lag: List[float] = []
+    stop = asyncio.Event()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+        async def worker(indices, record: bool):
+            for index in indices:
+                start = time.perf_counter()
+                response = await client.post("/roadmaps/generate", json=request_body(index, args.repeat_subjects))
+                if record:
+                    latencies.append(time.perf_counter() - start)
+                    statuses[response.status_code] += 1
+
+        # Warm up model handles, caches and imports without recording
+        warmup = iter(range(args.warmup))
+        await asyncio.gather(*(worker(warmup, False) for _ in range(min(args.concurrency, max(1, args.warmup)))))
+
+        if args.tracemalloc:
+            tracemalloc.start()
+        rss_before = rss_mib()
+        lag_task = asyncio.ensure_future(sample_loop_lag(lag, args.lag_interval, stop))
+        started = time.perf_counter()
+        measured = iter(range(args.warmup, args.warmup + args.requests))
+        await asyncio.gather(*(worker(measured, True) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await lag_task
+        traced_peak = tracemalloc.get_traced_memory()[1] / 2 ** 20 if args.tracemalloc else None
+        if args.tracemalloc:
+            tracemalloc.stop()
+
+    gemini_client.use_model_factory(None)
+    ok = statuses.get(200, 0)
+    return {
+        "concurrency": args.concurrency,
+        "requests": len(latencies),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "ok_rps": round(ok / elapsed, 2),
+        "statuses": dict(sorted(statuses.items())),
+        "latency_ms": {
+            f"p{q}": round(percentile(latencies, q) * 1000, 1) for q in (50, 95, 99)
+        } | {"max": round(max(latencies) * 1000, 1)},
+        "loop_lag_ms": {
+            f"p{q}": round(percentile(lag, q) * 1000, 2) for q in (50, 99)
+        } | {"max": round(max(lag) * 1000, 2) if lag else None},
+        "memory_mib": {
+            "rss_before": round(rss_before, 1) if rss_before else None,
+            "rss_after": round(rss_mib(), 1) if rss_mib() else None,
+            "max_rss": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "traced_peak": round(traced_peak, 1) if traced_peak is not None else None,
+        },
+        "fake_llm": {
+            "latency_median": args.latency,
+            "latency_sigma": args.sigma,
+            "failure_rate": args.failure_rate,
+            "calls": fake.calls,
+            "injected_failures": fake.failures,
+        },
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--concurrency", type=int, default=32)
+    arg_parser.add_argument("--requests", type=int, default=400)
+    arg_parser.add_argument("--warmup", type=int, default=10)
+    arg_parser.add_argument("--latency", type=float, default=1.0, help="Median fake LLM latency in seconds")
+    arg_parser.add_argument("--sigma", type=float, default=0.4, help="Log-normal latency spread")
+    arg_parser.add_argument("--failure-rate", type=float, default=0.0)
+    arg_parser.add_argument("--corpus", default=None, help="Directory of recorded raw outputs")
+    arg_parser.add_argument("--pattern", default="*.txt", help="Glob of recorded outputs to replay")
+    arg_parser.add_argument("--seed", type=int, default=1)
+    arg_parser.add_argument("--lag-interval", type=float, default=0.01)
+    arg_parser.add_argument("--repeat-subjects", action="store_true")
+    arg_parser.add_argument("--rate-limit", action="store_true", help="Keep the LLM token-bucket limiter on")
+    arg_parser.add_argument("--hedging", action="store_true", help="Keep hedging to secondary providers on")
+    arg_parser.add_argument("--tracemalloc", action="store_true", help="Also report the traced allocation peak")
+    arg_parser.add_argument("--json", help="Write the report to this file as well")
+    arg_parser.add_argument("--verbose", action="store_true", help="Show application output")
+    args = arg_parser.parse_args()
+
+    # Settings are read at import time, so these must be set before importing the app
+    if not args.rate_limit:
+        os.environ["LLM_RATE_LIMIT_ENABLED"] = "false"
+    if not args.hedging:
+        os.environ["LLM_HEDGING_ENABLED"] = "false"
+
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        report = asyncio.run(run(args))
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
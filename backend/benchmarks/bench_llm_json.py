@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark roadmap output parsing over recorded raw model outputs
+Compares the legacy json.loads + greedy regex path with app.utils.llm_json
+
+Run from the backend directory:
+    python benchmarks/bench_llm_json.py [--repeat 200]
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.utils.llm_json import LLMOutputError, parse_roadmap_output  # noqa: E402
+
+CORPUS_DIR = Path(__file__).parent / "corpus" / "roadmap_outputs"
+
+
+def legacy_parse(text: str):
+    """The parsing path generate_roadmap used before app.utils.llm_json"""
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        match = re.search(r"\{.*\}", text, re.DOTALL)
+        if not match:
+            raise ValueError("no JSON object")
+        data = json.loads(match.group(0))
+    if "roadmap_plan" not in data or "modules" not in data.get("roadmap_plan", {}):
+        raise ValueError("invalid structure")
+    return data
+
+
+def new_parse(text: str):
+    return parse_roadmap_output(text)[0]
+
+
+def time_parser(parser, text: str, repeat: int):
+    """Return (ok, mean_us) for a parser over one corpus entry"""
+    try:
+        parser(text)
+        ok = True
+    except (ValueError, LLMOutputError):
+        ok = False
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        try:
+            parser(text)
+        except (ValueError, LLMOutputError):
+            pass
+    return ok, (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--repeat", type=int, default=200)
+    args = arg_parser.parse_args()
+
+    files = sorted(CORPUS_DIR.glob("*.txt"))
+    totals = {"legacy": [0, 0.0], "new": [0, 0.0]}
+
+    print(f"{'sample':34} {'bytes':>7} {'legacy':>16} {'llm_json':>16}")
+    for path in files:
+        text = path.read_text()
+        legacy_ok, legacy_us = time_parser(legacy_parse, text, args.repeat)
+        new_ok, new_us = time_parser(new_parse, text, args.repeat)
+
+        totals["legacy"][0] += legacy_ok
+        totals["legacy"][1] += legacy_us
+        totals["new"][0] += new_ok
+        totals["new"][1] += new_us
+
+        print(
+            f"{path.name:34} {len(text):7d} "
+            f"{('ok' if legacy_ok else 'FAIL'):>5} {legacy_us:8.1f}us "
+            f"{('ok' if new_ok else 'FAIL'):>5} {new_us:8.1f}us"
+        )
+
+    count = len(files)
+    print()
+    for name, (ok, total_us) in totals.items():
+        print(f"{name:8} recovered {ok}/{count} ({ok / count:.0%}), total {total_us:.1f}us per corpus pass")
+
+
+if __name__ == "__main__":
+    main()
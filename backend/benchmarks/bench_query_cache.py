@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark QueryCache get/set at 1k, 100k and 1M entries
+Compares the previous dict + min() eviction implementation with the sharded
+OrderedDict LRU in app.database.cache; per-op cost should stay flat as the
+cache grows
+
+Run from the backend directory:
+    python benchmarks/bench_query_cache.py [--sizes 1000 100000 1000000] [--ops 200000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from threading import Lock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from app.database.cache import QueryCache  # noqa: E402
+
+
+class LegacyQueryCache:
+    """QueryCache as it was: datetime expiry and O(n) eviction at capacity"""
+
+    def __init__(self, max_size: int = 1000, default_ttl: int = 300):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self._cache = {}
+        self._access_order = {}
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._cache:
+                return None
+            entry = self._cache[key]
+            now = datetime.utcnow()
+            if now > entry["expires_at"]:
+                del self._cache[key]
+                self._access_order.pop(key, None)
+                return None
+            self._access_order[key] = now
+            return entry["data"]
+
+    def set(self, key, data, ttl=None):
+        with self._lock:
+            if len(self._cache) >= self.max_size:
+                oldest_key = min(self._access_order.keys(), key=lambda k: self._access_order[k])
+                self._cache.pop(oldest_key, None)
+                self._access_order.pop(oldest_key, None)
+            expires_at = datetime.utcnow() + timedelta(seconds=ttl or self.default_ttl)
+            self._cache[key] = {"data": data, "expires_at": expires_at, "created_at": datetime.utcnow()}
+            self._access_order[key] = datetime.utcnow()
+
+
+def fill(cache, size: int) -> None:
+    for i in range(size):
+        cache.set(f"user:{i}:profile", i)
+
+
+def per_op_ns(fn, keys) -> float:
+    start = time.perf_counter()
+    for key in keys:
+        fn(key)
+    return (time.perf_counter() - start) / len(keys) * 1e9
+
+
+def measure(cache, size: int, ops: int, rng: random.Random):
+    hit_keys = [f"user:{rng.randrange(size)}:profile" for _ in range(ops)]
+    miss_keys = [f"missing:{i}" for i in range(ops)]
+    # New keys at capacity: every set evicts
+    new_keys = [f"user:{size + i}:profile" for i in range(ops)]
+    return {
+        "get hit": per_op_ns(cache.get, hit_keys),
+        "get miss": per_op_ns(cache.get, miss_keys),
+        "set update": per_op_ns(lambda k: cache.set(k, 1), hit_keys),
+        "set evict": per_op_ns(lambda k: cache.set(k, 1), new_keys),
+    }
+
+
+def threaded_ops_per_sec(cache, size: int, threads: int, ops_per_thread: int) -> float:
+    def work(seed):
+        rng = random.Random(seed)
+        for _ in range(ops_per_thread):
+            key = f"user:{rng.randrange(size * 2)}:profile"
+            if cache.get(key) is None:
+                cache.set(key, 1)
+
+    workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return threads * ops_per_thread / (time.perf_counter() - start)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    arg_parser.add_argument("--ops", type=int, default=200000)
+    arg_parser.add_argument("--legacy-budget", type=int, default=2 * 10 ** 8,
+                            help="Cap legacy ops so ops * size stays under this (its evictions are O(n))")
+    arg_parser.add_argument("--threads", type=int, default=8)
+    args = arg_parser.parse_args()
+    rng = random.Random(7)
+
+    print(f"{'entries':>9} {'operation':12} {'legacy ns/op':>14} {'new ns/op':>11}")
+    for size in args.sizes:
+        new_cache = QueryCache(max_size=size, default_ttl=3600)
+        fill(new_cache, size)
+        new = measure(new_cache, size, args.ops, rng)
+
+        legacy_ops = max(10, min(args.ops, args.legacy_budget // size))
+        legacy_cache = LegacyQueryCache(max_size=size, default_ttl=3600)
+        fill(legacy_cache, size)
+        legacy = measure(legacy_cache, size, legacy_ops, rng)
+
+        for operation in new:
+            print(f"{size:9d} {operation:12} {legacy[operation]:14.0f} {new[operation]:11.0f}")
+
+        threaded = threaded_ops_per_sec(new_cache, size, args.threads, args.ops // args.threads)
+        print(f"{size:9d} {'threaded':12} {'':>14} {threaded:9.0f}/s  ({args.threads} threads, get-or-set)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark roadmap response serialization for 10/50/200-module plans
+Compares the previous path (response_model validation of an untyped
+Dict plan, then the stdlib JSON encoder) with the typed plan validated at
+generation time and written directly with orjson
+
+Run from the backend directory:
+    python benchmarks/bench_serialization.py [--repeat 50]
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+from sqlmodel import SQLModel  # noqa: E402
+
+from app.utils.roadmap_serialization import roadmap_response, validate_roadmap_plan  # noqa: E402
+
+
+class LegacyRoadmapRead(SQLModel):
+    """RoadmapRead as it was, with an untyped plan"""
+    id: int
+    user_id: Optional[int] = None
+    title: str
+    description: str
+    roadmap_plan: Dict[str, Any]
+    subject: Optional[str] = None
+    goal: Optional[str] = None
+    time_value: Optional[int] = None
+    time_unit: Optional[str] = None
+    model: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+
+legacy_adapter = TypeAdapter(LegacyRoadmapRead)
+
+
+def make_row(module_count: int, topics: int = 5, subtopics: int = 4) -> Dict[str, Any]:
+    plan = {"modules": [
+        {
+            "id": f"module_{m + 1}",
+            "title": f"Module {m + 1}: a reasonably descriptive module title",
+            "timeline": f"Week {m + 1}",
+            "topics": [
+                {
+                    "id": f"topic_{m + 1}_{t + 1}",
+                    "title": f"Topic {t + 1} covering an important concept",
+                    "subtopics": [
+                        {"id": str(uuid.uuid4()), "title": f"Subtopic {s + 1} with some detail"}
+                        for s in range(subtopics)
+                    ],
+                }
+                for t in range(topics)
+            ],
+        }
+        for m in range(module_count)
+    ]}
+    now = datetime.utcnow()
+    return {
+        "id": 1, "user_id": 1, "title": "Roadmap", "description": "A plan",
+        "roadmap_plan": validate_roadmap_plan(plan), "subject": "Rust", "goal": "CLI tools",
+        "time_value": module_count, "time_unit": "weeks", "model": None,
+        "created_at": now, "updated_at": now,
+    }
+
+
+def legacy_render(row: Dict[str, Any]) -> bytes:
+    # What FastAPI did per response: validate against response_model, dump, encode
+    model = legacy_adapter.validate_python(row)
+    content = jsonable_encoder(legacy_adapter.dump_python(model, mode="json"))
+    return JSONResponse(content).body
+
+
+def orjson_render(row: Dict[str, Any]) -> bytes:
+    return roadmap_response(row).body
+
+
+def mean_us(fn, row, repeat: int) -> float:
+    fn(row)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(row)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--repeat", type=int, default=50)
+    args = arg_parser.parse_args()
+
+    print(f"{'modules':>7} {'bytes':>9} {'legacy':>12} {'orjson':>12} {'speedup':>8}")
+    for module_count in (10, 50, 200):
+        row = make_row(module_count)
+        assert len(legacy_render(row)) > 0
+        legacy = mean_us(legacy_render, row, args.repeat)
+        fast = mean_us(orjson_render, row, args.repeat)
+        print(
+            f"{module_count:7d} {len(orjson_render(row)):9d} "
+            f"{legacy:10.0f}us {fast:10.0f}us {legacy / fast:7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark near-duplicate roadmap lookup at large index sizes
+Builds a synthetic index of (subject, goal, duration) requests and times
+RoadmapSimilarityIndex.find for hits and misses
+
+Run from the backend directory:
+    python benchmarks/bench_similarity.py [--entries 100000] [--lookups 2000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from app.schemas import RoadmapCreate  # noqa: E402
+from app.utils.roadmap_similarity import RoadmapSimilarityIndex  # noqa: E402
+
+TOPICS = """python rust go java kotlin swift typescript react vue django flask fastapi
+kubernetes docker terraform aws azure gcp linux networking security cryptography
+statistics calculus algebra geometry physics chemistry biology genetics economics
+accounting marketing design photography guitar piano spanish french japanese
+german drawing writing sql postgres redis kafka spark pandas numpy pytorch
+tensorflow llm nlp vision robotics embedded electronics compilers databases""".split()
+
+GOALS = """build apis ship mobile apps pass certification exam get job analyze data
+train models deploy production services write papers automate workflows create games
+design systems lead teams start business""".split()
+
+
+def random_request(rng: random.Random) -> RoadmapCreate:
+    subject = " ".join(rng.sample(TOPICS, rng.randint(1, 3)))
+    goal = " ".join(rng.sample(GOALS, rng.randint(2, 5)))
+    return RoadmapCreate(
+        subject=subject,
+        goal=goal,
+        time_value=rng.choice([2, 4, 8, 12]),
+        time_unit=rng.choice(["weeks", "months"]),
+    )
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--entries", type=int, default=100000)
+    arg_parser.add_argument("--lookups", type=int, default=2000)
+    args = arg_parser.parse_args()
+
+    rng = random.Random(7)
+    index = RoadmapSimilarityIndex(max_entries=args.entries)
+    stored = []
+
+    start = time.perf_counter()
+    for i in range(args.entries):
+        request = random_request(rng)
+        index.add(request, f"key-{i}")
+        stored.append(request)
+    build_s = time.perf_counter() - start
+
+    hits = [
+        RoadmapCreate(
+            subject=f"Learn the basics of {r.subject}",
+            goal=r.goal.upper(),
+            time_value=r.time_value,
+            time_unit=r.time_unit,
+        )
+        for r in rng.sample(stored, min(args.lookups, len(stored)))
+    ]
+    misses = [random_request(rng) for _ in range(args.lookups)]
+
+    print(f"indexed {args.entries} requests in {build_s:.2f}s ({build_s / args.entries * 1e6:.1f}us each)")
+    for name, requests in (("rephrased", hits), ("random", misses)):
+        found = 0
+        start = time.perf_counter()
+        for request in requests:
+            found += index.find(request) is not None
+        elapsed = time.perf_counter() - start
+        print(f"{name:10} {elapsed / len(requests) * 1e6:8.1f}us per lookup, matched {found}/{len(requests)}")
+    print(index.get_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+-- Migration: Add roadmap subtopic index
+-- Created: 2026-10-16
+-- Description: Store the precomputed subtopic ID -> position index next to roadmap_plan
+
+ALTER TABLE roadmap
+ADD COLUMN IF NOT EXISTS roadmap_index JSONB;
+
+-- Existing rows keep NULL; the API rebuilds their index from roadmap_plan on first lookup